@@ -3,6 +3,7 @@ from logging.config import fileConfig
 from alembic import context
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy import text
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -19,13 +20,40 @@ if config.config_file_name is not None:
 # noinspection PyUnresolvedReferences
 from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
 
+# noinspection PyUnresolvedReferences
+from contas_a_pagar_e_receber.models.exclusao_model import Exclusao
+
 # noinspection PyUnresolvedReferences
 from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente
 
+# noinspection PyUnresolvedReferences
+from contas_a_pagar_e_receber.models.pagamento_model import Pagamento
+
+# noinspection PyUnresolvedReferences
+from contas_a_pagar_e_receber.models.relatorio_model import Relatorio
+
+# noinspection PyUnresolvedReferences
+from contas_a_pagar_e_receber.models.resumo_mensal_model import ResumoMensal, AtualizacaoDeResumo
+
+# noinspection PyUnresolvedReferences
+from shared.idempotencia import ChaveIdempotencia
+
 from shared.database import Base
+from shared import tenants
 
 target_metadata = Base.metadata
 
+# Migra o banco ou o schema de um tenant: alembic -x tenant=acme upgrade head
+tenant = context.get_x_argument(as_dictionary=True).get("tenant")
+if tenant is not None and not tenants.FORMATO_DO_TENANT.fullmatch(tenant):
+    raise ValueError(f"Tenant inválido: {tenant}")
+if tenant is not None and tenants.TENANT_DATABASE_URL:
+    config.set_main_option("sqlalchemy.url",
+                           tenants.TENANT_DATABASE_URL.format(tenant=tenants.nome_no_banco(tenant)).replace("%", "%%"))
+schema_do_tenant = None
+if tenant is not None and not tenants.TENANT_DATABASE_URL and tenants.TENANT_SCHEMA:
+    schema_do_tenant = tenants.TENANT_SCHEMA.format(tenant=tenants.nome_no_banco(tenant))
+
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -71,8 +99,14 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        if schema_do_tenant is not None:
+            # As migrations também usam SQL literal, então o schema vai no search_path
+            # da conexão, e não no schema_translate_map usado pela aplicação
+            connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema_do_tenant}"'))
+            connection.execute(text(f'SET search_path TO "{schema_do_tenant}"'))
+
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, version_table_schema=schema_do_tenant
         )
 
         with context.begin_transaction():
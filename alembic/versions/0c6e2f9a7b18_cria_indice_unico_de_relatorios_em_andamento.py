@@ -0,0 +1,37 @@
+"""Cria índice único de relatórios em andamento
+
+Revision ID: 0c6e2f9a7b18
+Revises: f3a8c1d60b27
+Create Date: 2026-10-20 09:14:52.301847
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from shared.migracoes import cria_indice_concorrente, remove_indice_concorrente
+
+# revision identifiers, used by Alembic.
+revision = '0c6e2f9a7b18'
+down_revision = 'f3a8c1d60b27'
+branch_labels = None
+depends_on = None
+
+INDICE = 'ux_relatorios_chave_em_andamento'
+EM_ANDAMENTO = "status IN ('PENDENTE', 'PROCESSANDO')"
+
+
+def upgrade() -> None:
+    # Duplicados que já estejam na fila impediriam o índice: fica o mais antigo de cada chave
+    op.execute(sa.text(
+        f"UPDATE relatorios SET status = 'ERRO', erro = 'Solicitação duplicada', concluido_em = CURRENT_TIMESTAMP "
+        f"WHERE {EM_ANDAMENTO} AND id > (SELECT min(anterior.id) FROM relatorios anterior "
+        f"WHERE anterior.chave = relatorios.chave AND anterior.{EM_ANDAMENTO})"
+    ))
+
+    with op.get_context().autocommit_block():
+        cria_indice_concorrente(op.get_bind(), INDICE, 'relatorios', ['chave'], where=EM_ANDAMENTO, unique=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        remove_indice_concorrente(op.get_bind(), INDICE, 'relatorios')
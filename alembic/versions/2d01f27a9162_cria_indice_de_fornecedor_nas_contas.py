@@ -0,0 +1,25 @@
+"""Cria índice de fornecedor nas contas
+
+Revision ID: 2d01f27a9162
+Revises: 646ba3d6fd74
+Create Date: 2026-10-19 15:20:44.106529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d01f27a9162'
+down_revision = '646ba3d6fd74'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_contas_a_pagar_e_receber_fornecedor_cliente_id'), 'contas_a_pagar_e_receber',
+                    ['fornecedor_cliente_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_contas_a_pagar_e_receber_fornecedor_cliente_id'), table_name='contas_a_pagar_e_receber')
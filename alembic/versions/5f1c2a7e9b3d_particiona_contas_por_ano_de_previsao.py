@@ -0,0 +1,31 @@
+"""Particiona contas a pagar e receber por ano de previsão
+
+Revision ID: 5f1c2a7e9b3d
+Revises: d7293884ef70
+Create Date: 2026-10-19 09:12:41.381204
+
+"""
+from alembic import op
+
+from shared.particionamento import converte_para_particionada, converte_para_tabela_simples
+
+# revision identifiers, used by Alembic.
+revision = '5f1c2a7e9b3d'
+down_revision = 'd7293884ef70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Particionamento declarativo só existe no Postgres
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    converte_para_particionada(op.get_bind())
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    converte_para_tabela_simples(op.get_bind())
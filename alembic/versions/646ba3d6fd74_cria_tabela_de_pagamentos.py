@@ -0,0 +1,38 @@
+"""Cria tabela de pagamentos
+
+Revision ID: 646ba3d6fd74
+Revises: 8cab8b6960e9
+Create Date: 2026-10-19 14:41:07.915334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '646ba3d6fd74'
+down_revision = '8cab8b6960e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Sem FOREIGN KEY no banco: no Postgres a tabela de contas é particionada e
+    # sua chave primária é (id, data_previsao), então não há como referenciar só
+    # o id. A exclusão de uma conta remove os pagamentos dela na aplicação.
+    op.create_table(
+        'pagamentos',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('conta_a_pagar_e_receber_id', sa.Integer(), nullable=False),
+        sa.Column('valor', sa.Numeric(scale=2), nullable=False),
+        sa.Column('data_pagamento', sa.Date(), nullable=False),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_pagamentos_conta_a_pagar_e_receber_id'), 'pagamentos',
+                    ['conta_a_pagar_e_receber_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_pagamentos_conta_a_pagar_e_receber_id'), table_name='pagamentos')
+    op.drop_table('pagamentos')
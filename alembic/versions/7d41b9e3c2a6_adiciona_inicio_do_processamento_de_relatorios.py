@@ -0,0 +1,29 @@
+"""Adiciona início do processamento de relatórios
+
+Revision ID: 7d41b9e3c2a6
+Revises: 0c6e2f9a7b18
+Create Date: 2026-10-20 09:48:06.115930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from shared.migracoes import executa_com_limite_de_lock
+
+# revision identifiers, used by Alembic.
+revision = '7d41b9e3c2a6'
+down_revision = '0c6e2f9a7b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Nula: os PROCESSANDO sem início são tratados como abandonados e retomados
+    executa_com_limite_de_lock(op.get_bind(), lambda: op.add_column(
+        'relatorios', sa.Column('iniciado_em', sa.DateTime(), nullable=True)
+    ))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('relatorios') as batch_op:
+        batch_op.drop_column('iniciado_em')
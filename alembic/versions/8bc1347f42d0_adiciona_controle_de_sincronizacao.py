@@ -0,0 +1,68 @@
+"""Adiciona controle de sincronização
+
+Revision ID: 8bc1347f42d0
+Revises: 8eb21db3967f
+Create Date: 2026-10-19 17:41:08.215340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from shared.migracoes import executa_com_limite_de_lock, preenche_em_lotes, define_nao_nulo, \
+    cria_indice_concorrente, remove_indice_concorrente
+
+# revision identifiers, used by Alembic.
+revision = '8bc1347f42d0'
+down_revision = '8eb21db3967f'
+branch_labels = None
+depends_on = None
+
+TABELAS = ['contas_a_pagar_e_receber', 'fornecedor_cliente']
+
+
+def upgrade() -> None:
+    postgres = op.get_bind().dialect.name == 'postgresql'
+
+    for tabela in TABELAS:
+        # Nula e sem default: no Postgres só altera o catálogo, sem reescrever a tabela
+        executa_com_limite_de_lock(op.get_bind(), lambda: op.add_column(
+            tabela, sa.Column('atualizado_em', sa.DateTime(), nullable=True)
+        ))
+
+    op.create_table(
+        'exclusoes',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('entidade', sa.String(length=50), nullable=False),
+        sa.Column('entidade_id', sa.Integer(), nullable=False),
+        sa.Column('excluido_em', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_exclusoes_excluido_em_id', 'exclusoes', ['excluido_em', 'id'], unique=False)
+
+    with op.get_context().autocommit_block():
+        for tabela in TABELAS:
+            preenche_em_lotes(op.get_bind(), tabela, "atualizado_em = CURRENT_TIMESTAMP", "atualizado_em IS NULL")
+            if postgres:
+                define_nao_nulo(op.get_bind(), tabela, 'atualizado_em')
+            cria_indice_concorrente(op.get_bind(), f'ix_{tabela}_atualizado_em_id', tabela, ['atualizado_em', 'id'])
+
+    if not postgres:
+        # O SQLite não tem ALTER COLUMN: o batch recria a tabela
+        for tabela in TABELAS:
+            with op.batch_alter_table(tabela) as batch_op:
+                batch_op.alter_column('atualizado_em', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    # Primeiro o que roda fora da transação, para uma falha no meio não deixar
+    # confirmada só uma parte do resto
+    with op.get_context().autocommit_block():
+        for tabela in reversed(TABELAS):
+            remove_indice_concorrente(op.get_bind(), f'ix_{tabela}_atualizado_em_id', tabela)
+
+    op.drop_index('ix_exclusoes_excluido_em_id', table_name='exclusoes')
+    op.drop_table('exclusoes')
+
+    for tabela in reversed(TABELAS):
+        with op.batch_alter_table(tabela) as batch_op:
+            batch_op.drop_column('atualizado_em')
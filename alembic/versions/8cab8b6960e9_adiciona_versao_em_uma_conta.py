@@ -0,0 +1,25 @@
+"""Adiciona versão em uma conta
+
+Revision ID: 8cab8b6960e9
+Revises: e2b94f3a6d18
+Create Date: 2026-10-19 14:02:31.480217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8cab8b6960e9'
+down_revision = 'e2b94f3a6d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contas_a_pagar_e_receber',
+                  sa.Column('versao', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('contas_a_pagar_e_receber', 'versao')
@@ -0,0 +1,43 @@
+"""Cria tabelas do resumo mensal
+
+Revision ID: 8eb21db3967f
+Revises: 2d01f27a9162
+Create Date: 2026-10-19 15:58:12.630981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8eb21db3967f'
+down_revision = '2d01f27a9162'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'resumo_mensal_contas',
+        sa.Column('ano', sa.Integer(), nullable=False),
+        sa.Column('mes', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=30), nullable=False),
+        sa.Column('esta_baixada', sa.Boolean(), nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('valor_total', sa.Numeric(scale=2), nullable=False),
+        sa.Column('valor_baixado', sa.Numeric(scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('ano', 'mes', 'tipo', 'esta_baixada')
+    )
+    atualizacoes = op.create_table(
+        'atualizacoes_de_resumos',
+        sa.Column('nome', sa.String(length=50), nullable=False),
+        sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('nome')
+    )
+    # A linha já existe para a atualização poder travá-la com SELECT ... FOR UPDATE
+    op.bulk_insert(atualizacoes, [{'nome': 'resumo_mensal_contas', 'atualizado_em': None}])
+
+
+def downgrade() -> None:
+    op.drop_table('atualizacoes_de_resumos')
+    op.drop_table('resumo_mensal_contas')
@@ -0,0 +1,38 @@
+"""Cria tabela de relatórios
+
+Revision ID: a3d8e61f0c47
+Revises: 5f1c2a7e9b3d
+Create Date: 2026-10-19 10:02:17.502113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d8e61f0c47'
+down_revision = '5f1c2a7e9b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'relatorios',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('tipo', sa.String(length=30), nullable=False),
+        sa.Column('parametros', sa.Text(), nullable=False),
+        sa.Column('chave', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('resultado', sa.Text(), nullable=True),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.Column('concluido_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_relatorios_chave'), 'relatorios', ['chave'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_relatorios_chave'), table_name='relatorios')
+    op.drop_table('relatorios')
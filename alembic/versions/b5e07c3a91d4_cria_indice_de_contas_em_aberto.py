@@ -0,0 +1,31 @@
+"""Cria índice parcial das contas em aberto por data de previsão
+
+Revision ID: b5e07c3a91d4
+Revises: 8bc1347f42d0
+Create Date: 2026-10-19 19:02:44.518201
+
+"""
+from alembic import op
+
+from shared.migracoes import cria_indice_concorrente, remove_indice_concorrente
+
+# revision identifiers, used by Alembic.
+revision = 'b5e07c3a91d4'
+down_revision = '8bc1347f42d0'
+branch_labels = None
+depends_on = None
+
+INDICE = 'ix_contas_a_pagar_e_receber_em_aberto_data_previsao'
+
+
+def upgrade() -> None:
+    # Mesmo predicado das consultas de GET /contas-a-pagar-e-receber/vencimentos,
+    # senão o planejador não usa o índice parcial
+    with op.get_context().autocommit_block():
+        cria_indice_concorrente(op.get_bind(), INDICE, 'contas_a_pagar_e_receber', ['data_previsao'],
+                                where='esta_baixada IS NOT TRUE')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        remove_indice_concorrente(op.get_bind(), INDICE, 'contas_a_pagar_e_receber')
@@ -0,0 +1,29 @@
+"""Adiciona grupo de parcelas em uma conta
+
+Revision ID: c71e04b9d2a5
+Revises: a3d8e61f0c47
+Create Date: 2026-10-19 10:48:55.114390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71e04b9d2a5'
+down_revision = 'a3d8e61f0c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('contas_a_pagar_e_receber', sa.Column('grupo_parcelas', sa.String(length=36), nullable=True))
+    op.add_column('contas_a_pagar_e_receber', sa.Column('numero_parcela', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_contas_a_pagar_e_receber_grupo_parcelas'), 'contas_a_pagar_e_receber',
+                    ['grupo_parcelas'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_contas_a_pagar_e_receber_grupo_parcelas'), table_name='contas_a_pagar_e_receber')
+    op.drop_column('contas_a_pagar_e_receber', 'numero_parcela')
+    op.drop_column('contas_a_pagar_e_receber', 'grupo_parcelas')
@@ -0,0 +1,35 @@
+"""Cria tabela de chaves de idempotência
+
+Revision ID: e2b94f3a6d18
+Revises: c71e04b9d2a5
+Create Date: 2026-10-19 11:37:02.846531
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b94f3a6d18'
+down_revision = 'c71e04b9d2a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'chaves_idempotencia',
+        sa.Column('chave', sa.String(length=300), nullable=False),
+        sa.Column('hash_requisicao', sa.String(length=64), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=True),
+        sa.Column('resposta', sa.Text(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.Column('expira_em', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('chave')
+    )
+    op.create_index(op.f('ix_chaves_idempotencia_expira_em'), 'chaves_idempotencia', ['expira_em'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_chaves_idempotencia_expira_em'), table_name='chaves_idempotencia')
+    op.drop_table('chaves_idempotencia')
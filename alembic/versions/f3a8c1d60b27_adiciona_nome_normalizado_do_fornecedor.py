@@ -0,0 +1,66 @@
+"""Adiciona nome normalizado do fornecedor
+
+Revision ID: f3a8c1d60b27
+Revises: b5e07c3a91d4
+Create Date: 2026-10-19 21:12:37.904316
+
+"""
+import time
+
+from alembic import op
+import sqlalchemy as sa
+
+from contas_a_pagar_e_receber.models.fornecedor_cliente_model import normaliza_nome
+from shared.migracoes import executa_com_limite_de_lock, cria_indice_concorrente, remove_indice_concorrente, \
+    imprime_progresso, MIGRACOES_TAMANHO_DO_LOTE, MIGRACOES_PAUSA_ENTRE_LOTES_SEGUNDOS
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c1d60b27'
+down_revision = 'b5e07c3a91d4'
+branch_labels = None
+depends_on = None
+
+INDICE = 'ix_fornecedor_cliente_nome_normalizado'
+
+
+def upgrade() -> None:
+    executa_com_limite_de_lock(op.get_bind(), lambda: op.add_column(
+        'fornecedor_cliente', sa.Column('nome_normalizado', sa.String(length=255), nullable=True)
+    ))
+
+    with op.get_context().autocommit_block():
+        preenche_nomes_normalizados(op.get_bind())
+        cria_indice_concorrente(op.get_bind(), INDICE, 'fornecedor_cliente', ['nome_normalizado'])
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        remove_indice_concorrente(op.get_bind(), INDICE, 'fornecedor_cliente')
+
+    with op.batch_alter_table('fornecedor_cliente') as batch_op:
+        batch_op.drop_column('nome_normalizado')
+
+
+def preenche_nomes_normalizados(conexao) -> None:
+    # A normalização (sem acentos) é feita em Python, então o preenchimento lê e
+    # grava cada faixa de ids em vez de usar um UPDATE ... SET com SQL puro
+    minimo, maximo = conexao.execute(sa.text("SELECT min(id), max(id) FROM fornecedor_cliente")).one()
+    if minimo is None:
+        return
+
+    atualizacao = sa.text("UPDATE fornecedor_cliente SET nome_normalizado = :nome_normalizado WHERE id = :id")
+    atualizadas = 0
+    for inicio in range(minimo, maximo + 1, MIGRACOES_TAMANHO_DO_LOTE):
+        linhas = conexao.execute(sa.text(
+            "SELECT id, nome FROM fornecedor_cliente "
+            "WHERE id >= :inicio AND id < :fim AND nome IS NOT NULL AND nome_normalizado IS NULL"
+        ), {"inicio": inicio, "fim": inicio + MIGRACOES_TAMANHO_DO_LOTE}).all()
+        if linhas:
+            conexao.execute(atualizacao, [{"id": id_, "nome_normalizado": normaliza_nome(nome)}
+                                          for id_, nome in linhas])
+            atualizadas += len(linhas)
+
+        imprime_progresso('fornecedor_cliente', min(inicio + MIGRACOES_TAMANHO_DO_LOTE, maximo + 1) - minimo,
+                          maximo - minimo + 1, atualizadas)
+        if MIGRACOES_PAUSA_ENTRE_LOTES_SEGUNDOS and inicio + MIGRACOES_TAMANHO_DO_LOTE <= maximo:
+            time.sleep(MIGRACOES_PAUSA_ENTRE_LOTES_SEGUNDOS)
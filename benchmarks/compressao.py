@@ -0,0 +1,74 @@
+"""Compara bytes trafegados e tempo de CPU de cada algoritmo e nível de compressão.
+
+Uso:
+    python -m benchmarks.compressao --quantidade 5000 --pedaco 4096
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+
+from shared.compressao import algoritmos_disponiveis
+
+NIVEIS = {
+    "gzip": [1, 6, 9],
+    "br": [1, 4, 6, 11],
+    "zstd": [1, 3, 9, 19],
+}
+
+
+def gera_listagem_de_contas(quantidade: int) -> bytes:
+    contas = [
+        {
+            "id": i,
+            "descricao": f"Conta {i % 50}",
+            "valor": f"{(i * 37) % 10000}.{i % 100:02d}",
+            "tipo": "PAGAR" if i % 3 else "RECEBER",
+            "data_previsao": (date(2024, 1, 1) + timedelta(days=i % 365)).isoformat(),
+            "data_baixa": None,
+            "valor_baixa": None,
+            "esta_baixada": False,
+            "fornecedor": {"id": i % 40, "nome": f"Fornecedor {i % 40}"},
+        }
+        for i in range(quantidade)
+    ]
+    return json.dumps(contas).encode()
+
+
+def mede(codificacao: str, nivel: int, dados: bytes, pedaco: int) -> tuple:
+    fabrica = algoritmos_disponiveis(nivel_gzip=nivel, nivel_brotli=nivel, nivel_zstd=nivel)[codificacao]
+    compressor = fabrica()
+
+    inicio = time.process_time()
+    tamanho = 0
+    for posicao in range(0, len(dados), pedaco):
+        fim = posicao + pedaco >= len(dados)
+        tamanho += len(compressor.comprime(dados[posicao:posicao + pedaco], fim=fim))
+    return tamanho, time.process_time() - inicio
+
+
+def main(argumentos=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de compressão das respostas da API")
+    parser.add_argument("--quantidade", type=int, default=5000, help="Quantidade de contas na listagem")
+    parser.add_argument("--pedaco", type=int, default=65536,
+                        help="Tamanho de cada pedaço enviado ao compressor, como numa resposta em streaming")
+    argumentos = parser.parse_args(argumentos)
+
+    dados = gera_listagem_de_contas(argumentos.quantidade)
+    disponiveis = algoritmos_disponiveis()
+
+    print(f"Original: {len(dados)} bytes, pedaços de {argumentos.pedaco} bytes")
+    print(f"{'algoritmo':<10}{'nível':>6}{'bytes':>12}{'razão':>8}{'CPU (ms)':>10}{'MB/s':>9}")
+    for codificacao, niveis in NIVEIS.items():
+        if codificacao not in disponiveis:
+            print(f"{codificacao:<10} indisponível")
+            continue
+        for nivel in niveis:
+            tamanho, segundos = mede(codificacao, nivel, dados, argumentos.pedaco)
+            vazao = len(dados) / 1_000_000 / segundos if segundos else float("inf")
+            print(f"{codificacao:<10}{nivel:>6}{tamanho:>12}{len(dados) / tamanho:>8.1f}"
+                  f"{segundos * 1000:>10.1f}{vazao:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
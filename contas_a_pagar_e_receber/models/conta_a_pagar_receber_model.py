@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, Date, Boolean
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, Date, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 
 from shared.database import Base
@@ -15,6 +17,21 @@ class ContaPagarReceber(Base):
     data_baixa = Column(Date())
     valor_baixa = Column(Numeric(scale=2))
     esta_baixada = Column(Boolean, default=False)
+    grupo_parcelas = Column(String(36), index=True)
+    numero_parcela = Column(Integer)
+    versao = Column(Integer, nullable=False, default=1, server_default="1")
+    # Também preenchido nos UPDATEs em massa; é o cursor de GET /sync
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    fornecedor_cliente_id = Column(Integer, ForeignKey("fornecedor_cliente.id"))
+    fornecedor_cliente_id = Column(Integer, ForeignKey("fornecedor_cliente.id"), index=True)
     fornecedor = relationship("FornecedorCliente")
+
+    # Cada UPDATE confere e incrementa a versão; se outra requisição alterou a
+    # conta antes, o SQLAlchemy levanta StaleDataError em vez de sobrescrever.
+    __mapper_args__ = {"version_id_col": versao}
+    __table_args__ = (
+        Index("ix_contas_a_pagar_e_receber_atualizado_em_id", atualizado_em, id),
+        # Só as contas em aberto: o índice não cresce com as baixadas, que são a maioria
+        Index("ix_contas_a_pagar_e_receber_em_aberto_data_previsao", data_previsao,
+              postgresql_where=esta_baixada.isnot(True), sqlite_where=esta_baixada.isnot(True)),
+    )
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
+
+from shared.database import Base
+
+ENTIDADE_CONTA_A_PAGAR_E_RECEBER = "conta_a_pagar_e_receber"
+ENTIDADE_FORNECEDOR_CLIENTE = "fornecedor_cliente"
+
+
+class Exclusao(Base):
+    """Registro (tombstone) de uma linha excluída, lido por ``GET /sync``."""
+    __tablename__ = 'exclusoes'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entidade = Column(String(50), nullable=False)
+    entidade_id = Column(Integer, nullable=False)
+    excluido_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_exclusoes_excluido_em_id", excluido_em, id),)
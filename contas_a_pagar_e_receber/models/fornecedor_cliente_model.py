@@ -1,4 +1,9 @@
-from sqlalchemy import Column, Integer, String
+import re
+import unicodedata
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.orm import validates
 
 from shared.database import Base
 
@@ -8,3 +13,28 @@ class FornecedorCliente(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome = Column(String(255))
+    # Preenchido a partir do nome; é a chave do relatório de duplicados
+    nome_normalizado = Column(String(255), default=lambda contexto: normaliza_nome_do_insert(contexto))
+    atualizado_em = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_fornecedor_cliente_atualizado_em_id", atualizado_em, id),
+        Index("ix_fornecedor_cliente_nome_normalizado", nome_normalizado),
+    )
+
+    @validates("nome")
+    def atualiza_nome_normalizado(self, _, nome: str | None) -> str | None:
+        self.nome_normalizado = normaliza_nome(nome) if nome is not None else None
+        return nome
+
+
+def normaliza_nome(nome: str) -> str:
+    """Minúsculas, sem acentos, pontuação ou espaços repetidos: "Padaria São João Ltda." -> "padaria sao joao ltda"."""
+    sem_acentos = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", sem_acentos.lower()).split())
+
+
+def normaliza_nome_do_insert(contexto) -> str | None:
+    # Cobre os INSERTs em massa (insert(FornecedorCliente)), que não passam pelo @validates
+    nome = contexto.get_current_parameters().get("nome")
+    return normaliza_nome(nome) if nome is not None else None
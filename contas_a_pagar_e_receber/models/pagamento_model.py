@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, Numeric, Date, DateTime
+from sqlalchemy.orm import relationship
+
+from shared.database import Base
+
+
+class Pagamento(Base):
+    __tablename__ = 'pagamentos'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Sem ForeignKey, como na migration: com as contas particionadas a chave delas é (id, data_previsao)
+    conta_a_pagar_e_receber_id = Column(Integer, nullable=False, index=True)
+    valor = Column(Numeric(scale=2), nullable=False)
+    data_pagamento = Column(Date(), nullable=False)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    conta = relationship("ContaPagarReceber",
+                         primaryjoin="foreign(Pagamento.conta_a_pagar_e_receber_id) == ContaPagarReceber.id")
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+
+from shared.database import Base
+
+STATUS_EM_ANDAMENTO = ('PENDENTE', 'PROCESSANDO')
+
+
+class Relatorio(Base):
+    __tablename__ = 'relatorios'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tipo = Column(String(30), nullable=False)
+    parametros = Column(Text, nullable=False)
+    chave = Column(String(64), nullable=False, index=True)
+    status = Column(String(20), nullable=False)
+    resultado = Column(Text)
+    erro = Column(Text)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Quando o worker reivindicou o relatório; um PROCESSANDO antigo demais foi abandonado
+    iniciado_em = Column(DateTime)
+    concluido_em = Column(DateTime)
+
+    # No máximo um relatório em andamento por chave: solicitações idênticas e
+    # simultâneas não geram o mesmo relatório duas vezes
+    __table_args__ = (
+        Index("ux_relatorios_chave_em_andamento", chave, unique=True,
+              postgresql_where=status.in_(STATUS_EM_ANDAMENTO), sqlite_where=status.in_(STATUS_EM_ANDAMENTO)),
+    )
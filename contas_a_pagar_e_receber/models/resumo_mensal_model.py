@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Numeric, Boolean, DateTime
+
+from shared.database import Base
+
+
+class ResumoMensal(Base):
+    __tablename__ = 'resumo_mensal_contas'
+
+    ano = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    tipo = Column(String(30), primary_key=True)
+    esta_baixada = Column(Boolean, primary_key=True)
+    quantidade = Column(Integer, nullable=False)
+    valor_total = Column(Numeric(scale=2), nullable=False)
+    valor_baixado = Column(Numeric(scale=2), nullable=False)
+
+
+class AtualizacaoDeResumo(Base):
+    __tablename__ = 'atualizacoes_de_resumos'
+
+    nome = Column(String(50), primary_key=True)
+    atualizado_em = Column(DateTime)
@@ -0,0 +1,146 @@
+import itertools
+import os
+from datetime import date
+from decimal import Decimal
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import BigInteger, Integer, case, cast, extract, func, literal, select
+from sqlalchemy.orm import Session
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from shared.dependencies import get_db_leitura
+
+router = APIRouter(prefix="/analises")
+
+ANALISES_TAMANHO_DO_LOTE = int(os.getenv("ANALISES_TAMANHO_DO_LOTE", 50000))
+MAXIMO_DE_ANOS_POR_ANALISE = 30
+TIPOS = ["PAGAR", "RECEBER"]
+
+
+class AnaliseMensalResponse(BaseModel):
+    tipo: str
+    fornecedor_cliente_id: int | None = None
+    ano: int
+    mes: int
+    quantidade: int
+    valor_total: Decimal
+    variacao_mes_anterior: Decimal
+    variacao_ano_anterior: Decimal
+
+
+@router.get("/contas-por-mes", response_model=List[AnaliseMensalResponse])
+def analise_de_contas_por_mes(ano_inicio: int = Query(ge=1900, le=9999),
+                              ano_fim: int | None = Query(default=None, ge=1900, le=9999),
+                              agrupar_por_fornecedor: bool = True,
+                              db: Session = Depends(get_db_leitura)) -> List[AnaliseMensalResponse]:
+    ano_fim = ano_fim or ano_inicio
+    if not 0 <= ano_fim - ano_inicio < MAXIMO_DE_ANOS_POR_ANALISE:
+        raise HTTPException(status_code=422,
+                            detail=f"O período deve ter entre 1 e {MAXIMO_DE_ANOS_POR_ANALISE} anos")
+
+    return analisa_contas_por_mes(db, ano_inicio, ano_fim, agrupar_por_fornecedor)
+
+
+def analisa_contas_por_mes(db: Session, ano_inicio: int, ano_fim: int,
+                           agrupar_por_fornecedor: bool = True) -> List[dict]:
+    """Totais por tipo, fornecedor e mês, com a variação para o mês e o ano anteriores.
+
+    As contas chegam do banco em lotes de colunas inteiras (grupo, mês e valor
+    em centavos) e são agregadas com NumPy em int64, sem criar objetos do ORM
+    nem somar ``Decimal`` em laços. O ano anterior a ``ano_inicio`` também é
+    lido, para que os primeiros meses tenham com o que comparar.
+    """
+    primeiro_mes = (ano_inicio - 1) * 12
+    quantidade_de_meses = (ano_fim - ano_inicio + 2) * 12
+
+    chaves = np.empty(0, dtype=np.int64)
+    quantidades = np.empty(0, dtype=np.int64)
+    centavos = np.empty(0, dtype=np.int64)
+
+    for grupos, meses, valores in carrega_lotes(db, ano_inicio - 1, ano_fim, agrupar_por_fornecedor):
+        chaves_do_lote, quantidades_do_lote, centavos_do_lote = agrega(
+            grupos * quantidade_de_meses + (meses - primeiro_mes), np.ones_like(valores), valores
+        )
+        # Acumula só os totais parciais de cada lote, não as linhas
+        chaves, quantidades, centavos = agrega(
+            np.concatenate([chaves, chaves_do_lote]),
+            np.concatenate([quantidades, quantidades_do_lote]),
+            np.concatenate([centavos, centavos_do_lote]),
+        )
+
+    grupos, linhas = np.unique(chaves // quantidade_de_meses, return_inverse=True)
+    colunas = chaves % quantidade_de_meses
+
+    valor_por_mes = np.zeros((len(grupos), quantidade_de_meses), dtype=np.int64)
+    quantidade_por_mes = np.zeros((len(grupos), quantidade_de_meses), dtype=np.int64)
+    valor_por_mes[linhas, colunas] = centavos
+    quantidade_por_mes[linhas, colunas] = quantidades
+
+    # Os primeiros 12 meses são do ano de comparação e não entram na resposta
+    linhas, colunas = np.nonzero(quantidade_por_mes[:, 12:])
+    colunas += 12
+    valores = valor_por_mes[linhas, colunas]
+    variacoes_mes = valores - valor_por_mes[linhas, colunas - 1]
+    variacoes_ano = valores - valor_por_mes[linhas, colunas - 12]
+
+    resultado = []
+    for linha, coluna, valor, variacao_mes, variacao_ano in zip(
+            linhas.tolist(), colunas.tolist(), valores.tolist(), variacoes_mes.tolist(), variacoes_ano.tolist()):
+        grupo = int(grupos[linha])
+        fornecedor = grupo // 2
+        ano, mes = divmod(primeiro_mes + coluna, 12)
+        resultado.append({
+            "tipo": TIPOS[grupo % 2],
+            "fornecedor_cliente_id": fornecedor - 1 if fornecedor else None,
+            "ano": ano,
+            "mes": mes + 1,
+            "quantidade": int(quantidade_por_mes[linha, coluna]),
+            "valor_total": centavos_para_decimal(valor),
+            "variacao_mes_anterior": centavos_para_decimal(variacao_mes),
+            "variacao_ano_anterior": centavos_para_decimal(variacao_ano),
+        })
+
+    return resultado
+
+
+def carrega_lotes(db: Session, ano_inicio: int, ano_fim: int,
+                  agrupar_por_fornecedor: bool) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # Grupo = (fornecedor + 1) * 2 + tipo, com 0 para contas sem fornecedor
+    fornecedor = func.coalesce(ContaPagarReceber.fornecedor_cliente_id + 1, 0) if agrupar_por_fornecedor \
+        else literal(0)
+    tipo = case((ContaPagarReceber.tipo == TIPOS[0], 0), else_=1)
+    mes = cast(extract('year', ContaPagarReceber.data_previsao), Integer) * 12 + \
+        cast(extract('month', ContaPagarReceber.data_previsao), Integer) - 1
+    centavos = cast(func.round(ContaPagarReceber.valor * 100), BigInteger)
+
+    consulta = select(fornecedor * 2 + tipo, mes, centavos).where(
+        ContaPagarReceber.data_previsao >= date(ano_inicio, 1, 1),
+        ContaPagarReceber.data_previsao < date(ano_fim + 1, 1, 1),
+        ContaPagarReceber.tipo.in_(TIPOS)
+    ).execution_options(stream_results=True)
+
+    # Executa pela conexão, sem o processamento de resultados do ORM, e monta
+    # o array direto dos valores das linhas (np.array sobre Row é lento)
+    for lote in db.connection().execute(consulta).partitions(ANALISES_TAMANHO_DO_LOTE):
+        colunas = np.fromiter(itertools.chain.from_iterable(lote), dtype=np.int64, count=3 * len(lote))
+        colunas = colunas.reshape(-1, 3)
+        yield colunas[:, 0], colunas[:, 1], colunas[:, 2]
+
+
+def agrega(chaves: np.ndarray, quantidades: np.ndarray,
+           centavos: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if len(chaves) == 0:
+        return chaves, quantidades, centavos
+
+    ordem = np.argsort(chaves, kind="stable")
+    chaves, quantidades, centavos = chaves[ordem], quantidades[ordem], centavos[ordem]
+    inicios = np.flatnonzero(np.concatenate([[True], chaves[1:] != chaves[:-1]]))
+
+    return chaves[inicios], np.add.reduceat(quantidades, inicios), np.add.reduceat(centavos, inicios)
+
+
+def centavos_para_decimal(centavos: int) -> Decimal:
+    return Decimal(centavos).scaleb(-2)
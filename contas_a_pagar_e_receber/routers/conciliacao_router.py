@@ -0,0 +1,438 @@
+import codecs
+import csv
+import html
+import os
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from enum import Enum
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente, normaliza_nome
+from contas_a_pagar_e_receber.models.pagamento_model import Pagamento
+from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import ContaPagarReceberTipoEnum
+from shared.dependencies import get_db
+from shared.eventos import corretor_de_eventos
+
+router = APIRouter(prefix="/conciliacao")
+
+CONCILIACAO_JANELA_DIAS = int(os.getenv("CONCILIACAO_JANELA_DIAS", 5))
+CONCILIACAO_TAMANHO_MAXIMO_MB = float(os.getenv("CONCILIACAO_TAMANHO_MAXIMO_MB", 50))
+CONCILIACAO_TAMANHO_DO_LOTE = int(os.getenv("CONCILIACAO_TAMANHO_DO_LOTE", 1000))
+
+# Nomes aceitos no cabeçalho do CSV, já normalizados, e o campo de cada um
+COLUNAS_DO_CSV = {
+    "data": "data", "data lancamento": "data", "data do lancamento": "data",
+    "valor": "valor",
+    "descricao": "descricao", "historico": "descricao", "memo": "descricao",
+    "fornecedor": "fornecedor", "favorecido": "fornecedor", "nome": "fornecedor",
+    "identificador": "identificador", "id": "identificador", "fitid": "identificador",
+}
+TAG_DO_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+class FormatoDeExtratoEnum(str, Enum):
+    CSV = 'CSV'
+    OFX = 'OFX'
+
+
+class Lancamento(NamedTuple):
+    linha: int
+    data: date
+    centavos: int  # negativo: saída da conta (PAGAR); positivo: entrada (RECEBER)
+    descricao: str
+    fornecedor: str
+    identificador: str | None
+
+
+class LancamentoResponse(BaseModel):
+    linha: int
+    data: date
+    valor: Decimal
+    descricao: str
+    identificador: str | None = None
+
+
+class LancamentoAmbiguoResponse(LancamentoResponse):
+    contas_candidatas: List[int]
+
+
+class ConciliacaoItemResponse(BaseModel):
+    linha: int
+    conta_id: int
+    identificador: str | None = None
+
+
+class LinhaInvalidaResponse(BaseModel):
+    linha: int
+    erro: str
+
+
+class ConciliacaoResponse(BaseModel):
+    simulacao: bool
+    total_lancamentos: int
+    total_conciliados: int
+    conciliacoes: List[ConciliacaoItemResponse]
+    ambiguos: List[LancamentoAmbiguoResponse]
+    nao_conciliados: List[LancamentoResponse]
+    invalidas: List[LinhaInvalidaResponse]
+    # Contas conciliadas que outra requisição alterou antes da baixa; não foram baixadas
+    alteradas_durante_a_conciliacao: List[int]
+
+
+@router.post("", response_model=ConciliacaoResponse)
+async def conciliar_extrato(request: Request,
+                            formato: FormatoDeExtratoEnum | None = None,
+                            simular: bool = False,
+                            janela_dias: int = Query(default=CONCILIACAO_JANELA_DIAS, ge=0, le=60),
+                            codificacao: str = "utf-8-sig",
+                            db: Session = Depends(get_db)) -> ConciliacaoResponse:
+    # O extrato vem no corpo da requisição (CSV ou OFX) e é lido em pedaços: o
+    # arquivo inteiro nunca fica na memória, e cada pedaço é conciliado ao chegar
+    try:
+        decodificador = codecs.getincrementaldecoder(codificacao)(errors="replace")
+    except LookupError:
+        raise HTTPException(status_code=422, detail="Codificação desconhecida")
+
+    conciliador = await run_in_threadpool(carrega_conciliador, db, janela_dias)
+
+    leitor = None
+    tamanho_maximo = CONCILIACAO_TAMANHO_MAXIMO_MB * 1024 * 1024
+    recebidos = 0
+    async for pedaco in request.stream():
+        recebidos += len(pedaco)
+        if recebidos > tamanho_maximo:
+            raise HTTPException(status_code=413, detail=f"O extrato passa de {CONCILIACAO_TAMANHO_MAXIMO_MB:g} MB")
+
+        texto = decodificador.decode(pedaco)
+        if leitor is None and texto.strip():
+            leitor = cria_leitor(formato, request.headers.get("content-type", ""), texto)
+        if leitor is not None:
+            await run_in_threadpool(lambda: conciliador.processa(leitor.alimenta(texto)))
+
+    if leitor is None:
+        raise HTTPException(status_code=422, detail="Extrato vazio")
+    await run_in_threadpool(
+        lambda: conciliador.processa(leitor.alimenta(decodificador.decode(b"", final=True)) + leitor.finaliza())
+    )
+
+    alteradas = []
+    if not simular:
+        alteradas = await run_in_threadpool(baixa_contas_conciliadas, db, conciliador)
+
+    return monta_resposta(conciliador, leitor.invalidas, alteradas, simular)
+
+
+def cria_leitor(formato: FormatoDeExtratoEnum | None, tipo_de_conteudo: str, inicio: str):
+    if formato is None:
+        ofx = "ofx" in tipo_de_conteudo.lower() or inicio.lstrip().upper().startswith(("OFXHEADER", "<?XML", "<OFX"))
+        formato = FormatoDeExtratoEnum.OFX if ofx else FormatoDeExtratoEnum.CSV
+    return LeitorDeOFX() if formato == FormatoDeExtratoEnum.OFX else LeitorDeCSV()
+
+
+def converte_em_centavos(valor: str) -> int:
+    # Aceita 1234.56, 1234,56, 1.234,56 e 1,234.56: o último separador é o decimal
+    valor = valor.strip().replace("R$", "").replace(" ", "")
+    if "," in valor and "." in valor:
+        milhar = "." if valor.rfind(",") > valor.rfind(".") else ","
+        valor = valor.replace(milhar, "")
+    return int((Decimal(valor.replace(",", ".")) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def converte_em_data(valor: str) -> date:
+    valor = valor.strip()
+    if "/" in valor:
+        dia, mes, ano = valor.split("/")
+        return date(int(ano), int(mes), int(dia))
+    # ISO (2024-01-15) ou o DTPOSTED do OFX (20240115120000[-3:BRT])
+    digitos = valor.replace("-", "")[:8]
+    return date(int(digitos[:4]), int(digitos[4:6]), int(digitos[6:8]))
+
+
+class LeitorDeCSV:
+    """Lê o CSV em pedaços de texto, uma linha por lançamento.
+
+    O cabeçalho define as colunas (``data`` e ``valor`` são obrigatórias) e o
+    separador (``;``, ``,`` ou tabulação). Campos entre aspas não podem ter
+    quebra de linha.
+    """
+
+    def __init__(self):
+        self.resto = ""
+        self.numero_da_linha = 0
+        self.delimitador = None
+        self.campos: Dict[str, int] = {}
+        self.invalidas: List[Tuple[int, str]] = []
+
+    def alimenta(self, texto: str) -> List[Lancamento]:
+        linhas = (self.resto + texto).split("\n")
+        self.resto = linhas.pop()
+        return self._processa(linhas)
+
+    def finaliza(self) -> List[Lancamento]:
+        linhas, self.resto = [self.resto], ""
+        return self._processa(linhas)
+
+    def _processa(self, linhas: List[str]) -> List[Lancamento]:
+        if self.delimitador is None:
+            while linhas and not linhas[0].strip():
+                self.numero_da_linha += 1
+                linhas.pop(0)
+            if not linhas:
+                return []
+            self.numero_da_linha += 1
+            self._le_cabecalho(linhas.pop(0))
+
+        lancamentos = []
+        for campos in csv.reader(linhas, delimiter=self.delimitador):
+            self.numero_da_linha += 1
+            if not campos or not any(campo.strip() for campo in campos):
+                continue
+            try:
+                lancamentos.append(self._converte(campos))
+            except (ValueError, IndexError, InvalidOperation):
+                self.invalidas.append((self.numero_da_linha, "Data ou valor inválido"))
+        return lancamentos
+
+    def _le_cabecalho(self, cabecalho: str) -> None:
+        self.delimitador = next((separador for separador in (";", "\t") if separador in cabecalho), ",")
+        nomes = next(csv.reader([cabecalho], delimiter=self.delimitador))
+        for posicao, nome in enumerate(nomes):
+            campo = COLUNAS_DO_CSV.get(normaliza_nome(nome))
+            if campo is not None:
+                self.campos.setdefault(campo, posicao)
+
+        if "data" not in self.campos or "valor" not in self.campos:
+            raise HTTPException(status_code=422, detail="O cabeçalho do CSV precisa das colunas data e valor")
+
+    def _converte(self, campos: List[str]) -> Lancamento:
+        def campo(nome: str) -> str:
+            posicao = self.campos.get(nome)
+            return campos[posicao].strip() if posicao is not None and posicao < len(campos) else ""
+
+        return Lancamento(self.numero_da_linha, converte_em_data(campo("data")), converte_em_centavos(campo("valor")),
+                          campo("descricao"), campo("fornecedor"), campo("identificador") or None)
+
+
+class LeitorDeOFX:
+    """Lê os ``<STMTTRN>`` de um OFX (SGML ou XML) em pedaços de texto.
+
+    ``linha`` é a posição do lançamento no extrato; o ``FITID`` do banco vai em
+    ``identificador``. O favorecido é o ``NAME``, e a descrição, o ``MEMO``.
+    """
+
+    def __init__(self):
+        self.resto = ""
+        self.transacao: Dict[str, str] | None = None
+        self.numero_da_transacao = 0
+        self.invalidas: List[Tuple[int, str]] = []
+
+    def alimenta(self, texto: str) -> List[Lancamento]:
+        # Só o que vem antes do último "<" está completo: o valor de um elemento vai até a próxima tag
+        self.resto += texto
+        corte = self.resto.rfind("<")
+        if corte <= 0:
+            return []
+        completo, self.resto = self.resto[:corte], self.resto[corte:]
+        return self._processa(completo)
+
+    def finaliza(self) -> List[Lancamento]:
+        completo, self.resto = self.resto, ""
+        return self._processa(completo)
+
+    def _processa(self, texto: str) -> List[Lancamento]:
+        lancamentos = []
+        for fechamento, tag, valor in TAG_DO_OFX.findall(texto):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not fechamento:
+                    self.transacao = {}
+                elif self.transacao is not None:
+                    self._fecha_transacao(lancamentos)
+            elif self.transacao is not None and not fechamento:
+                self.transacao[tag] = html.unescape(valor.strip())
+        return lancamentos
+
+    def _fecha_transacao(self, lancamentos: List[Lancamento]) -> None:
+        transacao, self.transacao = self.transacao, None
+        self.numero_da_transacao += 1
+        try:
+            lancamentos.append(Lancamento(
+                self.numero_da_transacao, converte_em_data(transacao["DTPOSTED"]),
+                converte_em_centavos(transacao["TRNAMT"]), transacao.get("MEMO", ""), transacao.get("NAME", ""),
+                transacao.get("FITID")
+            ))
+        except (KeyError, ValueError, IndexError, InvalidOperation):
+            self.invalidas.append((self.numero_da_transacao, "DTPOSTED ou TRNAMT ausente ou inválido"))
+
+
+class Conciliador:
+    """Casa lançamentos do extrato com contas em aberto por valor, data e fornecedor.
+
+    As contas em aberto são lidas uma única vez e indexadas por (tipo, saldo em
+    centavos), com as datas de previsão ordenadas: cada lançamento custa um
+    acesso ao dicionário e uma busca binária pela janela de datas, não uma
+    consulta ao banco. Se o lançamento informa um fornecedor conhecido, só as
+    contas dele são candidatas. Com exatamente uma candidata o lançamento é
+    conciliado e a conta sai do índice; com mais de uma é ambíguo.
+    """
+
+    def __init__(self, contas: List[tuple], fornecedores: List[tuple], janela_dias: int):
+        self.janela_dias = janela_dias
+        # (tipo, centavos) -> ([data_previsao ordinal], [(id, fornecedor_cliente_id)])
+        self.contas_por_valor: Dict[Tuple[str, int], Tuple[List[int], List[Tuple[int, int | None]]]] = {}
+        self.fornecedores_por_nome: Dict[str, Set[int]] = defaultdict(set)
+        self.versoes: Dict[int, int] = {}
+        self.usadas: Set[int] = set()
+
+        for id_, tipo, data_previsao, fornecedor_cliente_id, centavos, versao in sorted(contas, key=lambda c: c[2]):
+            datas, entradas = self.contas_por_valor.setdefault((tipo, centavos), ([], []))
+            datas.append(data_previsao.toordinal())
+            entradas.append((id_, fornecedor_cliente_id))
+            self.versoes[id_] = versao
+        for id_, nome in fornecedores:
+            if nome:
+                self.fornecedores_por_nome[normaliza_nome(nome)].add(id_)
+
+        self.total_lancamentos = 0
+        self.conciliacoes: List[Tuple[Lancamento, int]] = []
+        self.ambiguos: List[Tuple[Lancamento, List[int]]] = []
+        self.nao_conciliados: List[Lancamento] = []
+
+    def processa(self, lancamentos: List[Lancamento]) -> None:
+        for lancamento in lancamentos:
+            self.total_lancamentos += 1
+            candidatas = self.candidatas(lancamento)
+            if len(candidatas) == 1:
+                self.usadas.add(candidatas[0])
+                self.conciliacoes.append((lancamento, candidatas[0]))
+            elif candidatas:
+                self.ambiguos.append((lancamento, candidatas))
+            else:
+                self.nao_conciliados.append(lancamento)
+
+    def candidatas(self, lancamento: Lancamento) -> List[int]:
+        tipo = ContaPagarReceberTipoEnum.PAGAR.value if lancamento.centavos < 0 else \
+            ContaPagarReceberTipoEnum.RECEBER.value
+        indice = self.contas_por_valor.get((tipo, abs(lancamento.centavos)))
+        if indice is None:
+            return []
+
+        datas, entradas = indice
+        dia = lancamento.data.toordinal()
+        fornecedores = self.fornecedores_por_nome.get(normaliza_nome(lancamento.fornecedor)) \
+            if lancamento.fornecedor else None
+
+        candidatas = []
+        posicao = bisect_left(datas, dia - self.janela_dias)
+        while posicao < len(datas) and datas[posicao] <= dia + self.janela_dias:
+            id_, fornecedor_cliente_id = entradas[posicao]
+            if id_ not in self.usadas and (not fornecedores or fornecedor_cliente_id in fornecedores):
+                candidatas.append(id_)
+            posicao += 1
+        return candidatas
+
+
+def carrega_conciliador(db: Session, janela_dias: int) -> Conciliador:
+    contas = db.query(ContaPagarReceber.id, ContaPagarReceber.tipo, ContaPagarReceber.data_previsao,
+                      ContaPagarReceber.fornecedor_cliente_id, ContaPagarReceber.valor, ContaPagarReceber.valor_baixa,
+                      ContaPagarReceber.versao).filter(ContaPagarReceber.esta_baixada.isnot(True)).all()
+    fornecedores = db.query(FornecedorCliente.id, FornecedorCliente.nome).all()
+    # Não prende uma conexão enquanto o extrato é enviado; a baixa confere a versão de cada conta
+    db.rollback()
+
+    contas = [(id_, tipo, data_previsao, fornecedor_cliente_id, round((valor - (valor_baixa or 0)) * 100), versao)
+              for id_, tipo, data_previsao, fornecedor_cliente_id, valor, valor_baixa, versao in contas]
+    return Conciliador([conta for conta in contas if conta[4] > 0], fornecedores, janela_dias)
+
+
+def baixa_contas_conciliadas(db: Session, conciliador: Conciliador) -> List[int]:
+    """Baixa as contas conciliadas e registra os pagamentos numa única transação.
+
+    Um UPDATE por data de pagamento e versão lida (em lotes de
+    ``CONCILIACAO_TAMANHO_DO_LOTE`` contas), em vez de um por conta. Cada conta
+    só é baixada se ainda está na versão lida antes do upload; as que mudaram
+    nesse meio tempo são devolvidas e ficam sem pagamento.
+    """
+    agrupadas = defaultdict(list)
+    for lancamento, conta_id in conciliador.conciliacoes:
+        agrupadas[lancamento.data, conciliador.versoes[conta_id]].append(conta_id)
+
+    # Marca as linhas atualizadas aqui: outra alteração anterior também pode ter levado a conta à versão seguinte
+    agora = datetime.utcnow()
+    baixadas = 0
+    for (data_pagamento, versao), ids in agrupadas.items():
+        for inicio in range(0, len(ids), CONCILIACAO_TAMANHO_DO_LOTE):
+            baixadas += db.execute(
+                update(ContaPagarReceber).where(
+                    ContaPagarReceber.id.in_(ids[inicio:inicio + CONCILIACAO_TAMANHO_DO_LOTE]),
+                    ContaPagarReceber.versao == versao,
+                    ContaPagarReceber.esta_baixada.isnot(True)
+                ).values(
+                    data_baixa=data_pagamento,
+                    esta_baixada=True,
+                    valor_baixa=ContaPagarReceber.valor,
+                    versao=ContaPagarReceber.versao + 1,
+                    atualizado_em=agora
+                ).execution_options(synchronize_session=False)
+            ).rowcount
+
+    alteradas = set()
+    if baixadas != len(conciliador.conciliacoes):
+        # As contas baixadas acima ficam travadas até o commit, então ninguém mais muda a marca delas
+        ids = [conta_id for _, conta_id in conciliador.conciliacoes]
+        for inicio in range(0, len(ids), CONCILIACAO_TAMANHO_DO_LOTE):
+            lote = ids[inicio:inicio + CONCILIACAO_TAMANHO_DO_LOTE]
+            linhas = db.query(ContaPagarReceber.id, ContaPagarReceber.versao, ContaPagarReceber.atualizado_em).filter(
+                ContaPagarReceber.id.in_(lote)
+            )
+            alteradas |= set(lote) - {id_ for id_, versao, atualizado_em in linhas
+                                      if versao == conciliador.versoes[id_] + 1 and atualizado_em == agora}
+
+    conciliadas = [(lancamento, conta_id) for lancamento, conta_id in conciliador.conciliacoes
+                   if conta_id not in alteradas]
+    if conciliadas:
+        # O saldo de cada conta é o valor do lançamento, em centavos
+        db.execute(insert(Pagamento), [
+            {"conta_a_pagar_e_receber_id": conta_id, "valor": Decimal(abs(lancamento.centavos)).scaleb(-2),
+             "data_pagamento": lancamento.data, "criado_em": agora}
+            for lancamento, conta_id in conciliadas
+        ])
+    db.commit()
+
+    if conciliadas:
+        corretor_de_eventos.publica("conta_baixada", [{"id": conta_id, "versao": conciliador.versoes[conta_id] + 1}
+                                                      for _, conta_id in conciliadas])
+
+    conciliador.conciliacoes = conciliadas
+    return sorted(alteradas)
+
+
+def monta_resposta(conciliador: Conciliador, invalidas: List[Tuple[int, str]], alteradas: List[int],
+                   simulacao: bool) -> ConciliacaoResponse:
+    def lancamento_response(lancamento: Lancamento, classe=LancamentoResponse, **extras):
+        return classe(linha=lancamento.linha, data=lancamento.data, valor=Decimal(lancamento.centavos).scaleb(-2),
+                      descricao=lancamento.descricao, identificador=lancamento.identificador, **extras)
+
+    return ConciliacaoResponse(
+        simulacao=simulacao,
+        total_lancamentos=conciliador.total_lancamentos,
+        total_conciliados=len(conciliador.conciliacoes),
+        conciliacoes=[ConciliacaoItemResponse(linha=lancamento.linha, conta_id=conta_id,
+                                              identificador=lancamento.identificador)
+                      for lancamento, conta_id in conciliador.conciliacoes],
+        ambiguos=[lancamento_response(lancamento, LancamentoAmbiguoResponse, contas_candidatas=candidatas)
+                  for lancamento, candidatas in conciliador.ambiguos],
+        nao_conciliados=[lancamento_response(lancamento) for lancamento in conciliador.nao_conciliados],
+        invalidas=[LinhaInvalidaResponse(linha=linha, erro=erro) for linha, erro in invalidas],
+        alteradas_durante_a_conciliacao=alteradas,
+    )
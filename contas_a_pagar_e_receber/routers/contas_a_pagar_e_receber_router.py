@@ -1,23 +1,42 @@
+import calendar
+import json
+import os
+import uuid
 from collections import OrderedDict
-from datetime import date
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from enum import Enum
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
-from sqlalchemy import extract
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Header, Query as QueryParam, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import Date, DateTime, and_, case, extract, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session, Query, joinedload, load_only
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
 
 from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.exclusao_model import Exclusao, ENTIDADE_CONTA_A_PAGAR_E_RECEBER
 from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente
-from contas_a_pagar_e_receber.routers.fornecedor_cliente_router import FornecedorClienteResponse
-from shared.dependencies import get_db
-from shared.exceptions import NotFound
+from contas_a_pagar_e_receber.models.pagamento_model import Pagamento
+from contas_a_pagar_e_receber.routers.fornecedor_cliente_router import FornecedorClienteResponse, BuscaPorIdsRequest, \
+    MAXIMO_IDS_POR_BUSCA
+from shared import replicas
+from shared.clientes import identifica_cliente
+from shared.coalescencia import coalescedor_de_requisicoes
+from shared.dependencies import get_db, get_db_leitura, abre_sessao_na_replica
+from shared.eventos import corretor_de_eventos, publica_apos_commit, EVENTOS_DURACAO_MAXIMA_SEGUNDOS
+from shared.exceptions import NotFound, Conflict
+from shared.idempotencia import executa_com_idempotencia
+from shared.tenants import tenant_atual
 
 router = APIRouter(prefix="/contas-a-pagar-e-receber")
 
 QUANTIDADE_PERMITIDA_POR_MES = 100
+EXCLUSAO_EM_LOTE_TAMANHO = int(os.getenv("EXCLUSAO_EM_LOTE_TAMANHO", 1000))
+# Espera sugerida ao cliente SSE antes de reconectar
+EVENTOS_RECONEXAO_MILISSEGUNDOS = 3000
 
 
 class ContaPagarReceberResponse(BaseModel):
@@ -31,8 +50,7 @@ class ContaPagarReceberResponse(BaseModel):
     esta_baixada: bool | None = None
     fornecedor: FornecedorClienteResponse | None = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ContaPagarReceberTipoEnum(str, Enum):
@@ -53,83 +71,623 @@ class PrevisaoPorMes(BaseModel):
     valor_total: Decimal
 
 
+class PeriodicidadeEnum(str, Enum):
+    SEMANAL = 'SEMANAL'
+    QUINZENAL = 'QUINZENAL'
+    MENSAL = 'MENSAL'
+    BIMESTRAL = 'BIMESTRAL'
+    TRIMESTRAL = 'TRIMESTRAL'
+    SEMESTRAL = 'SEMESTRAL'
+    ANUAL = 'ANUAL'
+
+
+class ParcelamentoRequest(BaseModel):
+    conta: ContaPagarReceberRequest
+    quantidade_parcelas: int = Field(ge=2, le=360)
+    periodicidade: PeriodicidadeEnum = PeriodicidadeEnum.MENSAL
+
+
+class ParcelamentoResponse(BaseModel):
+    grupo_parcelas: str
+    parcelas: List[ContaPagarReceberResponse]
+
+
+CAMPOS_DA_CONTA = [campo for campo in ContaPagarReceberResponse.model_fields if campo != "fornecedor"]
+EXPANSOES_DA_CONTA = ["fornecedor"]
+
+
+class SelecaoDeCampos:
+    """Campos pedidos em ``fields=`` e relacionamentos pedidos em ``expand=``.
+
+    Sem ``fields`` a resposta é completa, com o fornecedor, como sempre foi.
+    Com ``fields`` só os campos pedidos são lidos do banco e serializados, e o
+    fornecedor só entra com ``expand=fornecedor``.
+    """
+
+    def __init__(self, campos: List[str] | None = None, expandir_fornecedor: bool = True):
+        self.campos = campos
+        self.expandir_fornecedor = expandir_fornecedor
+
+    @property
+    def completa(self) -> bool:
+        return self.campos is None
+
+
+def selecao_de_campos(fields: str | None = QueryParam(default=None, description="Ex.: id,valor,data_previsao"),
+                      expand: str | None = QueryParam(default=None, description="Ex.: fornecedor")
+                      ) -> SelecaoDeCampos:
+    expansoes = separa_lista(expand)
+    campos = separa_lista(fields)
+
+    if "fornecedor" in campos:
+        campos.remove("fornecedor")
+        expansoes.append("fornecedor")
+
+    desconhecidos = [campo for campo in campos if campo not in CAMPOS_DA_CONTA] + \
+                    [expansao for expansao in expansoes if expansao not in EXPANSOES_DA_CONTA]
+    if desconhecidos:
+        raise HTTPException(status_code=422, detail=f"Campos desconhecidos: {', '.join(desconhecidos)}")
+
+    if fields is None:
+        return SelecaoDeCampos()
+
+    return SelecaoDeCampos(campos=list(dict.fromkeys(["id"] + campos)),
+                           expandir_fornecedor="fornecedor" in expansoes)
+
+
+def separa_lista(valor: str | None) -> List[str]:
+    return [item.strip() for item in (valor or "").split(",") if item.strip()]
+
+
+class ContaPagarReceberBuscaResponse(BaseModel):
+    itens: List[ContaPagarReceberResponse]
+    nao_encontrados: List[int]
+
+
+class ExclusaoEmLoteRequest(BaseModel):
+    ids: List[int] | None = Field(default=None, min_length=1, max_length=MAXIMO_IDS_POR_BUSCA)
+    data_previsao_inicio: date | None = None
+    data_previsao_fim: date | None = None
+    fornecedor_cliente_id: int | None = None
+    tipo: ContaPagarReceberTipoEnum | None = None
+    simular: bool = False
+    quantidade_esperada: int | None = Field(default=None, ge=0)
+
+
+class ExclusaoEmLoteResponse(BaseModel):
+    quantidade: int
+    simulacao: bool
+    lotes: int = 0
+
+
+class PagamentoRequest(BaseModel):
+    valor: Decimal = Field(gt=0, decimal_places=2)
+    data_pagamento: date | None = None
+
+
+class PagamentoResponse(BaseModel):
+    id: int
+    conta_a_pagar_e_receber_id: int
+    valor: Decimal
+    data_pagamento: date
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PagamentoRegistradoResponse(PagamentoResponse):
+    saldo_em_aberto: Decimal
+    esta_baixada: bool
+
+
+class SaldoEmAbertoResponse(BaseModel):
+    tipo: str
+    quantidade: int
+    valor_total: Decimal
+
+
+class FaixaDeVencimentoEnum(str, Enum):
+    A_VENCER = 'A_VENCER'
+    ATRASO_0_30 = '0-30'
+    ATRASO_31_60 = '31-60'
+    ATRASO_61_90 = '61-90'
+    ATRASO_90_MAIS = '90+'
+
+
+MAXIMO_DE_DIAS_DE_ATRASO_POR_FAIXA = [
+    (30, FaixaDeVencimentoEnum.ATRASO_0_30),
+    (60, FaixaDeVencimentoEnum.ATRASO_31_60),
+    (90, FaixaDeVencimentoEnum.ATRASO_61_90),
+]
+
+
+class FaixaDeVencimentoResponse(BaseModel):
+    tipo: str
+    faixa: FaixaDeVencimentoEnum
+    quantidade: int
+    valor_total: Decimal
+
+
+class ContaVencimentoResponse(BaseModel):
+    id: int
+    descricao: str
+    tipo: str
+    data_previsao: date
+    saldo: Decimal
+    dias_de_atraso: int
+    faixa: FaixaDeVencimentoEnum
+    fornecedor_cliente_id: int | None = None
+
+
+class VencimentosResponse(BaseModel):
+    data_referencia: date
+    faixas: List[FaixaDeVencimentoResponse]
+    contas: List[ContaVencimentoResponse]
+    tem_mais: bool
+
+
 @router.get("", response_model=List[ContaPagarReceberResponse])
-def listar_contas(db: Session = Depends(get_db)) -> List[ContaPagarReceberResponse]:
-    return db.query(ContaPagarReceber).all()
+def listar_contas(db: Session = Depends(get_db_leitura),
+                  selecao: SelecaoDeCampos = Depends(selecao_de_campos)) -> List[ContaPagarReceberResponse]:
+    contas = aplica_selecao_de_campos(db.query(ContaPagarReceber), selecao).all()
+
+    if selecao.completa:
+        return contas
+    return Response(content=serializa_contas(contas, selecao), media_type="application/json")
+
+
+@router.post("/buscar", response_model=ContaPagarReceberBuscaResponse)
+def buscar_contas_por_ids(busca_request: BuscaPorIdsRequest,
+                          db: Session = Depends(get_db_leitura),
+                          selecao: SelecaoDeCampos = Depends(selecao_de_campos)) -> ContaPagarReceberBuscaResponse:
+    # Um único IN com o fornecedor no mesmo SELECT, em vez de um GET por id
+    ids = list(dict.fromkeys(busca_request.ids))
+    contas = {
+        conta.id: conta
+        for conta in aplica_selecao_de_campos(db.query(ContaPagarReceber), selecao).filter(
+            ContaPagarReceber.id.in_(ids)
+        )
+    }
+    nao_encontrados = [id_ for id_ in ids if id_ not in contas]
+
+    if not selecao.completa:
+        encontradas = serializa_contas([contas[id_] for id_ in ids if id_ in contas], selecao)
+        return Response(content=f'{{"itens":{encontradas},"nao_encontrados":{json.dumps(nao_encontrados)}}}',
+                        media_type="application/json")
+
+    return ContaPagarReceberBuscaResponse(
+        itens=[ContaPagarReceberResponse.model_validate(contas[id_]) for id_ in ids if id_ in contas],
+        nao_encontrados=nao_encontrados,
+    )
 
 
-@router.get("/previsao-gastos-por-mes", response_model=List[PrevisaoPorMes])
-def previsa_de_gatos_por_mes(db: Session = Depends(get_db), ano=date.today().year):
-    return relatorio_gastos_previstos_por_mes_de_um_ano(db, ano)
+@router.post("/excluir", response_model=ExclusaoEmLoteResponse)
+def excluir_contas_em_lote(exclusao_request: ExclusaoEmLoteRequest,
+                           db: Session = Depends(get_db)) -> ExclusaoEmLoteResponse:
+    filtros = filtros_da_exclusao_em_lote(exclusao_request)
+    quantidade = db.query(func.count(ContaPagarReceber.id)).filter(*filtros).scalar()
 
+    if exclusao_request.simular:
+        return ExclusaoEmLoteResponse(quantidade=quantidade, simulacao=True)
 
-@router.get("/{id_da_conta_a_pagar_e_receber}", response_model=ContaPagarReceberResponse)
-def obter_conta_por_id(id_da_conta_a_pagar_e_receber: int,
-                       db: Session = Depends(get_db)) -> List[ContaPagarReceberResponse]:
-    return busca_conta_por_id(id_da_conta_a_pagar_e_receber, db)
+    # A quantidade vem de uma simulação anterior: um filtro digitado errado não apaga nada
+    if exclusao_request.quantidade_esperada is None:
+        raise HTTPException(status_code=422,
+                            detail="Informe quantidade_esperada, obtida antes com simular=true")
+    if exclusao_request.quantidade_esperada != quantidade:
+        raise HTTPException(status_code=409,
+                            detail=f"O filtro seleciona {quantidade} contas, e não "
+                                   f"{exclusao_request.quantidade_esperada}. Simule de novo")
 
+    # O resumo do dashboard reflete a exclusão na próxima atualização periódica
+    excluidas, lotes = exclui_em_lotes(db, filtros, limite=quantidade)
 
-@router.post("", response_model=ContaPagarReceberResponse, status_code=201)
-def criar_conta(conta_a_pagar_e_receber_request: ContaPagarReceberRequest,
-                db: Session = Depends(get_db)) -> ContaPagarReceberResponse:
-    valida_fornecedor(conta_a_pagar_e_receber_request.fornecedor_cliente_id, db)
+    return ExclusaoEmLoteResponse(quantidade=excluidas, simulacao=False, lotes=lotes)
 
-    valida_se_pode_registrar_novas_contas(db=db, conta_a_pagar_e_receber_request=conta_a_pagar_e_receber_request)
 
-    contas_a_pagar_e_receber = ContaPagarReceber(
-        **conta_a_pagar_e_receber_request.dict()
+@router.get("/eventos", response_class=StreamingResponse)
+async def eventos_das_contas(last_event_id: str | None = Header(default=None)) -> StreamingResponse:
+    # Rota async e sem sessão: uma conexão aberta não ocupa thread nem conexão do pool
+    return StreamingResponse(gera_eventos_sse(last_event_id, tenant_atual.get()), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/previsao-gastos-por-mes", response_model=List[PrevisaoPorMes])
+async def previsa_de_gatos_por_mes(request: Request, db: Session = Depends(get_db),
+                                   ano: int = date.today().year):
+    # Quem acabou de escrever não pode receber um cálculo que começou antes da escrita
+    if replicas.registro_de_escritas.escreveu_recentemente(identifica_cliente(request.scope)):
+        return await run_in_threadpool(relatorio_gastos_previstos_por_mes_de_um_ano, db, ano)
+
+    def calcula():
+        # Sessão própria, na réplica como em get_db_leitura: a requisição que disparou o cálculo
+        # pode terminar (504, desconexão) e fechar a dela enquanto as outras aguardam o resultado
+        sessao = None if "tenant" in db.info else abre_sessao_na_replica()
+        with sessao or Session(bind=db.get_bind(), autocommit=False, autoflush=False) as sessao:
+            return relatorio_gastos_previstos_por_mes_de_um_ano(sessao, ano)
+
+    # Requisições iguais e simultâneas (ex.: fechamento do mês) usam um único cálculo. A sessão
+    # da requisição (get_db, e não get_db_leitura, que já conectaria na réplica) só serve para
+    # obter o banco e não abre conexão enquanto a requisição aguarda o resultado
+    return await coalescedor_de_requisicoes.executa("previsao-gastos-por-mes", {"ano": ano}, calcula)
+
+
+@router.get("/saldo-em-aberto", response_model=List[SaldoEmAbertoResponse])
+def saldo_em_aberto(db: Session = Depends(get_db_leitura),
+                    fornecedor_cliente_id: int | None = None) -> List[SaldoEmAbertoResponse]:
+    # Lê valor_baixa, mantido a cada pagamento, em vez de somar o histórico de pagamentos
+    saldo = ContaPagarReceber.valor - func.coalesce(ContaPagarReceber.valor_baixa, 0)
+    consulta = db.query(ContaPagarReceber.tipo, func.count(ContaPagarReceber.id), func.sum(saldo)).filter(
+        ContaPagarReceber.esta_baixada.isnot(True)
+    )
+    if fornecedor_cliente_id is not None:
+        consulta = consulta.filter(ContaPagarReceber.fornecedor_cliente_id == fornecedor_cliente_id)
+
+    linhas = consulta.group_by(ContaPagarReceber.tipo).order_by(ContaPagarReceber.tipo).all()
+
+    return [SaldoEmAbertoResponse(tipo=tipo, quantidade=quantidade, valor_total=round(valor_total, 2))
+            for tipo, quantidade, valor_total in linhas]
+
+
+@router.get("/vencimentos", response_model=VencimentosResponse)
+def vencimentos(db: Session = Depends(get_db_leitura),
+                dias: int = QueryParam(default=30, ge=0, le=366, description="Inclui as que vencem nos próximos dias"),
+                tipo: ContaPagarReceberTipoEnum | None = None,
+                fornecedor_cliente_id: int | None = None,
+                data_referencia: date | None = QueryParam(default=None, description="Padrão: hoje"),
+                limite: int = QueryParam(default=100, ge=0, le=1000)) -> VencimentosResponse:
+    # Contas em aberto vencidas ou a vencer em até `dias`, por faixa de atraso
+    hoje = data_referencia or date.today()
+    # Comparações com datas fixas, não diferenças de datas, que variam por banco
+    faixa = case(
+        (ContaPagarReceber.data_previsao > hoje, literal(FaixaDeVencimentoEnum.A_VENCER.value)),
+        *[(ContaPagarReceber.data_previsao >= hoje - timedelta(days=dias_de_atraso), literal(faixa_.value))
+          for dias_de_atraso, faixa_ in MAXIMO_DE_DIAS_DE_ATRASO_POR_FAIXA],
+        else_=literal(FaixaDeVencimentoEnum.ATRASO_90_MAIS.value)
+    ).label("faixa")
+    saldo = (ContaPagarReceber.valor - func.coalesce(ContaPagarReceber.valor_baixa, 0)).label("saldo")
+
+    # esta_baixada IS NOT TRUE é o predicado do índice parcial por data_previsao: a
+    # consulta lê só as contas em aberto, não importa quantas baixadas existam
+    filtros = [ContaPagarReceber.esta_baixada.isnot(True),
+               ContaPagarReceber.data_previsao <= hoje + timedelta(days=dias)]
+    if tipo is not None:
+        filtros.append(ContaPagarReceber.tipo == tipo)
+    if fornecedor_cliente_id is not None:
+        filtros.append(ContaPagarReceber.fornecedor_cliente_id == fornecedor_cliente_id)
+
+    faixas = db.query(ContaPagarReceber.tipo, faixa, func.count(ContaPagarReceber.id), func.sum(saldo)).filter(
+        *filtros
+    ).group_by(ContaPagarReceber.tipo, faixa).order_by(ContaPagarReceber.tipo, faixa).all()
+
+    contas = db.query(ContaPagarReceber.id, ContaPagarReceber.descricao, ContaPagarReceber.tipo,
+                      ContaPagarReceber.data_previsao, ContaPagarReceber.fornecedor_cliente_id, saldo, faixa).filter(
+        *filtros
+    ).order_by(ContaPagarReceber.data_previsao, ContaPagarReceber.id).limit(limite + 1).all()
+
+    return VencimentosResponse(
+        data_referencia=hoje,
+        faixas=[FaixaDeVencimentoResponse(tipo=tipo_, faixa=faixa_, quantidade=quantidade,
+                                          valor_total=round(valor_total, 2))
+                for tipo_, faixa_, quantidade, valor_total in faixas],
+        contas=[ContaVencimentoResponse(id=conta.id, descricao=conta.descricao, tipo=conta.tipo,
+                                        data_previsao=conta.data_previsao, saldo=round(conta.saldo, 2),
+                                        dias_de_atraso=max((hoje - conta.data_previsao).days, 0), faixa=conta.faixa,
+                                        fornecedor_cliente_id=conta.fornecedor_cliente_id)
+                for conta in contas[:limite]],
+        tem_mais=len(contas) > limite,
     )
 
-    db.add(contas_a_pagar_e_receber)
+
+@router.post("/parcelas", response_model=ParcelamentoResponse, status_code=201)
+def criar_parcelas(parcelamento_request: ParcelamentoRequest,
+                   db: Session = Depends(get_db)) -> ParcelamentoResponse:
+    conta_base = parcelamento_request.conta
+    valida_fornecedor(conta_base.fornecedor_cliente_id, db)
+
+    datas = calcula_datas_das_parcelas(conta_base.data_previsao, parcelamento_request.quantidade_parcelas,
+                                       parcelamento_request.periodicidade)
+    valida_se_pode_registrar_parcelas(db, datas)
+
+    grupo_parcelas = str(uuid.uuid4())
+    db.execute(insert(ContaPagarReceber), [
+        {**conta_base.model_dump(), "data_previsao": data_previsao, "esta_baixada": False,
+         "grupo_parcelas": grupo_parcelas, "numero_parcela": numero_parcela}
+        for numero_parcela, data_previsao in enumerate(datas, start=1)
+    ])
     db.commit()
-    db.refresh(contas_a_pagar_e_receber)
 
-    return contas_a_pagar_e_receber
+    parcelas = busca_parcelas(grupo_parcelas, db)
+    # Toda conta nasce na versão 1
+    corretor_de_eventos.publica("conta_criada", [{"id": parcela.id, "versao": 1} for parcela in parcelas.parcelas])
+    return parcelas
+
+
+@router.get("/parcelas/{grupo_parcelas}", response_model=ParcelamentoResponse)
+def obter_parcelas(grupo_parcelas: str,
+                   db: Session = Depends(get_db_leitura)) -> ParcelamentoResponse:
+    return busca_parcelas(grupo_parcelas, db)
+
+
+@router.post("/parcelas/{grupo_parcelas}/baixar", response_model=ParcelamentoResponse, status_code=200)
+def baixar_parcelas(grupo_parcelas: str,
+                    db: Session = Depends(get_db)) -> ParcelamentoResponse:
+    pendentes = and_(ContaPagarReceber.grupo_parcelas == grupo_parcelas, ContaPagarReceber.esta_baixada.isnot(True))
+    restante = ContaPagarReceber.valor - func.coalesce(ContaPagarReceber.valor_baixa, 0)
+    baixadas = db.query(ContaPagarReceber.id, ContaPagarReceber.versao + 1).filter(pendentes).all()
+
+    # O restante de cada parcela vira um pagamento, na mesma transação da baixa
+    db.execute(insert(Pagamento).from_select(
+        ["conta_a_pagar_e_receber_id", "valor", "data_pagamento", "criado_em"],
+        select(ContaPagarReceber.id, restante, literal(date.today(), Date), literal(datetime.utcnow(), DateTime))
+        .where(pendentes, restante > 0)
+    ))
+    db.execute(
+        update(ContaPagarReceber).where(pendentes).values(
+            data_baixa=date.today(),
+            esta_baixada=True,
+            valor_baixa=ContaPagarReceber.valor,
+            versao=ContaPagarReceber.versao + 1
+        ).execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    corretor_de_eventos.publica("conta_baixada", [{"id": id_, "versao": versao} for id_, versao in baixadas])
+    return busca_parcelas(grupo_parcelas, db)
+
+
+@router.get("/{id_da_conta_a_pagar_e_receber}", response_model=ContaPagarReceberResponse)
+def obter_conta_por_id(id_da_conta_a_pagar_e_receber: int,
+                       response: Response,
+                       db: Session = Depends(get_db_leitura),
+                       selecao: SelecaoDeCampos = Depends(selecao_de_campos)) -> List[ContaPagarReceberResponse]:
+    conta_a_pagar_e_receber = aplica_selecao_de_campos(db.query(ContaPagarReceber), selecao).filter(
+        ContaPagarReceber.id == id_da_conta_a_pagar_e_receber
+    ).first()
+
+    if conta_a_pagar_e_receber is None:
+        raise NotFound("Conta a Pagar e Receber")
+
+    if selecao.completa:
+        return define_etag(response, conta_a_pagar_e_receber)
+    return Response(content=serializa_conta(conta_a_pagar_e_receber, selecao), media_type="application/json",
+                    headers={"ETag": gera_etag(conta_a_pagar_e_receber)})
+
+
+@router.post("", response_model=ContaPagarReceberResponse, status_code=201)
+def criar_conta(conta_a_pagar_e_receber_request: ContaPagarReceberRequest,
+                request: Request,
+                db: Session = Depends(get_db),
+                idempotency_key: str | None = Header(default=None)) -> ContaPagarReceberResponse:
+    return executa_com_idempotencia(
+        db, request, idempotency_key, "criar_conta", conta_a_pagar_e_receber_request.model_dump(),
+        lambda: registra_conta(conta_a_pagar_e_receber_request, db),
+        ContaPagarReceberResponse, 201
+    )
 
 
 @router.put("/{id_da_conta_a_pagar_e_receber}", response_model=ContaPagarReceberResponse, status_code=200)
 def atualizar_conta(id_da_conta_a_pagar_e_receber: int,
                     conta_a_pagar_e_receber_request: ContaPagarReceberRequest,
-                    db: Session = Depends(get_db)) -> ContaPagarReceberResponse:
+                    response: Response,
+                    db: Session = Depends(get_db),
+                    if_match: str | None = Header(default=None)) -> ContaPagarReceberResponse:
     valida_fornecedor(conta_a_pagar_e_receber_request.fornecedor_cliente_id, db)
 
     conta_a_pagar_e_receber = busca_conta_por_id(id_da_conta_a_pagar_e_receber, db)
+    valida_if_match(conta_a_pagar_e_receber, if_match)
     conta_a_pagar_e_receber.tipo = conta_a_pagar_e_receber_request.tipo
-    conta_a_pagar_e_receber.valor = conta_a_pagar_e_receber_request.valor
+    atualiza_valor(conta_a_pagar_e_receber, conta_a_pagar_e_receber_request.valor)
     conta_a_pagar_e_receber.descricao = conta_a_pagar_e_receber_request.descricao
     conta_a_pagar_e_receber.fornecedor_cliente_id = conta_a_pagar_e_receber_request.fornecedor_cliente_id
 
     db.add(conta_a_pagar_e_receber)
-    db.commit()
-    db.refresh(conta_a_pagar_e_receber)
-    return conta_a_pagar_e_receber
+    salva_com_controle_de_versao(conta_a_pagar_e_receber, db)
+    publica_eventos_das_contas("conta_atualizada", [conta_a_pagar_e_receber])
+    return define_etag(response, conta_a_pagar_e_receber)
 
 
 @router.post("/{id_da_conta_a_pagar_e_receber}/baixar", response_model=ContaPagarReceberResponse, status_code=200)
 def baixar_conta(id_da_conta_a_pagar_e_receber: int,
-                 db: Session = Depends(get_db)) -> ContaPagarReceberResponse:
+                 request: Request,
+                 response: Response,
+                 db: Session = Depends(get_db),
+                 idempotency_key: str | None = Header(default=None),
+                 if_match: str | None = Header(default=None)) -> ContaPagarReceberResponse:
+    resposta = executa_com_idempotencia(
+        db, request, idempotency_key, "baixar_conta",
+        {"id": id_da_conta_a_pagar_e_receber, "if_match": if_match},
+        lambda: define_etag(response, registra_baixa(id_da_conta_a_pagar_e_receber, db, if_match)),
+        ContaPagarReceberResponse, 200
+    )
+
+    # A resposta montada pela idempotência não herda os cabeçalhos de `response`
+    if isinstance(resposta, Response) and "etag" in response.headers:
+        resposta.headers["ETag"] = response.headers["etag"]
+    return resposta
+
+
+@router.post("/{id_da_conta_a_pagar_e_receber}/pagamentos", response_model=PagamentoRegistradoResponse,
+             status_code=201)
+def registrar_pagamento(id_da_conta_a_pagar_e_receber: int,
+                        pagamento_request: PagamentoRequest,
+                        request: Request,
+                        db: Session = Depends(get_db),
+                        idempotency_key: str | None = Header(default=None)) -> PagamentoRegistradoResponse:
+    return executa_com_idempotencia(
+        db, request, idempotency_key, "registrar_pagamento",
+        {"id": id_da_conta_a_pagar_e_receber, **pagamento_request.model_dump()},
+        lambda: registra_pagamento(id_da_conta_a_pagar_e_receber, pagamento_request, db),
+        PagamentoRegistradoResponse, 201
+    )
+
+
+@router.get("/{id_da_conta_a_pagar_e_receber}/pagamentos", response_model=List[PagamentoResponse])
+def listar_pagamentos(id_da_conta_a_pagar_e_receber: int,
+                      db: Session = Depends(get_db_leitura)) -> List[PagamentoResponse]:
+    busca_conta_por_id(id_da_conta_a_pagar_e_receber, db)
+
+    return db.query(Pagamento).filter(
+        Pagamento.conta_a_pagar_e_receber_id == id_da_conta_a_pagar_e_receber
+    ).order_by(Pagamento.data_pagamento, Pagamento.id).all()
+
+
+@router.delete("/{id_da_conta_a_pagar_e_receber}", status_code=204)
+def excluir_conta(id_da_conta_a_pagar_e_receber: int,
+                  db: Session = Depends(get_db)) -> None:
     conta_a_pagar_e_receber = busca_conta_por_id(id_da_conta_a_pagar_e_receber, db)
+    evento = {"id": conta_a_pagar_e_receber.id, "versao": conta_a_pagar_e_receber.versao}
+
+    db.query(Pagamento).filter(Pagamento.conta_a_pagar_e_receber_id == id_da_conta_a_pagar_e_receber).delete()
+    db.delete(conta_a_pagar_e_receber)
+    db.add(Exclusao(entidade=ENTIDADE_CONTA_A_PAGAR_E_RECEBER, entidade_id=id_da_conta_a_pagar_e_receber))
+    db.commit()
+
+    corretor_de_eventos.publica("conta_excluida", [evento])
+
+
+def registra_conta(conta_a_pagar_e_receber_request: ContaPagarReceberRequest, db: Session) -> ContaPagarReceber:
+    valida_fornecedor(conta_a_pagar_e_receber_request.fornecedor_cliente_id, db)
+
+    valida_se_pode_registrar_novas_contas(db=db, conta_a_pagar_e_receber_request=conta_a_pagar_e_receber_request)
+
+    contas_a_pagar_e_receber = ContaPagarReceber(
+        **conta_a_pagar_e_receber_request.model_dump()
+    )
+
+    db.add(contas_a_pagar_e_receber)
+    db.flush()
+    db.refresh(contas_a_pagar_e_receber)
+
+    publica_eventos_das_contas("conta_criada", [contas_a_pagar_e_receber], db)
+    return contas_a_pagar_e_receber
+
+
+def atualiza_valor(conta_a_pagar_e_receber: ContaPagarReceber, valor: Decimal) -> None:
+    """Troca o valor mantendo ``valor_baixa <= valor`` e a baixa coerente com o novo saldo.
+
+    Tudo vai no mesmo UPDATE versionado da atualização: um pagamento simultâneo
+    muda a versão e a atualização recebe 409.
+    """
+    valor_baixa = conta_a_pagar_e_receber.valor_baixa
+    if valor_baixa is not None and valor < valor_baixa:
+        raise HTTPException(status_code=422, detail="O valor da conta não pode ser menor que o valor já pago")
+
+    conta_a_pagar_e_receber.valor = valor
+    if valor_baixa is None:
+        return
+
+    quitada = valor_baixa >= valor
+    if quitada and not conta_a_pagar_e_receber.esta_baixada:
+        conta_a_pagar_e_receber.data_baixa = date.today()
+    elif not quitada:
+        conta_a_pagar_e_receber.data_baixa = None
+    conta_a_pagar_e_receber.esta_baixada = quitada
+
+
+def registra_baixa(id_da_conta_a_pagar_e_receber: int, db: Session,
+                   if_match: str | None = None) -> ContaPagarReceber:
+    conta_a_pagar_e_receber = busca_conta_por_id(id_da_conta_a_pagar_e_receber, db)
+    valida_if_match(conta_a_pagar_e_receber, if_match)
 
     if conta_a_pagar_e_receber.esta_baixada and conta_a_pagar_e_receber.valor == conta_a_pagar_e_receber.valor_baixa:
         return conta_a_pagar_e_receber
 
+    restante = conta_a_pagar_e_receber.valor - (conta_a_pagar_e_receber.valor_baixa or 0)
+    if restante > 0:
+        db.add(Pagamento(conta_a_pagar_e_receber_id=conta_a_pagar_e_receber.id, valor=restante,
+                         data_pagamento=date.today()))
+
     conta_a_pagar_e_receber.data_baixa = date.today()
     conta_a_pagar_e_receber.esta_baixada = True
     conta_a_pagar_e_receber.valor_baixa = conta_a_pagar_e_receber.valor
 
     db.add(conta_a_pagar_e_receber)
-    db.commit()
-    db.refresh(conta_a_pagar_e_receber)
+    aplica_com_controle_de_versao(conta_a_pagar_e_receber, db)
+    publica_eventos_das_contas("conta_baixada", [conta_a_pagar_e_receber], db)
     return conta_a_pagar_e_receber
 
 
-@router.delete("/{id_da_conta_a_pagar_e_receber}", status_code=204)
-def excluir_conta(id_da_conta_a_pagar_e_receber: int,
-                  db: Session = Depends(get_db)) -> None:
+def registra_pagamento(id_da_conta_a_pagar_e_receber: int, pagamento_request: PagamentoRequest,
+                       db: Session) -> PagamentoRegistradoResponse:
+    data_pagamento = pagamento_request.data_pagamento or date.today()
+
+    # O novo total pago é calculado e conferido no próprio UPDATE: pagamentos
+    # simultâneos na mesma conta se somam e nunca ultrapassam o valor dela.
+    valor_baixa = func.round(func.coalesce(ContaPagarReceber.valor_baixa, 0) + pagamento_request.valor, 2)
+    quitada = valor_baixa >= ContaPagarReceber.valor
+
+    resultado = db.execute(
+        update(ContaPagarReceber).where(
+            ContaPagarReceber.id == id_da_conta_a_pagar_e_receber,
+            valor_baixa <= ContaPagarReceber.valor
+        ).values(
+            valor_baixa=valor_baixa,
+            esta_baixada=quitada,
+            data_baixa=case((quitada, data_pagamento), else_=ContaPagarReceber.data_baixa),
+            versao=ContaPagarReceber.versao + 1
+        ).execution_options(synchronize_session=False)
+    )
+
+    if resultado.rowcount == 0:
+        busca_conta_por_id(id_da_conta_a_pagar_e_receber, db)
+        raise HTTPException(status_code=422, detail="O valor do pagamento ultrapassa o saldo em aberto da conta")
+
+    pagamento = Pagamento(conta_a_pagar_e_receber_id=id_da_conta_a_pagar_e_receber,
+                          valor=pagamento_request.valor, data_pagamento=data_pagamento)
+    db.add(pagamento)
+    db.flush()
+
     conta_a_pagar_e_receber = busca_conta_por_id(id_da_conta_a_pagar_e_receber, db)
+    publica_eventos_das_contas("conta_baixada" if conta_a_pagar_e_receber.esta_baixada else "conta_atualizada",
+                               [conta_a_pagar_e_receber], db)
+    return PagamentoRegistradoResponse(
+        id=pagamento.id,
+        conta_a_pagar_e_receber_id=id_da_conta_a_pagar_e_receber,
+        valor=pagamento.valor,
+        data_pagamento=pagamento.data_pagamento,
+        saldo_em_aberto=conta_a_pagar_e_receber.valor - conta_a_pagar_e_receber.valor_baixa,
+        esta_baixada=conta_a_pagar_e_receber.esta_baixada,
+    )
 
-    db.delete(conta_a_pagar_e_receber)
+
+def gera_etag(conta_a_pagar_e_receber: ContaPagarReceber) -> str:
+    return f'"{conta_a_pagar_e_receber.versao}"'
+
+
+def define_etag(response: Response, conta_a_pagar_e_receber: ContaPagarReceber) -> ContaPagarReceber:
+    response.headers["ETag"] = gera_etag(conta_a_pagar_e_receber)
+    return conta_a_pagar_e_receber
+
+
+def valida_if_match(conta_a_pagar_e_receber: ContaPagarReceber, if_match: str | None) -> None:
+    if if_match is None:
+        return
+
+    # A versão é comparada como ETag fraco: W/"3" e "3" são equivalentes
+    etags = {etag.strip().removeprefix("W/") for etag in if_match.split(",")}
+    if "*" not in etags and gera_etag(conta_a_pagar_e_receber) not in etags:
+        raise Conflict("Conta a Pagar e Receber", gera_etag(conta_a_pagar_e_receber))
+
+
+def salva_com_controle_de_versao(conta_a_pagar_e_receber: ContaPagarReceber, db: Session) -> None:
+    aplica_com_controle_de_versao(conta_a_pagar_e_receber, db)
     db.commit()
+    db.refresh(conta_a_pagar_e_receber)
+
+
+def aplica_com_controle_de_versao(conta_a_pagar_e_receber: ContaPagarReceber, db: Session) -> None:
+    """Envia o UPDATE versionado da conta sem confirmar a transação."""
+    id_da_conta_a_pagar_e_receber = conta_a_pagar_e_receber.id
+    try:
+        db.flush()
+    except StaleDataError:
+        # Outra requisição alterou a conta entre a leitura e o UPDATE. Não
+        # tentamos de novo aqui: quem decide é o cliente, com a versão atual.
+        db.rollback()
+        versao_atual = db.query(ContaPagarReceber.versao).filter(
+            ContaPagarReceber.id == id_da_conta_a_pagar_e_receber
+        ).scalar()
+        raise Conflict("Conta a Pagar e Receber", f'"{versao_atual}"' if versao_atual is not None else None)
 
 
 def busca_conta_por_id(id_da_conta_a_pagar_e_receber: int, db: Session) -> ContaPagarReceber:
@@ -141,6 +699,136 @@ def busca_conta_por_id(id_da_conta_a_pagar_e_receber: int, db: Session) -> Conta
     return conta_a_pagar_e_receber
 
 
+def filtros_da_exclusao_em_lote(exclusao_request: ExclusaoEmLoteRequest) -> list:
+    filtros = []
+    if exclusao_request.ids is not None:
+        filtros.append(ContaPagarReceber.id.in_(exclusao_request.ids))
+    if exclusao_request.data_previsao_inicio is not None:
+        filtros.append(ContaPagarReceber.data_previsao >= exclusao_request.data_previsao_inicio)
+    if exclusao_request.data_previsao_fim is not None:
+        filtros.append(ContaPagarReceber.data_previsao <= exclusao_request.data_previsao_fim)
+    if exclusao_request.fornecedor_cliente_id is not None:
+        filtros.append(ContaPagarReceber.fornecedor_cliente_id == exclusao_request.fornecedor_cliente_id)
+    if exclusao_request.tipo is not None:
+        filtros.append(ContaPagarReceber.tipo == exclusao_request.tipo)
+
+    if not filtros:
+        raise HTTPException(status_code=422, detail="Informe ao menos um filtro para a exclusão em lote")
+
+    return filtros
+
+
+def exclui_em_lotes(db: Session, filtros: list, limite: int) -> tuple:
+    """Exclui as contas do filtro em transações de até ``EXCLUSAO_EM_LOTE_TAMANHO`` linhas.
+
+    Cada lote trava poucas linhas por pouco tempo. Nunca exclui mais que
+    ``limite`` contas, mesmo que novas contas passem a atender o filtro.
+    """
+    excluidas = lotes = 0
+    while excluidas < limite:
+        linhas = db.query(ContaPagarReceber.id, ContaPagarReceber.versao).filter(*filtros).order_by(
+            ContaPagarReceber.id
+        ).limit(min(EXCLUSAO_EM_LOTE_TAMANHO, limite - excluidas)).all()
+        if not linhas:
+            break
+
+        ids = [id_ for id_, _ in linhas]
+
+        db.query(Pagamento).filter(Pagamento.conta_a_pagar_e_receber_id.in_(ids)).delete(synchronize_session=False)
+        excluidas += db.query(ContaPagarReceber).filter(ContaPagarReceber.id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        db.execute(insert(Exclusao), [{"entidade": ENTIDADE_CONTA_A_PAGAR_E_RECEBER, "entidade_id": id_}
+                                      for id_ in ids])
+        db.commit()
+        lotes += 1
+
+        corretor_de_eventos.publica("conta_excluida", [{"id": id_, "versao": versao} for id_, versao in linhas])
+
+    return excluidas, lotes
+
+
+async def gera_eventos_sse(ultimo_id: str | None, tenant: str | None = None):
+    yield f"retry: {EVENTOS_RECONEXAO_MILISSEGUNDOS}\n\n"
+    async for evento in corretor_de_eventos.assina(ultimo_id, duracao_maxima=EVENTOS_DURACAO_MAXIMA_SEGUNDOS,
+                                                   tenant=tenant):
+        # None é o heartbeat: um comentário SSE que mantém proxies e balanceadores com a conexão aberta
+        yield ": ping\n\n" if evento is None else evento.formata_sse()
+
+
+def publica_eventos_das_contas(tipo: str, contas: List, db: Session | None = None) -> None:
+    # Só id e versão: o cliente busca o que precisar em POST /buscar, e o NOTIFY tem limite de tamanho
+    dados = [{"id": conta.id, "versao": conta.versao} for conta in contas]
+    if db is not None:
+        # Escrita ainda não confirmada: os eventos saem no commit de db
+        publica_apos_commit(db, tipo, dados)
+    else:
+        corretor_de_eventos.publica(tipo, dados)
+
+
+def aplica_selecao_de_campos(consulta: Query, selecao: SelecaoDeCampos) -> Query:
+    if selecao.completa:
+        return consulta.options(joinedload(ContaPagarReceber.fornecedor))
+
+    # versao é sempre lida porque é o ETag da conta
+    colunas = [getattr(ContaPagarReceber, campo) for campo in selecao.campos] + [ContaPagarReceber.versao]
+    if selecao.expandir_fornecedor:
+        return consulta.options(load_only(*colunas, ContaPagarReceber.fornecedor_cliente_id),
+                                joinedload(ContaPagarReceber.fornecedor))
+
+    return consulta.options(load_only(*colunas))
+
+
+def serializa_conta(conta_a_pagar_e_receber: ContaPagarReceber, selecao: SelecaoDeCampos) -> str:
+    valores = {campo: getattr(conta_a_pagar_e_receber, campo) for campo in selecao.campos}
+    if selecao.expandir_fornecedor:
+        fornecedor = conta_a_pagar_e_receber.fornecedor
+        valores["fornecedor"] = FornecedorClienteResponse.model_validate(fornecedor) if fornecedor is not None else None
+
+    # model_construct() não valida: os campos já vêm tipados do banco
+    return ContaPagarReceberResponse.model_construct(**valores).model_dump_json(include=set(valores))
+
+
+def serializa_contas(contas: List[ContaPagarReceber], selecao: SelecaoDeCampos) -> str:
+    return "[" + ",".join(serializa_conta(conta, selecao) for conta in contas) + "]"
+
+
+def busca_parcelas(grupo_parcelas: str, db: Session) -> ParcelamentoResponse:
+    parcelas = db.query(ContaPagarReceber).options(
+        joinedload(ContaPagarReceber.fornecedor)
+    ).filter(
+        ContaPagarReceber.grupo_parcelas == grupo_parcelas
+    ).order_by(ContaPagarReceber.numero_parcela).all()
+
+    if not parcelas:
+        raise NotFound("Parcelamento")
+
+    return ParcelamentoResponse(grupo_parcelas=grupo_parcelas,
+                                parcelas=[ContaPagarReceberResponse.model_validate(parcela) for parcela in parcelas])
+
+
+def calcula_datas_das_parcelas(primeira_data: date, quantidade_parcelas: int,
+                               periodicidade: PeriodicidadeEnum) -> List[date]:
+    dias_por_periodo = {PeriodicidadeEnum.SEMANAL: 7, PeriodicidadeEnum.QUINZENAL: 14}
+    meses_por_periodo = {PeriodicidadeEnum.MENSAL: 1, PeriodicidadeEnum.BIMESTRAL: 2,
+                         PeriodicidadeEnum.TRIMESTRAL: 3, PeriodicidadeEnum.SEMESTRAL: 6,
+                         PeriodicidadeEnum.ANUAL: 12}
+
+    if periodicidade in dias_por_periodo:
+        return [primeira_data + timedelta(days=dias_por_periodo[periodicidade] * i)
+                for i in range(quantidade_parcelas)]
+
+    return [adiciona_meses(primeira_data, meses_por_periodo[periodicidade] * i) for i in range(quantidade_parcelas)]
+
+
+def adiciona_meses(data: date, meses: int) -> date:
+    ano, mes = divmod(data.month - 1 + meses, 12)
+    ano += data.year
+    mes += 1
+    # Dia 31 vira o último dia dos meses mais curtos
+    return date(ano, mes, min(data.day, calendar.monthrange(ano, mes)[1]))
+
+
 def valida_fornecedor(fornecedor_cliente_id, db):
     if fornecedor_cliente_id is not None:
         conta_a_pagar_e_receber = db.query(FornecedorCliente).get(fornecedor_cliente_id)
@@ -157,19 +845,53 @@ def valida_se_pode_registrar_novas_contas(
         raise HTTPException(status_code=422, detail="Você não pode mais lançar contas para esse mês")
 
 
+def valida_se_pode_registrar_parcelas(db: Session, datas: List[date]) -> None:
+    novas_por_mes = {}
+    for data in datas:
+        novas_por_mes[(data.year, data.month)] = novas_por_mes.get((data.year, data.month), 0) + 1
+
+    existentes_por_mes = recupera_numero_registros_por_mes(db, list(novas_por_mes))
+
+    for (ano, mes), novas in sorted(novas_por_mes.items()):
+        if existentes_por_mes.get((ano, mes), 0) + novas > QUANTIDADE_PERMITIDA_POR_MES:
+            raise HTTPException(status_code=422,
+                                detail=f"Você não pode mais lançar contas para {mes:02d}/{ano}")
+
+
+def recupera_numero_registros_por_mes(db: Session, meses: List[tuple]) -> dict:
+    # Uma única consulta agrupada para todos os meses, em vez de um COUNT por mês
+    ano_da_conta = extract('year', ContaPagarReceber.data_previsao)
+    mes_da_conta = extract('month', ContaPagarReceber.data_previsao)
+
+    linhas = db.query(ano_da_conta, mes_da_conta, func.count(ContaPagarReceber.id)).filter(
+        or_(*[intervalo_do_mes(ano, mes) for ano, mes in meses])
+    ).group_by(ano_da_conta, mes_da_conta).all()
+
+    return {(int(ano), int(mes)): quantidade for ano, mes, quantidade in linhas}
+
+
+def intervalo_do_mes(ano: int, mes: int):
+    inicio = date(ano, mes, 1)
+    fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+
+    return and_(ContaPagarReceber.data_previsao >= inicio, ContaPagarReceber.data_previsao < fim)
+
+
 def recupera_numero_registros(db, ano, mes) -> int:
-    quantidade_de_registros = db.query(ContaPagarReceber).filter(
-        extract('year', ContaPagarReceber.data_previsao) == ano
-    ).filter(
-        extract('month', ContaPagarReceber.data_previsao) == mes
-    ).count()
+    quantidade_de_registros = consulta_contas_do_mes(db, ano, mes).count()
 
     return quantidade_de_registros
 
 
+def consulta_contas_do_mes(db: Session, ano: int, mes: int) -> Query:
+    # Intervalo de datas em vez de extract() para usar índices e o pruning das partições
+    return db.query(ContaPagarReceber).filter(intervalo_do_mes(ano, mes))
+
+
 def relatorio_gastos_previstos_por_mes_de_um_ano(db, ano) -> List[PrevisaoPorMes]:
     contas = db.query(ContaPagarReceber).filter(
-        extract('year', ContaPagarReceber.data_previsao) == ano
+        ContaPagarReceber.data_previsao >= date(ano, 1, 1),
+        ContaPagarReceber.data_previsao < date(ano + 1, 1, 1)
     ).filter(
         ContaPagarReceber.tipo == ContaPagarReceberTipoEnum.PAGAR
     ).order_by(ContaPagarReceber.data_previsao).all()
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List
+
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import extract, func, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.resumo_mensal_model import ResumoMensal, AtualizacaoDeResumo
+from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import adiciona_meses
+from shared.database import SessionLocal
+from shared.dependencies import get_db_leitura
+from shared.executor_de_tarefas import executa_periodicamente
+from shared.metricas import registra_metricas
+from shared.tenants import fabricas_de_sessoes_ativas
+
+router = APIRouter(prefix="/dashboard")
+
+DASHBOARD_MESES = int(os.getenv("DASHBOARD_MESES", 24))
+DASHBOARD_INTERVALO_ATUALIZACAO_SEGUNDOS = float(os.getenv("DASHBOARD_INTERVALO_ATUALIZACAO_SEGUNDOS", 300))
+
+NOME_DO_RESUMO = ResumoMensal.__tablename__
+
+
+class ResumoMensalResponse(BaseModel):
+    ano: int
+    mes: int
+    tipo: str
+    esta_baixada: bool
+    quantidade: int
+    valor_total: Decimal
+    valor_baixado: Decimal
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DashboardResponse(BaseModel):
+    atualizado_em: datetime | None = None
+    segundos_desde_atualizacao: float | None = None
+    meses: List[ResumoMensalResponse]
+
+
+class EstatisticasDeAtualizacao:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.total_atualizacoes = 0
+        self.total_falhas = 0
+        self.duracao_ultima_atualizacao_segundos = None
+        self.ultimo_erro = None
+
+    def registra_sucesso(self, duracao: float) -> None:
+        with self._trava:
+            self.total_atualizacoes += 1
+            self.duracao_ultima_atualizacao_segundos = duracao
+
+    def registra_falha(self, erro: Exception) -> None:
+        with self._trava:
+            self.total_falhas += 1
+            self.ultimo_erro = str(erro)
+
+    def metricas(self) -> dict:
+        return {
+            "total_atualizacoes": self.total_atualizacoes,
+            "total_falhas": self.total_falhas,
+            "duracao_ultima_atualizacao_segundos": self.duracao_ultima_atualizacao_segundos,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+estatisticas = EstatisticasDeAtualizacao()
+registra_metricas("dashboard", estatisticas.metricas)
+
+_parar_atualizacao: threading.Event | None = None
+
+
+@router.get("", response_model=DashboardResponse)
+def obter_dashboard(db: Session = Depends(get_db_leitura)) -> DashboardResponse:
+    # Só lê o resumo: o custo da agregação fica com a atualização periódica
+    atualizacao = db.query(AtualizacaoDeResumo).get(NOME_DO_RESUMO)
+    atualizado_em = atualizacao.atualizado_em if atualizacao is not None else None
+
+    meses = db.query(ResumoMensal).order_by(
+        ResumoMensal.ano, ResumoMensal.mes, ResumoMensal.tipo, ResumoMensal.esta_baixada
+    ).all()
+
+    return DashboardResponse(
+        atualizado_em=atualizado_em,
+        segundos_desde_atualizacao=(datetime.utcnow() - atualizado_em).total_seconds() if atualizado_em else None,
+        meses=[ResumoMensalResponse.model_validate(mes) for mes in meses],
+    )
+
+
+def atualiza_resumo_mensal(db: Session, intervalo_minimo_segundos: float = 0) -> bool:
+    """Recalcula o resumo dos últimos ``DASHBOARD_MESES`` meses numa única transação.
+
+    Quem lê o dashboard continua vendo o resumo anterior até o commit. Devolve
+    False quando outra atualização terminou há menos de ``intervalo_minimo_segundos``.
+    """
+    inicio = time.monotonic()
+    agora = datetime.utcnow()
+
+    # Trava a linha de controle para duas instâncias não recalcularem ao mesmo tempo
+    atualizacao = db.query(AtualizacaoDeResumo).filter(
+        AtualizacaoDeResumo.nome == NOME_DO_RESUMO
+    ).with_for_update().first()
+    if atualizacao is None:
+        atualizacao = AtualizacaoDeResumo(nome=NOME_DO_RESUMO)
+        db.add(atualizacao)
+    elif atualizacao.atualizado_em is not None and \
+            (agora - atualizacao.atualizado_em).total_seconds() < intervalo_minimo_segundos:
+        db.rollback()
+        return False
+
+    primeiro_mes = adiciona_meses(date.today().replace(day=1), -(DASHBOARD_MESES - 1))
+    mes_seguinte = adiciona_meses(date.today().replace(day=1), 1)
+
+    ano = extract('year', ContaPagarReceber.data_previsao)
+    mes = extract('month', ContaPagarReceber.data_previsao)
+    esta_baixada = func.coalesce(ContaPagarReceber.esta_baixada, False)
+
+    db.query(ResumoMensal).delete()
+    db.execute(insert(ResumoMensal).from_select(
+        ["ano", "mes", "tipo", "esta_baixada", "quantidade", "valor_total", "valor_baixado"],
+        select(
+            ano, mes, ContaPagarReceber.tipo, esta_baixada,
+            func.count(ContaPagarReceber.id),
+            func.round(func.sum(ContaPagarReceber.valor), 2),
+            func.round(func.sum(func.coalesce(ContaPagarReceber.valor_baixa, 0)), 2),
+        ).where(
+            ContaPagarReceber.data_previsao >= primeiro_mes,
+            ContaPagarReceber.data_previsao < mes_seguinte
+        ).group_by(ano, mes, ContaPagarReceber.tipo, esta_baixada)
+    ))
+    atualizacao.atualizado_em = agora
+    db.commit()
+
+    estatisticas.registra_sucesso(time.monotonic() - inicio)
+    return True
+
+
+def atualiza_resumo_mensal_em_segundo_plano(fabrica_de_sessoes: sessionmaker = SessionLocal) -> None:
+    db = fabrica_de_sessoes()
+    try:
+        atualiza_resumo_mensal(db, intervalo_minimo_segundos=DASHBOARD_INTERVALO_ATUALIZACAO_SEGUNDOS / 2)
+    except Exception as erro:
+        db.rollback()
+        estatisticas.registra_falha(erro)
+    finally:
+        db.close()
+
+
+def atualiza_resumos_em_segundo_plano() -> None:
+    for fabrica_de_sessoes in fabricas_de_sessoes_ativas(SessionLocal):
+        atualiza_resumo_mensal_em_segundo_plano(fabrica_de_sessoes)
+
+
+def inicia_atualizacao_periodica() -> None:
+    global _parar_atualizacao
+    _parar_atualizacao = executa_periodicamente("dashboard", atualiza_resumos_em_segundo_plano,
+                                                DASHBOARD_INTERVALO_ATUALIZACAO_SEGUNDOS)
+
+
+def encerra_atualizacao_periodica() -> None:
+    if _parar_atualizacao is not None:
+        _parar_atualizacao.set()
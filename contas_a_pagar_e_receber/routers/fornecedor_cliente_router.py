@@ -1,52 +1,205 @@
-from typing import List
+import os
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import List, Tuple
 
-from fastapi import APIRouter, Depends
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import and_, case, func, insert, select, update
 from sqlalchemy.orm import Session
 
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.exclusao_model import Exclusao, ENTIDADE_FORNECEDOR_CLIENTE
 from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente
-from shared.dependencies import get_db
+from shared.dependencies import get_db, get_db_leitura
+from shared.eventos import corretor_de_eventos
 from shared.exceptions import NotFound
+from shared.idempotencia import executa_com_idempotencia
 
 router = APIRouter(prefix="/fornecedor-cliente")
 
+MAXIMO_IDS_POR_BUSCA = int(os.getenv("MAXIMO_IDS_POR_BUSCA", 500))
+MESCLAGEM_TAMANHO_DO_LOTE = int(os.getenv("MESCLAGEM_TAMANHO_DO_LOTE", 1000))
+
 
 class FornecedorClienteResponse(BaseModel):
     id: int
     nome: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class FornecedorClienteRequest(BaseModel):
     nome: str = Field(min_length=3, max_length=255)
 
 
+class BuscaPorIdsRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=MAXIMO_IDS_POR_BUSCA)
+
+
+class FornecedorClienteBuscaResponse(BaseModel):
+    itens: List[FornecedorClienteResponse]
+    nao_encontrados: List[int]
+
+
+class ResumoPorTipo(BaseModel):
+    quantidade_em_aberto: int
+    valor_em_aberto: Decimal
+    quantidade_baixadas: int
+    valor_baixado: Decimal
+
+
+class ResumoFornecedorClienteResponse(BaseModel):
+    id: int
+    nome: str
+    valor_total: Decimal
+    pagar: ResumoPorTipo
+    receber: ResumoPorTipo
+
+
+class OrdenacaoResumoEnum(str, Enum):
+    VALOR_TOTAL = 'valor_total'
+    VALOR_EM_ABERTO_PAGAR = 'valor_em_aberto_pagar'
+    VALOR_EM_ABERTO_RECEBER = 'valor_em_aberto_receber'
+    NOME = 'nome'
+
+
+class OrdemEnum(str, Enum):
+    ASC = 'asc'
+    DESC = 'desc'
+
+
+class FornecedorClienteDuplicadoResponse(BaseModel):
+    id: int
+    nome: str
+    quantidade_contas: int
+
+
+class DuplicadosResponse(BaseModel):
+    nome_normalizado: str
+    fornecedores: List[FornecedorClienteDuplicadoResponse]
+
+
+class MesclagemRequest(BaseModel):
+    ids_duplicados: List[int] = Field(min_length=1, max_length=MAXIMO_IDS_POR_BUSCA)
+
+
+class MesclagemResponse(BaseModel):
+    fornecedor_cliente: FornecedorClienteResponse
+    excluidos: List[int]
+    contas_transferidas: int
+    lotes: int
+
+
 @router.get("", response_model=List[FornecedorClienteResponse])
-def listar_fornecedor_cliente(db: Session = Depends(get_db)) -> List[FornecedorClienteResponse]:
+def listar_fornecedor_cliente(db: Session = Depends(get_db_leitura)) -> List[FornecedorClienteResponse]:
     return db.query(FornecedorCliente).all()
 
 
+@router.post("/buscar", response_model=FornecedorClienteBuscaResponse)
+def buscar_fornecedores_cliente_por_ids(busca_request: BuscaPorIdsRequest,
+                                        db: Session = Depends(get_db_leitura)) -> FornecedorClienteBuscaResponse:
+    ids = list(dict.fromkeys(busca_request.ids))
+    fornecedores = {
+        fornecedor.id: fornecedor
+        for fornecedor in db.query(FornecedorCliente).filter(FornecedorCliente.id.in_(ids))
+    }
+
+    return FornecedorClienteBuscaResponse(
+        itens=[FornecedorClienteResponse.model_validate(fornecedores[id_]) for id_ in ids if id_ in fornecedores],
+        nao_encontrados=[id_ for id_ in ids if id_ not in fornecedores],
+    )
+
+
+@router.get("/resumo", response_model=List[ResumoFornecedorClienteResponse])
+def resumo_por_fornecedor_cliente(db: Session = Depends(get_db_leitura),
+                                  ordenar_por: OrdenacaoResumoEnum = OrdenacaoResumoEnum.VALOR_TOTAL,
+                                  ordem: OrdemEnum = OrdemEnum.DESC,
+                                  pagina: int = Query(default=1, ge=1),
+                                  tamanho_pagina: int = Query(default=50, ge=1, le=500)
+                                  ) -> List[ResumoFornecedorClienteResponse]:
+    if ordenar_por == OrdenacaoResumoEnum.NOME:
+        # A página sai só da tabela de fornecedores, e só as contas dela são agregadas
+        nome = FornecedorCliente.nome.desc() if ordem == OrdemEnum.DESC else FornecedorCliente.nome.asc()
+        ids_da_pagina = select(db.query(FornecedorCliente.id).order_by(nome, FornecedorCliente.id).offset(
+            (pagina - 1) * tamanho_pagina
+        ).limit(tamanho_pagina).subquery().c.id)
+        totais = agrega_contas_por_fornecedor_cliente(db, ids_da_pagina)
+
+        linhas = db.query(FornecedorCliente.id, FornecedorCliente.nome, totais).outerjoin(
+            totais, totais.c.fornecedor_cliente_id == FornecedorCliente.id
+        ).filter(FornecedorCliente.id.in_(ids_da_pagina)).order_by(nome, FornecedorCliente.id).all()
+
+        return [monta_resumo(linha) for linha in linhas]
+
+    totais = agrega_contas_por_fornecedor_cliente(db)
+
+    colunas_de_ordenacao = {
+        OrdenacaoResumoEnum.VALOR_TOTAL: func.coalesce(totais.c.valor_total, 0),
+        OrdenacaoResumoEnum.VALOR_EM_ABERTO_PAGAR: func.coalesce(totais.c.valor_em_aberto_pagar, 0),
+        OrdenacaoResumoEnum.VALOR_EM_ABERTO_RECEBER: func.coalesce(totais.c.valor_em_aberto_receber, 0),
+    }
+    coluna = colunas_de_ordenacao[ordenar_por]
+
+    # Ordenado por um total, a página depende de todas as contas: os totais são
+    # agregados antes do join, então o join só vê uma linha por fornecedor
+    linhas = db.query(FornecedorCliente.id, FornecedorCliente.nome, totais).outerjoin(
+        totais, totais.c.fornecedor_cliente_id == FornecedorCliente.id
+    ).order_by(
+        coluna.desc() if ordem == OrdemEnum.DESC else coluna.asc(), FornecedorCliente.id
+    ).offset((pagina - 1) * tamanho_pagina).limit(tamanho_pagina).all()
+
+    return [monta_resumo(linha) for linha in linhas]
+
+
+@router.get("/duplicados", response_model=List[DuplicadosResponse])
+def duplicados_por_nome(db: Session = Depends(get_db_leitura),
+                        pagina: int = Query(default=1, ge=1),
+                        tamanho_pagina: int = Query(default=50, ge=1, le=500)) -> List[DuplicadosResponse]:
+    # O GROUP BY percorre o índice de nome_normalizado, sem ordenar a tabela
+    nomes = [nome for nome, in db.query(FornecedorCliente.nome_normalizado).filter(
+        FornecedorCliente.nome_normalizado.isnot(None)
+    ).group_by(FornecedorCliente.nome_normalizado).having(
+        func.count(FornecedorCliente.id) > 1
+    ).order_by(FornecedorCliente.nome_normalizado).offset((pagina - 1) * tamanho_pagina).limit(tamanho_pagina)]
+    if not nomes:
+        return []
+
+    fornecedores = db.query(FornecedorCliente).filter(FornecedorCliente.nome_normalizado.in_(nomes)).all()
+    quantidades = dict(db.query(ContaPagarReceber.fornecedor_cliente_id, func.count(ContaPagarReceber.id)).filter(
+        ContaPagarReceber.fornecedor_cliente_id.in_([fornecedor.id for fornecedor in fornecedores])
+    ).group_by(ContaPagarReceber.fornecedor_cliente_id).all())
+
+    grupos = {nome: [] for nome in nomes}
+    for fornecedor in fornecedores:
+        grupos[fornecedor.nome_normalizado].append(FornecedorClienteDuplicadoResponse(
+            id=fornecedor.id, nome=fornecedor.nome, quantidade_contas=quantidades.get(fornecedor.id, 0)
+        ))
+
+    # Em cada grupo, primeiro o fornecedor com mais contas: o candidato natural a ser mantido
+    return [DuplicadosResponse(nome_normalizado=nome, fornecedores=sorted(
+        grupo, key=lambda fornecedor: (-fornecedor.quantidade_contas, fornecedor.id)
+    )) for nome, grupo in grupos.items()]
+
+
 @router.get("/{id_do_fornecedor_cliente}", response_model=FornecedorClienteResponse)
 def obter_fornecedor_cliente_por_id(id_do_fornecedor_cliente: int,
-                                    db: Session = Depends(get_db)) -> List[FornecedorClienteResponse]:
+                                    db: Session = Depends(get_db_leitura)) -> List[FornecedorClienteResponse]:
     return busca_fornecedor_cliente_por_id(id_do_fornecedor_cliente, db)
 
 
 @router.post("", response_model=FornecedorClienteResponse, status_code=201)
 def criar_fornecedor_cliente(fornecedor_cliente_request: FornecedorClienteRequest,
-                             db: Session = Depends(get_db)) -> FornecedorClienteResponse:
-    fornecedor_cliente = FornecedorCliente(
-        **fornecedor_cliente_request.dict()
+                             request: Request,
+                             db: Session = Depends(get_db),
+                             idempotency_key: str | None = Header(default=None)) -> FornecedorClienteResponse:
+    return executa_com_idempotencia(
+        db, request, idempotency_key, "criar_fornecedor_cliente", fornecedor_cliente_request.model_dump(),
+        lambda: registra_fornecedor_cliente(fornecedor_cliente_request, db),
+        FornecedorClienteResponse, 201
     )
 
-    db.add(fornecedor_cliente)
-    db.commit()
-    db.refresh(fornecedor_cliente)
-
-    return fornecedor_cliente
-
 
 @router.put("/{id_do_fornecedor_cliente}", response_model=FornecedorClienteResponse, status_code=200)
 def atualizar_fornecedor_cliente(id_do_fornecedor_cliente: int,
@@ -67,9 +220,138 @@ def excluir_fornecedor_cliente(id_do_fornecedor_cliente: int,
     fornecedor_cliente = busca_fornecedor_cliente_por_id(id_do_fornecedor_cliente, db)
 
     db.delete(fornecedor_cliente)
+    db.add(Exclusao(entidade=ENTIDADE_FORNECEDOR_CLIENTE, entidade_id=id_do_fornecedor_cliente))
     db.commit()
 
 
+@router.post("/{id_do_fornecedor_cliente}/mesclar", response_model=MesclagemResponse)
+def mesclar_fornecedores_cliente(id_do_fornecedor_cliente: int,
+                                 mesclagem_request: MesclagemRequest,
+                                 db: Session = Depends(get_db)) -> MesclagemResponse:
+    duplicados = sorted(set(mesclagem_request.ids_duplicados))
+    if id_do_fornecedor_cliente in duplicados:
+        raise HTTPException(status_code=422, detail="O fornecedor mantido não pode estar entre os duplicados")
+
+    # Travados até o commit: uma conta criada para um duplicado durante a mesclagem
+    # espera e depois falha pela chave estrangeira, em vez de apontar para um excluído
+    fornecedores = {fornecedor.id: fornecedor for fornecedor in db.query(FornecedorCliente).filter(
+        FornecedorCliente.id.in_([id_do_fornecedor_cliente, *duplicados])
+    ).order_by(FornecedorCliente.id).with_for_update()}
+
+    if id_do_fornecedor_cliente not in fornecedores:
+        raise NotFound("Fornecedor Cliente")
+    nao_encontrados = [id_ for id_ in duplicados if id_ not in fornecedores]
+    if nao_encontrados:
+        raise NotFound(f"Fornecedor Cliente {', '.join(map(str, nao_encontrados))}")
+
+    transferidas, lotes = transfere_contas_em_lotes(db, duplicados, id_do_fornecedor_cliente)
+    db.query(FornecedorCliente).filter(FornecedorCliente.id.in_(duplicados)).delete(synchronize_session=False)
+    db.execute(insert(Exclusao), [{"entidade": ENTIDADE_FORNECEDOR_CLIENTE, "entidade_id": id_}
+                                  for id_ in duplicados])
+    db.commit()
+
+    # Quem guarda as contas com o fornecedor expandido recarrega as transferidas; quem
+    # sincroniza recebe as contas alteradas e a exclusão dos duplicados em GET /sync
+    corretor_de_eventos.publica("conta_atualizada", [{"id": id_, "versao": versao} for id_, versao in transferidas])
+
+    return MesclagemResponse(
+        fornecedor_cliente=FornecedorClienteResponse.model_validate(fornecedores[id_do_fornecedor_cliente]),
+        excluidos=duplicados,
+        contas_transferidas=len(transferidas),
+        lotes=lotes,
+    )
+
+
+def transfere_contas_em_lotes(db: Session, origens: List[int], destino: int) -> Tuple[List[Tuple[int, int]], int]:
+    """Aponta para ``destino`` as contas de ``origens``, ``MESCLAGEM_TAMANHO_DO_LOTE`` contas por UPDATE.
+
+    Os lotes limitam o tamanho de cada comando, mas ficam todos na transação da
+    sessão: quem chama confirma a mesclagem inteira ou nada. Devolve id e nova
+    versão de cada conta transferida e a quantidade de lotes.
+    """
+    transferidas = []
+    lotes = 0
+    while True:
+        linhas = db.query(ContaPagarReceber.id, ContaPagarReceber.versao).filter(
+            ContaPagarReceber.fornecedor_cliente_id.in_(origens)
+        ).order_by(ContaPagarReceber.id).limit(MESCLAGEM_TAMANHO_DO_LOTE).all()
+        if not linhas:
+            break
+
+        db.execute(update(ContaPagarReceber).where(
+            ContaPagarReceber.fornecedor_cliente_id.in_(origens),
+            ContaPagarReceber.id.in_([id_ for id_, _ in linhas]),
+        ).values(
+            fornecedor_cliente_id=destino,
+            versao=ContaPagarReceber.versao + 1,
+            atualizado_em=datetime.utcnow(),
+        ).execution_options(synchronize_session=False))
+        transferidas += [(id_, versao + 1) for id_, versao in linhas]
+        lotes += 1
+
+    return transferidas, lotes
+
+
+def registra_fornecedor_cliente(fornecedor_cliente_request: FornecedorClienteRequest,
+                                db: Session) -> FornecedorCliente:
+    fornecedor_cliente = FornecedorCliente(
+        **fornecedor_cliente_request.model_dump()
+    )
+
+    db.add(fornecedor_cliente)
+    db.flush()
+    db.refresh(fornecedor_cliente)
+
+    return fornecedor_cliente
+
+
+def agrega_contas_por_fornecedor_cliente(db: Session, ids_dos_fornecedores=None):
+    em_aberto = ContaPagarReceber.esta_baixada.isnot(True)
+    saldo = ContaPagarReceber.valor - func.coalesce(ContaPagarReceber.valor_baixa, 0)
+
+    colunas = []
+    for tipo in ("PAGAR", "RECEBER"):
+        do_tipo = ContaPagarReceber.tipo == tipo
+        sufixo = tipo.lower()
+        colunas += [
+            func.sum(case((and_(do_tipo, em_aberto), 1), else_=0)).label(f"quantidade_em_aberto_{sufixo}"),
+            func.sum(case((and_(do_tipo, em_aberto), saldo), else_=0)).label(f"valor_em_aberto_{sufixo}"),
+            func.sum(case((and_(do_tipo, ~em_aberto), 1), else_=0)).label(f"quantidade_baixadas_{sufixo}"),
+            func.sum(case((do_tipo, func.coalesce(ContaPagarReceber.valor_baixa, 0)), else_=0))
+            .label(f"valor_baixado_{sufixo}"),
+        ]
+
+    filtro = ContaPagarReceber.fornecedor_cliente_id.isnot(None) if ids_dos_fornecedores is None \
+        else ContaPagarReceber.fornecedor_cliente_id.in_(ids_dos_fornecedores)
+
+    # Um único GROUP BY sobre o índice de fornecedor_cliente_id
+    return db.query(
+        ContaPagarReceber.fornecedor_cliente_id,
+        func.sum(ContaPagarReceber.valor).label("valor_total"),
+        *colunas
+    ).filter(filtro).group_by(ContaPagarReceber.fornecedor_cliente_id).subquery()
+
+
+def monta_resumo(linha) -> ResumoFornecedorClienteResponse:
+    valores = linha._mapping
+
+    def resumo_do_tipo(sufixo: str) -> ResumoPorTipo:
+        return ResumoPorTipo(
+            quantidade_em_aberto=valores[f"quantidade_em_aberto_{sufixo}"] or 0,
+            valor_em_aberto=round(Decimal(valores[f"valor_em_aberto_{sufixo}"] or 0), 2),
+            quantidade_baixadas=valores[f"quantidade_baixadas_{sufixo}"] or 0,
+            valor_baixado=round(Decimal(valores[f"valor_baixado_{sufixo}"] or 0), 2),
+        )
+
+    return ResumoFornecedorClienteResponse(
+        id=valores["id"],
+        nome=valores["nome"],
+        valor_total=round(Decimal(valores["valor_total"] or 0), 2),
+        pagar=resumo_do_tipo("pagar"),
+        receber=resumo_do_tipo("receber"),
+    )
+
+
 def busca_fornecedor_cliente_por_id(id_do_fornecedor_cliente: int, db: Session) -> FornecedorCliente:
     fornecedor_cliente = db.query(FornecedorCliente).get(id_do_fornecedor_cliente)
 
@@ -1,11 +1,12 @@
 from typing import List
 
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Response
 from sqlalchemy.orm import Session
 
 from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
-from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import ContaPagarReceberResponse
-from shared.dependencies import get_db
+from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import ContaPagarReceberResponse, \
+    SelecaoDeCampos, selecao_de_campos, aplica_selecao_de_campos, serializa_contas
+from shared.dependencies import get_db_leitura
 
 router = APIRouter(prefix="/fornecedor-cliente")
 
@@ -13,6 +14,12 @@ router = APIRouter(prefix="/fornecedor-cliente")
 @router.get("/{id_do_fornecedor_cliente}/contas-a-pagar-e-receber", response_model=List[ContaPagarReceberResponse])
 def obter_contas_de_um_fornecedor_cliente_por_id(
         id_do_fornecedor_cliente: int,
-        db: Session = Depends(get_db)) -> List[ContaPagarReceberResponse]:
-    resposta_db = db.query(ContaPagarReceber).filter_by(fornecedor_cliente_id=id_do_fornecedor_cliente).all()
-    return resposta_db
+        db: Session = Depends(get_db_leitura),
+        selecao: SelecaoDeCampos = Depends(selecao_de_campos)) -> List[ContaPagarReceberResponse]:
+    resposta_db = aplica_selecao_de_campos(db.query(ContaPagarReceber), selecao).filter_by(
+        fornecedor_cliente_id=id_do_fornecedor_cliente
+    ).all()
+
+    if selecao.completa:
+        return resposta_db
+    return Response(content=serializa_contas(resposta_db, selecao), media_type="application/json")
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Any, List
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker, joinedload
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente
+from contas_a_pagar_e_receber.models.relatorio_model import Relatorio
+from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import ContaPagarReceberResponse, \
+    relatorio_gastos_previstos_por_mes_de_um_ano
+from shared.database import SessionLocal
+from shared.dependencies import get_db
+from shared.exceptions import NotFound
+from shared.executor_de_tarefas import executor_de_relatorios, executa_periodicamente
+from shared.tenants import fabricas_de_sessoes_ativas
+
+router = APIRouter(prefix="/relatorios")
+
+MAXIMO_DE_ANOS_POR_RELATORIO = 30
+# Um relatório em PROCESSANDO há mais tempo que isso é considerado abandonado (o worker caiu)
+RELATORIOS_TEMPO_MAXIMO_EXECUCAO_SEGUNDOS = float(os.getenv("RELATORIOS_TEMPO_MAXIMO_EXECUCAO_SEGUNDOS", 3600))
+RELATORIOS_INTERVALO_RETOMADA_SEGUNDOS = float(os.getenv("RELATORIOS_INTERVALO_RETOMADA_SEGUNDOS", 60))
+
+_parar_retomada: threading.Event | None = None
+
+
+class RelatorioTipoEnum(str, Enum):
+    PREVISAO_GASTOS_POR_MES = 'PREVISAO_GASTOS_POR_MES'
+    GASTOS_POR_FORNECEDOR = 'GASTOS_POR_FORNECEDOR'
+    EXPORTACAO_CONTAS = 'EXPORTACAO_CONTAS'
+
+
+class RelatorioStatusEnum(str, Enum):
+    PENDENTE = 'PENDENTE'
+    PROCESSANDO = 'PROCESSANDO'
+    CONCLUIDO = 'CONCLUIDO'
+    ERRO = 'ERRO'
+
+
+class RelatorioRequest(BaseModel):
+    tipo: RelatorioTipoEnum
+    ano_inicio: int = Field(ge=1900, le=9999)
+    ano_fim: int | None = Field(default=None, ge=1900, le=9999)
+
+
+class RelatorioResponse(BaseModel):
+    id: int
+    tipo: RelatorioTipoEnum
+    parametros: dict
+    status: RelatorioStatusEnum
+    resultado: Any | None = None
+    erro: str | None = None
+    criado_em: datetime
+    concluido_em: datetime | None = None
+
+
+@router.post("", response_model=RelatorioResponse, status_code=202)
+def solicitar_relatorio(relatorio_request: RelatorioRequest,
+                        db: Session = Depends(get_db)) -> RelatorioResponse:
+    ano_fim = relatorio_request.ano_fim or relatorio_request.ano_inicio
+    if not 0 <= ano_fim - relatorio_request.ano_inicio < MAXIMO_DE_ANOS_POR_RELATORIO:
+        raise HTTPException(status_code=422,
+                            detail=f"O período deve ter entre 1 e {MAXIMO_DE_ANOS_POR_RELATORIO} anos")
+
+    parametros = json.dumps({"ano_inicio": relatorio_request.ano_inicio, "ano_fim": ano_fim}, sort_keys=True)
+    chave = hashlib.sha256(f"{relatorio_request.tipo.value}:{parametros}".encode()).hexdigest()
+
+    # Uma solicitação idêntica ainda na fila é reaproveitada em vez de recalculada
+    relatorio = busca_relatorio_em_andamento(db, chave)
+
+    while relatorio is None:
+        relatorio = Relatorio(tipo=relatorio_request.tipo, parametros=parametros, chave=chave,
+                              status=RelatorioStatusEnum.PENDENTE)
+        db.add(relatorio)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Uma solicitação idêntica e simultânea gravou antes (índice único parcial);
+            # se ela já terminou nesse meio-tempo, a busca volta vazia e tentamos de novo
+            db.rollback()
+            relatorio = busca_relatorio_em_andamento(db, chave)
+            continue
+
+        db.refresh(relatorio)
+        agenda_relatorio(relatorio.id, sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False))
+
+    return monta_resposta(relatorio)
+
+
+@router.get("/{id_do_relatorio}", response_model=RelatorioResponse)
+def obter_relatorio(id_do_relatorio: int,
+                    db: Session = Depends(get_db)) -> RelatorioResponse:
+    relatorio = db.query(Relatorio).get(id_do_relatorio)
+
+    if relatorio is None:
+        raise NotFound("Relatório")
+
+    return monta_resposta(relatorio)
+
+
+def busca_relatorio_em_andamento(db: Session, chave: str) -> Relatorio | None:
+    return db.query(Relatorio).filter(
+        Relatorio.chave == chave,
+        Relatorio.status.in_([RelatorioStatusEnum.PENDENTE, RelatorioStatusEnum.PROCESSANDO])
+    ).first()
+
+
+def monta_resposta(relatorio: Relatorio) -> RelatorioResponse:
+    return RelatorioResponse(
+        id=relatorio.id,
+        tipo=relatorio.tipo,
+        parametros=json.loads(relatorio.parametros),
+        status=relatorio.status,
+        resultado=json.loads(relatorio.resultado) if relatorio.resultado is not None else None,
+        erro=relatorio.erro,
+        criado_em=relatorio.criado_em,
+        concluido_em=relatorio.concluido_em,
+    )
+
+
+def agenda_relatorio(id_do_relatorio: int, fabrica_de_sessoes: sessionmaker = SessionLocal) -> None:
+    executor_de_relatorios.submit(processa_relatorio, id_do_relatorio, fabrica_de_sessoes)
+
+
+def retoma_relatorios_pendentes(fabrica_de_sessoes: sessionmaker = SessionLocal) -> None:
+    # Chamado periodicamente por cada worker; o que roda em outro worker continua com ele, e a
+    # reivindicação em processa_relatorio garante que cada relatório é gerado uma vez (um
+    # relatório que ainda está na fila e é agendado de novo só custa uma consulta)
+    db = fabrica_de_sessoes()
+    try:
+        ids = db.query(Relatorio.id).filter(or_(
+            Relatorio.status == RelatorioStatusEnum.PENDENTE,
+            and_(Relatorio.status == RelatorioStatusEnum.PROCESSANDO, execucao_abandonada())
+        )).order_by(Relatorio.id).all()
+    finally:
+        db.close()
+
+    for (id_do_relatorio,) in ids:
+        agenda_relatorio(id_do_relatorio, fabrica_de_sessoes)
+
+
+def retoma_relatorios_dos_tenants() -> None:
+    for fabrica_de_sessoes in fabricas_de_sessoes_ativas(SessionLocal):
+        try:
+            retoma_relatorios_pendentes(fabrica_de_sessoes)
+        except Exception:
+            # Um banco de tenant fora do ar não impede a retomada nos outros
+            continue
+
+
+def inicia_retomada_periodica() -> None:
+    global _parar_retomada
+    _parar_retomada = executa_periodicamente("relatorios-retomada", retoma_relatorios_dos_tenants,
+                                             RELATORIOS_INTERVALO_RETOMADA_SEGUNDOS)
+
+
+def encerra_retomada_periodica() -> None:
+    if _parar_retomada is not None:
+        _parar_retomada.set()
+
+
+def execucao_abandonada():
+    limite = datetime.utcnow() - timedelta(seconds=RELATORIOS_TEMPO_MAXIMO_EXECUCAO_SEGUNDOS)
+    return or_(Relatorio.iniciado_em.is_(None), Relatorio.iniciado_em < limite)
+
+
+def reivindica_relatorio(db: Session, id_do_relatorio: int) -> bool:
+    """Passa o relatório para PROCESSANDO se ele ainda estiver como foi lido.
+
+    O UPDATE só encontra a linha no status (e início) lido, então entre vários
+    workers que tentam ao mesmo tempo apenas um reivindica. Um PROCESSANDO só é
+    reivindicado de novo depois de ``RELATORIOS_TEMPO_MAXIMO_EXECUCAO_SEGUNDOS``.
+    """
+    lido = db.query(Relatorio.status, Relatorio.iniciado_em).filter(Relatorio.id == id_do_relatorio).first()
+    if lido is None:
+        return False
+
+    status, iniciado_em = lido
+    filtros = [Relatorio.id == id_do_relatorio, Relatorio.status == status]
+    if status == RelatorioStatusEnum.PROCESSANDO:
+        filtros += [execucao_abandonada(),
+                    Relatorio.iniciado_em.is_(None) if iniciado_em is None else Relatorio.iniciado_em == iniciado_em]
+    elif status != RelatorioStatusEnum.PENDENTE:
+        return False
+
+    reivindicados = db.query(Relatorio).filter(*filtros).update(
+        {Relatorio.status: RelatorioStatusEnum.PROCESSANDO, Relatorio.iniciado_em: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+    return reivindicados == 1
+
+
+def processa_relatorio(id_do_relatorio: int, fabrica_de_sessoes: sessionmaker) -> None:
+    db = fabrica_de_sessoes()
+    try:
+        if not reivindica_relatorio(db, id_do_relatorio):
+            return
+        relatorio = db.query(Relatorio).get(id_do_relatorio)
+
+        parametros = json.loads(relatorio.parametros)
+        geradores = {
+            RelatorioTipoEnum.PREVISAO_GASTOS_POR_MES: gera_previsao_gastos_por_mes,
+            RelatorioTipoEnum.GASTOS_POR_FORNECEDOR: gera_gastos_por_fornecedor,
+            RelatorioTipoEnum.EXPORTACAO_CONTAS: gera_exportacao_contas,
+        }
+
+        try:
+            resultado = geradores[RelatorioTipoEnum(relatorio.tipo)](db, parametros["ano_inicio"],
+                                                                     parametros["ano_fim"])
+        except Exception as erro:
+            db.rollback()
+            relatorio.status = RelatorioStatusEnum.ERRO
+            relatorio.erro = str(erro)
+        else:
+            relatorio.status = RelatorioStatusEnum.CONCLUIDO
+            relatorio.resultado = json.dumps(resultado, default=str)
+
+        relatorio.concluido_em = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def gera_previsao_gastos_por_mes(db: Session, ano_inicio: int, ano_fim: int) -> List[dict]:
+    return [
+        {"ano": ano,
+         "meses": [previsao.model_dump() for previsao in relatorio_gastos_previstos_por_mes_de_um_ano(db, ano)]}
+        for ano in range(ano_inicio, ano_fim + 1)
+    ]
+
+
+def gera_gastos_por_fornecedor(db: Session, ano_inicio: int, ano_fim: int) -> List[dict]:
+    linhas = db.query(
+        ContaPagarReceber.fornecedor_cliente_id,
+        FornecedorCliente.nome,
+        ContaPagarReceber.tipo,
+        func.count(ContaPagarReceber.id),
+        func.sum(ContaPagarReceber.valor),
+    ).outerjoin(
+        FornecedorCliente, FornecedorCliente.id == ContaPagarReceber.fornecedor_cliente_id
+    ).filter(
+        ContaPagarReceber.data_previsao >= date(ano_inicio, 1, 1),
+        ContaPagarReceber.data_previsao < date(ano_fim + 1, 1, 1)
+    ).group_by(
+        ContaPagarReceber.fornecedor_cliente_id, FornecedorCliente.nome, ContaPagarReceber.tipo
+    ).order_by(ContaPagarReceber.fornecedor_cliente_id, ContaPagarReceber.tipo).all()
+
+    return [
+        {"fornecedor_cliente_id": fornecedor_cliente_id, "nome": nome, "tipo": tipo,
+         "quantidade": quantidade, "valor_total": valor_total}
+        for fornecedor_cliente_id, nome, tipo, quantidade, valor_total in linhas
+    ]
+
+
+def gera_exportacao_contas(db: Session, ano_inicio: int, ano_fim: int) -> List[dict]:
+    contas = db.query(ContaPagarReceber).options(
+        joinedload(ContaPagarReceber.fornecedor)
+    ).filter(
+        ContaPagarReceber.data_previsao >= date(ano_inicio, 1, 1),
+        ContaPagarReceber.data_previsao < date(ano_fim + 1, 1, 1)
+    ).order_by(ContaPagarReceber.data_previsao, ContaPagarReceber.id).yield_per(1000)
+
+    return [ContaPagarReceberResponse.model_validate(conta).model_dump() for conta in contas]
@@ -0,0 +1,203 @@
+import base64
+import heapq
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import List, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, sessionmaker
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.exclusao_model import Exclusao, ENTIDADE_CONTA_A_PAGAR_E_RECEBER, \
+    ENTIDADE_FORNECEDOR_CLIENTE
+from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente
+from shared.database import SessionLocal
+from shared.dependencies import get_db
+from shared.executor_de_tarefas import executa_periodicamente
+from shared.tenants import fabricas_de_sessoes_ativas
+
+router = APIRouter(prefix="/sync")
+
+# O horário das alterações vem do relógio da aplicação quando a linha é gravada, antes
+# do commit: uma transação ainda aberta pode confirmar depois linhas com horário
+# anterior ao último entregue. O cursor final volta até essa margem, que deve cobrir a transação de
+# escrita mais longa.
+SYNC_MARGEM_SEGUNDOS = float(os.getenv("SYNC_MARGEM_SEGUNDOS", 30))
+SYNC_RETENCAO_EXCLUSOES_DIAS = int(os.getenv("SYNC_RETENCAO_EXCLUSOES_DIAS", 90))
+SYNC_TAMANHO_MAXIMO_PAGINA = 1000
+INTERVALO_LIMPEZA_EXCLUSOES_SEGUNDOS = 3600
+
+# Desempate entre fontes com o mesmo horário; também é a ordem em que são lidas
+FONTE_CONTAS, FONTE_FORNECEDORES, FONTE_EXCLUSOES = 0, 1, 2
+
+_parar_limpeza: threading.Event | None = None
+
+
+class OperacaoEnum(str, Enum):
+    ALTERACAO = 'alteracao'
+    EXCLUSAO = 'exclusao'
+
+
+class ContaSincronizadaResponse(BaseModel):
+    id: int
+    descricao: str
+    valor: Decimal
+    tipo: str
+    data_previsao: date
+    data_baixa: date | None = None
+    valor_baixa: Decimal | None = None
+    esta_baixada: bool | None = None
+    fornecedor_cliente_id: int | None = None
+    grupo_parcelas: str | None = None
+    numero_parcela: int | None = None
+    versao: int
+    atualizado_em: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class FornecedorClienteSincronizadoResponse(BaseModel):
+    id: int
+    nome: str
+    atualizado_em: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AlteracaoResponse(BaseModel):
+    entidade: str
+    operacao: OperacaoEnum
+    id: int
+    conta: ContaSincronizadaResponse | None = None
+    fornecedor_cliente: FornecedorClienteSincronizadoResponse | None = None
+
+
+class SincronizacaoResponse(BaseModel):
+    alteracoes: List[AlteracaoResponse]
+    cursor: str
+    tem_mais: bool
+
+
+@router.get("", response_model=SincronizacaoResponse)
+def sincronizar(since: str | None = Query(default=None, description="Cursor devolvido pela chamada anterior"),
+                tamanho_pagina: int = Query(default=500, ge=1, le=SYNC_TAMANHO_MAXIMO_PAGINA),
+                db: Session = Depends(get_db)) -> SincronizacaoResponse:
+    # Sempre no primário: numa réplica atrasada o cursor avançaria por cima de alterações
+    agora = datetime.utcnow()
+    inicio = decodifica_cursor(since) if since else (datetime.min, -1, 0)
+
+    if since and inicio[0] < agora - timedelta(days=SYNC_RETENCAO_EXCLUSOES_DIAS):
+        raise HTTPException(status_code=410,
+                            detail="Cursor mais antigo que o histórico de exclusões. Sincronize tudo de novo, "
+                                   "sem since")
+
+    alteracoes = list(heapq.merge(
+        *(busca_alteracoes(db, fonte, inicio, tamanho_pagina + 1)
+          for fonte in (FONTE_CONTAS, FONTE_FORNECEDORES, FONTE_EXCLUSOES)),
+        key=lambda alteracao: alteracao[0]
+    ))
+    tem_mais = len(alteracoes) > tamanho_pagina
+    alteracoes = alteracoes[:tamanho_pagina]
+
+    if tem_mais:
+        fim = alteracoes[-1][0]
+    else:
+        # Página final: o cursor volta para a margem, mesmo que as páginas anteriores
+        # tenham passado dela, e o que veio depois é entregue de novo na próxima
+        # chamada junto com o que confirmou atrasado. Aplique as alterações como upsert.
+        fim = (agora - timedelta(seconds=SYNC_MARGEM_SEGUNDOS), -1, 0)
+
+    return SincronizacaoResponse(
+        alteracoes=[alteracao for _, alteracao in alteracoes],
+        cursor=codifica_cursor(fim),
+        tem_mais=tem_mais,
+    )
+
+
+def busca_alteracoes(db: Session, fonte: int, inicio: Tuple[datetime, int, int], limite: int) -> List[tuple]:
+    """Alterações da fonte depois de ``inicio``, na ordem (horário, fonte, id).
+
+    Lê no máximo ``limite`` linhas pelo índice (horário, id) da tabela, então o
+    custo acompanha o volume de alterações, não o tamanho da tabela.
+    """
+    modelo, coluna_horario = {
+        FONTE_CONTAS: (ContaPagarReceber, ContaPagarReceber.atualizado_em),
+        FONTE_FORNECEDORES: (FornecedorCliente, FornecedorCliente.atualizado_em),
+        FONTE_EXCLUSOES: (Exclusao, Exclusao.excluido_em),
+    }[fonte]
+    horario, fonte_do_cursor, id_do_cursor = inicio
+
+    # Equivale a (horário, fonte, id) > inicio, escrito para usar o índice
+    if fonte > fonte_do_cursor:
+        filtro = coluna_horario >= horario
+    elif fonte < fonte_do_cursor:
+        filtro = coluna_horario > horario
+    else:
+        filtro = or_(coluna_horario > horario, and_(coluna_horario == horario, modelo.id > id_do_cursor))
+
+    linhas = db.query(modelo).filter(filtro).order_by(coluna_horario, modelo.id).limit(limite).all()
+    return [((getattr(linha, coluna_horario.key), fonte, linha.id), monta_alteracao(fonte, linha))
+            for linha in linhas]
+
+
+def monta_alteracao(fonte: int, linha) -> AlteracaoResponse:
+    if fonte == FONTE_CONTAS:
+        return AlteracaoResponse(entidade=ENTIDADE_CONTA_A_PAGAR_E_RECEBER, operacao=OperacaoEnum.ALTERACAO,
+                                 id=linha.id, conta=ContaSincronizadaResponse.model_validate(linha))
+    if fonte == FONTE_FORNECEDORES:
+        return AlteracaoResponse(entidade=ENTIDADE_FORNECEDOR_CLIENTE, operacao=OperacaoEnum.ALTERACAO, id=linha.id,
+                                 fornecedor_cliente=FornecedorClienteSincronizadoResponse.model_validate(linha))
+    return AlteracaoResponse(entidade=linha.entidade, operacao=OperacaoEnum.EXCLUSAO, id=linha.entidade_id)
+
+
+def codifica_cursor(posicao: Tuple[datetime, int, int]) -> str:
+    horario, fonte, id_ = posicao
+    return base64.urlsafe_b64encode(json.dumps([horario.isoformat(), fonte, id_]).encode()).decode()
+
+
+def decodifica_cursor(cursor: str) -> Tuple[datetime, int, int]:
+    try:
+        horario, fonte, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(horario), int(fonte), int(id_)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Cursor inválido")
+
+
+def limpa_exclusoes_antigas(db: Session) -> int:
+    excluidas = db.query(Exclusao).filter(
+        Exclusao.excluido_em < datetime.utcnow() - timedelta(days=SYNC_RETENCAO_EXCLUSOES_DIAS)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return excluidas
+
+
+def limpa_exclusoes_em_segundo_plano(fabrica_de_sessoes: sessionmaker = SessionLocal) -> None:
+    db = fabrica_de_sessoes()
+    try:
+        limpa_exclusoes_antigas(db)
+    except Exception:
+        db.rollback()
+    finally:
+        db.close()
+
+
+def limpa_exclusoes_dos_tenants_em_segundo_plano() -> None:
+    for fabrica_de_sessoes in fabricas_de_sessoes_ativas(SessionLocal):
+        limpa_exclusoes_em_segundo_plano(fabrica_de_sessoes)
+
+
+def inicia_limpeza_periodica() -> None:
+    global _parar_limpeza
+    _parar_limpeza = executa_periodicamente("limpeza-de-exclusoes", limpa_exclusoes_dos_tenants_em_segundo_plano,
+                                            INTERVALO_LIMPEZA_EXCLUSOES_SEGUNDOS)
+
+
+def encerra_limpeza_periodica() -> None:
+    if _parar_limpeza is not None:
+        _parar_limpeza.set()
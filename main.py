@@ -2,22 +2,95 @@ import uvicorn
 from fastapi import FastAPI
 
 from contas_a_pagar_e_receber.routers import contas_a_pagar_e_receber_router, fornecedor_cliente_router, \
-    fornecedor_cliente_vs_contas_router
-from shared.exceptions import NotFound
-from shared.exceptions_handler import not_found_exception_handler
+    fornecedor_cliente_vs_contas_router, relatorios_router, dashboard_router, analises_router, sincronizacao_router, \
+    conciliacao_router
+from shared.admissao import ControleDeAdmissao, configura_threadpool
+from shared.compressao import CompressaoMiddleware
+from shared.eventos import corretor_de_eventos
+from shared.exceptions import NotFound, Conflict
+from shared.exceptions_handler import not_found_exception_handler, conflict_exception_handler
+from shared.executor_de_tarefas import executor_de_relatorios
+from shared.limitador_de_taxa import LimitadorDeTaxa
+from shared.metricas import coleta_metricas
+from shared.tenants import IdentificacaoDeTenant
 
 app = FastAPI()
 
 
+@app.on_event("startup")
+def inicializa_threadpool() -> None:
+    configura_threadpool()
+
+
+@app.on_event("startup")
+def inicia_retomada_de_relatorios() -> None:
+    relatorios_router.inicia_retomada_periodica()
+
+
+@app.on_event("startup")
+def inicia_atualizacao_do_dashboard() -> None:
+    dashboard_router.inicia_atualizacao_periodica()
+
+
+@app.on_event("startup")
+def inicia_limpeza_de_exclusoes() -> None:
+    sincronizacao_router.inicia_limpeza_periodica()
+
+
+@app.on_event("startup")
+def inicia_eventos() -> None:
+    corretor_de_eventos.inicia()
+
+
+@app.on_event("shutdown")
+def encerra_relatorios() -> None:
+    relatorios_router.encerra_retomada_periodica()
+    executor_de_relatorios.shutdown(wait=False, cancel_futures=True)
+
+
+@app.on_event("shutdown")
+def encerra_atualizacao_do_dashboard() -> None:
+    dashboard_router.encerra_atualizacao_periodica()
+
+
+@app.on_event("shutdown")
+def encerra_limpeza_de_exclusoes() -> None:
+    sincronizacao_router.encerra_limpeza_periodica()
+
+
+@app.on_event("shutdown")
+def encerra_eventos() -> None:
+    corretor_de_eventos.encerra()
+
+
 @app.get("/")
 def oi_eu_sou_programador() -> str:
     return "Oi, eu sou um programador!"
 
 
+@app.get("/metricas")
+async def metricas() -> dict:
+    return coleta_metricas()
+
+
 app.include_router(contas_a_pagar_e_receber_router.router)
 app.include_router(fornecedor_cliente_router.router)
 app.include_router(fornecedor_cliente_vs_contas_router.router)
+app.include_router(relatorios_router.router)
+app.include_router(dashboard_router.router)
+app.include_router(analises_router.router)
+app.include_router(sincronizacao_router.router)
+app.include_router(conciliacao_router.router)
 app.add_exception_handler(NotFound, not_found_exception_handler)
+app.add_exception_handler(Conflict, conflict_exception_handler)
+# O mais interno: o tenant é resolvido depois do rate limiting e da fila de admissão
+app.add_middleware(IdentificacaoDeTenant, caminhos_ignorados=("/", "/metricas", "/docs", "/openapi.json"))
+app.add_middleware(CompressaoMiddleware)
+# O stream SSE fica aberto e ocioso a maior parte do tempo: não entra na fila de admissão
+app.add_middleware(ControleDeAdmissao, caminhos_ignorados=("/contas-a-pagar-e-receber/eventos",))
+# Adicionado por último para ficar mais externo: requisições acima do limite
+# são rejeitadas antes de entrar na fila de admissão.
+app.add_middleware(LimitadorDeTaxa)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+import anyio.to_thread
+from fastapi.responses import JSONResponse
+
+from shared.database import CAPACIDADE_DO_POOL
+from shared.metricas import registra_metricas
+
+THREADPOOL_TOKENS = int(os.getenv("THREADPOOL_TOKENS", CAPACIDADE_DO_POOL))
+ADMISSAO_LIMITE_CONCORRENCIA = int(os.getenv("ADMISSAO_LIMITE_CONCORRENCIA", THREADPOOL_TOKENS))
+ADMISSAO_TAMANHO_MAXIMO_FILA = int(os.getenv("ADMISSAO_TAMANHO_MAXIMO_FILA", 100))
+ADMISSAO_TEMPO_MAXIMO_ESPERA_SEGUNDOS = float(os.getenv("ADMISSAO_TEMPO_MAXIMO_ESPERA_SEGUNDOS", 10))
+ADMISSAO_ATRASO_ALVO_SEGUNDOS = float(os.getenv("ADMISSAO_ATRASO_ALVO_SEGUNDOS", 1))
+
+
+def configura_threadpool(total_tokens: int = THREADPOOL_TOKENS) -> None:
+    # Precisa ser chamado de dentro do event loop (ex.: no startup da aplicação)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = total_tokens
+
+
+class RequisicaoRejeitada(Exception):
+    pass
+
+
+class RequisicaoDescartada(RequisicaoRejeitada):
+    pass
+
+
+class ControleDeAdmissao:
+    """Middleware ASGI que limita quantas requisições executam ao mesmo tempo.
+
+    As requisições excedentes esperam numa fila limitada antes de ocupar uma
+    thread do threadpool ou uma conexão do pool. Quando a fila está cheia ou a
+    espera passa do tempo máximo, a requisição é rejeitada com 503.
+
+    Se a requisição mais antiga da fila já espera mais do que o atraso alvo, as
+    novas são descartadas na chegada (load shedding), antes de entrar na fila.
+
+    Conexões longas e ociosas, como streams SSE, não ocupam thread nem conexão
+    do pool e são passadas direto via ``caminhos_ignorados``.
+    """
+
+    def __init__(self, app,
+                 limite_concorrencia: int = ADMISSAO_LIMITE_CONCORRENCIA,
+                 tamanho_maximo_fila: int = ADMISSAO_TAMANHO_MAXIMO_FILA,
+                 tempo_maximo_espera: float = ADMISSAO_TEMPO_MAXIMO_ESPERA_SEGUNDOS,
+                 atraso_alvo: float = ADMISSAO_ATRASO_ALVO_SEGUNDOS,
+                 caminhos_ignorados: tuple = ()):
+        self.app = app
+        self.limite_concorrencia = limite_concorrencia
+        self.tamanho_maximo_fila = tamanho_maximo_fila
+        self.tempo_maximo_espera = tempo_maximo_espera
+        self.atraso_alvo = atraso_alvo
+        self.caminhos_ignorados = caminhos_ignorados
+
+        self._trava = threading.Lock()
+        self._fila = deque()
+        self._em_execucao = 0
+
+        self.total_admitidas = 0
+        self.total_rejeitadas = 0
+        self.total_descartadas = 0
+        self.espera_total_segundos = 0.0
+        self.espera_maxima_segundos = 0.0
+
+        registra_metricas("admissao", self.metricas)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.caminhos_ignorados:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        try:
+            await self._aguarda_vaga()
+        except RequisicaoRejeitada as rejeicao:
+            with self._trava:
+                if isinstance(rejeicao, RequisicaoDescartada):
+                    self.total_descartadas += 1
+                else:
+                    self.total_rejeitadas += 1
+            resposta = JSONResponse(
+                status_code=503,
+                content={"message": "Oops! Servidor sobrecarregado, tente novamente em instantes."},
+                headers={"Retry-After": str(max(1, round(self.tempo_maximo_espera)))},
+            )
+            await resposta(scope, receive, send)
+            return
+
+        self._registra_espera(time.perf_counter() - inicio)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._libera_vaga()
+
+    async def _aguarda_vaga(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        with self._trava:
+            if self._em_execucao < self.limite_concorrencia:
+                self._em_execucao += 1
+                return
+
+            if len(self._fila) >= self.tamanho_maximo_fila:
+                raise RequisicaoRejeitada()
+
+            if self._fila and time.perf_counter() - self._fila[0][1] > self.atraso_alvo:
+                raise RequisicaoDescartada()
+
+            vaga = loop.create_future()
+            self._fila.append((vaga, time.perf_counter()))
+
+        try:
+            await asyncio.wait_for(vaga, self.tempo_maximo_espera)
+        except asyncio.TimeoutError:
+            with self._trava:
+                for item in self._fila:
+                    if item[0] is vaga:
+                        self._fila.remove(item)
+                        break
+            # Se a vaga já tinha sido entregue, _entrega_vaga percebe o cancelamento e a devolve
+            raise RequisicaoRejeitada()
+
+    def _libera_vaga(self) -> None:
+        with self._trava:
+            while self._fila:
+                vaga, _ = self._fila.popleft()
+                if not vaga.done():
+                    # A vaga passa direto para o próximo da fila, sem decrementar o contador
+                    vaga.get_loop().call_soon_threadsafe(self._entrega_vaga, vaga)
+                    return
+
+            self._em_execucao -= 1
+
+    def _entrega_vaga(self, vaga: asyncio.Future) -> None:
+        if vaga.done():
+            self._libera_vaga()
+        else:
+            vaga.set_result(None)
+
+    def _registra_espera(self, espera: float) -> None:
+        with self._trava:
+            self.total_admitidas += 1
+            self.espera_total_segundos += espera
+            self.espera_maxima_segundos = max(self.espera_maxima_segundos, espera)
+
+    def metricas(self) -> dict:
+        with self._trava:
+            return {
+                "limite_concorrencia": self.limite_concorrencia,
+                "em_execucao": self._em_execucao,
+                "tamanho_fila": len(self._fila),
+                "tamanho_maximo_fila": self.tamanho_maximo_fila,
+                "total_admitidas": self.total_admitidas,
+                "total_rejeitadas": self.total_rejeitadas,
+                "total_descartadas": self.total_descartadas,
+                "atraso_fila_segundos": time.perf_counter() - self._fila[0][1] if self._fila else 0.0,
+                "espera_media_segundos": self.espera_total_segundos / self.total_admitidas
+                if self.total_admitidas else 0.0,
+                "espera_maxima_segundos": self.espera_maxima_segundos,
+            }
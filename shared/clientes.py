@@ -0,0 +1,22 @@
+import os
+
+# Chaves aceitas em X-API-Key. Uma chave fora da lista é ignorada: se cada valor
+# inventado virasse um cliente, bastaria trocar a chave para escapar do rate limiting
+API_KEYS_PERMITIDAS = {chave.strip() for chave in os.getenv("API_KEYS_PERMITIDAS", "").split(",") if chave.strip()}
+
+
+def identifica_cliente(scope) -> str:
+    """Identidade do cliente: a X-API-Key, se conhecida, ou o IP.
+
+    É a mesma no rate limiting, na idempotência e na leitura do primário após
+    uma escrita. Recebe o scope ASGI, para servir também aos middlewares.
+    """
+    for nome, valor in scope["headers"]:
+        if nome == b"x-api-key":
+            chave = valor.decode("latin-1")
+            if chave in API_KEYS_PERMITIDAS:
+                return "chave:" + chave
+            break
+
+    cliente = scope.get("client")
+    return "ip:" + (cliente[0] if cliente else "desconhecido")
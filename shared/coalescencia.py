@@ -0,0 +1,80 @@
+import asyncio
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from shared.metricas import registra_metricas
+from shared.tenants import tenant_atual
+
+COALESCENCIA_TEMPO_MAXIMO_SEGUNDOS = float(os.getenv("COALESCENCIA_TEMPO_MAXIMO_SEGUNDOS", 30))
+
+
+class CoalescedorDeRequisicoes:
+    """Junta requisições idênticas e simultâneas numa única execução (single-flight).
+
+    A primeira requisição com uma chave dispara ``funcao`` no threadpool; as que
+    chegam com a mesma chave enquanto ela roda aguardam o mesmo resultado, sem
+    ocupar thread nem conexão. Uma exceção de ``funcao`` chega a todas elas.
+    Quem espera mais que ``tempo_maximo`` recebe 504, mas a execução continua e
+    atende as requisições seguintes com a mesma chave. Vale por processo: cada
+    worker tem suas próprias execuções em andamento.
+    """
+
+    def __init__(self, tempo_maximo: float = COALESCENCIA_TEMPO_MAXIMO_SEGUNDOS):
+        self.tempo_maximo = tempo_maximo
+        self._em_andamento: Dict[Hashable, asyncio.Future] = {}
+        self._trava = threading.Lock()
+
+        self.total_execucoes = 0
+        self.total_coalescidas = 0
+        self.total_erros = 0
+        self.total_tempo_esgotado = 0
+        self.coalescidas_por_rota: Dict[str, int] = {}
+
+    async def executa(self, rota: str, parametros: dict, funcao: Callable[[], Any]) -> Any:
+        # O tenant faz parte da chave: o mesmo relatório de outro tenant é outro resultado
+        chave = (rota, tenant_atual.get(), tuple(sorted(parametros.items())))
+
+        with self._trava:
+            execucao = self._em_andamento.get(chave)
+            if execucao is None:
+                execucao = self._em_andamento[chave] = asyncio.ensure_future(run_in_threadpool(funcao))
+                execucao.add_done_callback(lambda concluida: self._conclui(chave, concluida))
+                self.total_execucoes += 1
+            else:
+                self.total_coalescidas += 1
+                self.coalescidas_por_rota[rota] = self.coalescidas_por_rota.get(rota, 0) + 1
+
+        try:
+            # shield: uma requisição cancelada (cliente desconectou) não cancela a execução das outras
+            return await asyncio.wait_for(asyncio.shield(execucao), self.tempo_maximo)
+        except asyncio.TimeoutError:
+            with self._trava:
+                self.total_tempo_esgotado += 1
+            raise HTTPException(status_code=504, detail="Tempo esgotado aguardando o relatório")
+
+    def _conclui(self, chave: Hashable, execucao: asyncio.Future) -> None:
+        with self._trava:
+            if self._em_andamento.get(chave) is execucao:
+                del self._em_andamento[chave]
+            if not execucao.cancelled() and execucao.exception() is not None:
+                self.total_erros += 1
+
+    def metricas(self) -> dict:
+        with self._trava:
+            return {
+                "em_andamento": len(self._em_andamento),
+                "total_execucoes": self.total_execucoes,
+                "total_coalescidas": self.total_coalescidas,
+                "total_erros": self.total_erros,
+                "total_tempo_esgotado": self.total_tempo_esgotado,
+                "coalescidas_por_rota": dict(self.coalescidas_por_rota),
+            }
+
+
+coalescedor_de_requisicoes = CoalescedorDeRequisicoes()
+
+registra_metricas("coalescencia", coalescedor_de_requisicoes.metricas)
@@ -0,0 +1,174 @@
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependência opcional
+    zstandard = None
+
+COMPRESSAO_TAMANHO_MINIMO = int(os.getenv("COMPRESSAO_TAMANHO_MINIMO", 1024))
+COMPRESSAO_NIVEL_GZIP = int(os.getenv("COMPRESSAO_NIVEL_GZIP", 6))
+COMPRESSAO_NIVEL_BROTLI = int(os.getenv("COMPRESSAO_NIVEL_BROTLI", 4))
+COMPRESSAO_NIVEL_ZSTD = int(os.getenv("COMPRESSAO_NIVEL_ZSTD", 3))
+
+TIPOS_COMPRESSIVEIS = ("application/json", "text/", "application/xml")
+TIPOS_NAO_COMPRESSIVEIS = ("text/event-stream",)
+
+
+class CompressorGzip:
+    def __init__(self, nivel: int):
+        self._compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    def comprime(self, dados: bytes, fim: bool) -> bytes:
+        saida = self._compressor.compress(dados)
+        return saida + self._compressor.flush(zlib.Z_FINISH if fim else zlib.Z_SYNC_FLUSH)
+
+
+class CompressorBrotli:
+    def __init__(self, nivel: int):
+        self._compressor = brotli.Compressor(quality=nivel)
+
+    def comprime(self, dados: bytes, fim: bool) -> bytes:
+        saida = self._compressor.process(dados)
+        return saida + (self._compressor.finish() if fim else self._compressor.flush())
+
+
+class CompressorZstd:
+    def __init__(self, nivel: int):
+        self._compressor = zstandard.ZstdCompressor(level=nivel).compressobj()
+
+    def comprime(self, dados: bytes, fim: bool) -> bytes:
+        saida = self._compressor.compress(dados)
+        return saida + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH if fim else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+
+def algoritmos_disponiveis(nivel_gzip: int = COMPRESSAO_NIVEL_GZIP,
+                           nivel_brotli: int = COMPRESSAO_NIVEL_BROTLI,
+                           nivel_zstd: int = COMPRESSAO_NIVEL_ZSTD) -> dict:
+    # Em ordem de preferência do servidor quando o cliente aceita vários com o mesmo peso
+    algoritmos = {}
+    if zstandard is not None:
+        algoritmos["zstd"] = lambda: CompressorZstd(nivel_zstd)
+    if brotli is not None:
+        algoritmos["br"] = lambda: CompressorBrotli(nivel_brotli)
+    algoritmos["gzip"] = lambda: CompressorGzip(nivel_gzip)
+    return algoritmos
+
+
+def escolhe_codificacao(accept_encoding: str, disponiveis) -> str | None:
+    pesos = {}
+    for item in accept_encoding.split(","):
+        nome, _, parametros = item.strip().partition(";")
+        peso = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        pesos[nome.strip().lower()] = peso
+
+    candidatos = [(pesos.get(nome, pesos.get("*", 0.0)), -ordem, nome) for ordem, nome in enumerate(disponiveis)]
+    peso, _, nome = max(candidatos, default=(0.0, 0, None))
+    return nome if peso > 0 else None
+
+
+class CompressaoMiddleware:
+    """Middleware ASGI que comprime respostas com zstd, Brotli ou gzip.
+
+    O algoritmo é negociado pelo ``Accept-Encoding``. Respostas menores que o
+    tamanho mínimo seguem sem compressão. Em respostas em streaming, cada
+    pedaço é comprimido e descarregado assim que chega, para o cliente não
+    ficar esperando o fim do stream.
+    """
+
+    def __init__(self, app, tamanho_minimo: int = COMPRESSAO_TAMANHO_MINIMO, algoritmos: dict | None = None):
+        self.app = app
+        self.tamanho_minimo = tamanho_minimo
+        self.algoritmos = algoritmos or algoritmos_disponiveis()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for nome, valor in scope["headers"]:
+            if nome == b"accept-encoding":
+                accept_encoding = valor.decode("latin-1")
+
+        codificacao = escolhe_codificacao(accept_encoding, self.algoritmos) if accept_encoding else None
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+
+        await RespostaComprimida(self, codificacao, send)(scope, receive)
+
+
+class RespostaComprimida:
+    def __init__(self, middleware: CompressaoMiddleware, codificacao: str, send):
+        self.middleware = middleware
+        self.codificacao = codificacao
+        self.send = send
+        self.inicio = None
+        self.acumulado = b""
+        self.compressor = None
+        self.repassar = False
+
+    async def __call__(self, scope, receive):
+        await self.middleware.app(scope, receive, self.intercepta)
+
+    async def intercepta(self, mensagem):
+        if mensagem["type"] == "http.response.start":
+            self.inicio = mensagem
+            cabecalhos = {nome.lower(): valor for nome, valor in mensagem.get("headers", [])}
+            tipo = cabecalhos.get(b"content-type", b"").decode("latin-1")
+            self.repassar = (
+                b"content-encoding" in cabecalhos
+                or not tipo.startswith(TIPOS_COMPRESSIVEIS)
+                or tipo.startswith(TIPOS_NAO_COMPRESSIVEIS)
+            )
+            if self.repassar:
+                await self.send(mensagem)
+            return
+
+        if mensagem["type"] != "http.response.body" or self.repassar:
+            await self.send(mensagem)
+            return
+
+        corpo = mensagem.get("body", b"")
+        mais_corpo = mensagem.get("more_body", False)
+
+        if self.compressor is None:
+            self.acumulado += corpo
+            if len(self.acumulado) < self.middleware.tamanho_minimo:
+                if not mais_corpo:
+                    # Terminou abaixo do tamanho mínimo: envia como veio
+                    await self.send(self.inicio)
+                    await self.send({"type": "http.response.body", "body": self.acumulado})
+                return
+
+            self.compressor = self.middleware.algoritmos[self.codificacao]()
+            await self.send(self.cabecalhos_comprimidos())
+            corpo, self.acumulado = self.acumulado, b""
+
+        await self.send({
+            "type": "http.response.body",
+            "body": self.compressor.comprime(corpo, fim=not mais_corpo),
+            "more_body": mais_corpo,
+        })
+
+    def cabecalhos_comprimidos(self) -> dict:
+        cabecalhos = [(nome, valor) for nome, valor in self.inicio.get("headers", [])
+                      if nome.lower() not in (b"content-length", b"vary")]
+        vary = [valor for nome, valor in self.inicio.get("headers", []) if nome.lower() == b"vary"]
+        cabecalhos.append((b"content-encoding", self.codificacao.encode()))
+        cabecalhos.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        return {**self.inicio, "headers": cabecalhos}
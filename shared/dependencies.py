@@ -1,9 +1,63 @@
+from fastapi import Depends, Request
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from shared import replicas, tenants
+from shared.clientes import identifica_cliente
 from shared.database import SessionLocal
 
 
-def get_db():
+@event.listens_for(SessionLocal, "after_commit")
+def marca_escrita(session: Session) -> None:
+    session.info["houve_escrita"] = True
+
+
+def get_db(request: Request):
+    tenant = tenants.tenant_atual.get()
+    if tenant is not None:
+        with tenants.engines_dos_tenants.sessao(tenant) as db:
+            yield db
+        return
+
     db = SessionLocal()
     try:
         yield db
     finally:
+        if db.info.get("houve_escrita"):
+            replicas.registro_de_escritas.registra(identifica_cliente(request.scope))
         db.close()
+
+
+def get_db_leitura(request: Request, db: Session = Depends(get_db)):
+    # A sessão do primário só abre conexão quando usada, então não custa nada
+    # quando a leitura é atendida por uma réplica. As réplicas são do banco
+    # principal: a sessão de um tenant já vem do banco dele.
+    if "tenant" in db.info or replicas.registro_de_escritas.escreveu_recentemente(identifica_cliente(request.scope)):
+        yield db
+        return
+
+    db_replica = abre_sessao_na_replica()
+    if db_replica is None:
+        yield db
+        return
+
+    try:
+        yield db_replica
+    finally:
+        db_replica.close()
+
+
+def abre_sessao_na_replica() -> Session | None:
+    """Sessão já conectada na próxima réplica disponível, ou None sem réplica no ar. Quem chama fecha."""
+    while (engine := replicas.selecionador_de_replicas.proxima()) is not None:
+        db_replica = Session(bind=engine, autocommit=False, autoflush=False)
+        try:
+            db_replica.connection()
+        except DBAPIError:
+            db_replica.close()
+            replicas.selecionador_de_replicas.marca_indisponivel(engine)
+            continue
+        return db_replica
+
+    return None
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, List
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+
+from shared.database import engine
+from shared.metricas import registra_metricas
+from shared.tenants import tenant_atual
+
+EVENTOS_TAMANHO_HISTORICO = int(os.getenv("EVENTOS_TAMANHO_HISTORICO", 1000))
+EVENTOS_INTERVALO_HEARTBEAT_SEGUNDOS = float(os.getenv("EVENTOS_INTERVALO_HEARTBEAT_SEGUNDOS", 15))
+EVENTOS_DURACAO_MAXIMA_SEGUNDOS = float(os.getenv("EVENTOS_DURACAO_MAXIMA_SEGUNDOS", 600))
+EVENTOS_CANAL_POSTGRES = "contas_a_pagar_e_receber_eventos"
+
+# Enviado quando o Last-Event-ID já saiu do histórico: o cliente precisa recarregar a listagem
+EVENTO_RESSINCRONIZAR = "ressincronizar"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Evento:
+    id: str
+    tipo: str
+    dados: dict
+    # Só os assinantes do mesmo tenant recebem o evento; None sem multi-tenant
+    tenant: str | None = None
+
+    def para_json(self) -> str:
+        return json.dumps({"id": self.id, "tipo": self.tipo, "dados": self.dados, "tenant": self.tenant}, default=str)
+
+    @classmethod
+    def de_json(cls, payload: str) -> "Evento":
+        evento = json.loads(payload)
+        return cls(id=evento["id"], tipo=evento["tipo"], dados=evento["dados"], tenant=evento.get("tenant"))
+
+    def formata_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.tipo}\ndata: {json.dumps(self.dados, default=str)}\n\n"
+
+
+class TransporteEmMemoria:
+    """Entrega os eventos só no próprio processo. Usado com SQLite e nos testes."""
+
+    def __init__(self):
+        self._receptor = None
+
+    def inicia(self, receptor: Callable[[Evento], None]) -> None:
+        self._receptor = receptor
+
+    def envia(self, eventos: List[Evento]) -> None:
+        for evento in eventos:
+            self._receptor(evento)
+
+    def encerra(self) -> None:
+        pass
+
+
+class TransportePostgres:
+    """Distribui os eventos entre os workers com LISTEN/NOTIFY do Postgres.
+
+    O próprio worker que publica recebe o evento de volta pelo LISTEN, então
+    todos os workers veem os eventos na mesma ordem (a ordem de commit).
+    """
+
+    def __init__(self, engine: Engine, canal: str = EVENTOS_CANAL_POSTGRES):
+        self.engine = engine
+        self.canal = canal
+        self._parar = threading.Event()
+
+    def inicia(self, receptor: Callable[[Evento], None]) -> None:
+        self._parar = threading.Event()
+        conectado = threading.Event()
+        threading.Thread(target=self._escuta, args=(receptor, conectado), name="eventos-listen", daemon=True).start()
+        # Eventos publicados antes do LISTEN estar ativo não chegariam a este worker
+        conectado.wait(timeout=5)
+
+    def envia(self, eventos: List[Evento]) -> None:
+        # Uma ida ao banco para todos os eventos; o payload do NOTIFY tem limite de 8000 bytes
+        with self.engine.begin() as conexao:
+            conexao.execute(text("SELECT pg_notify(:canal, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+                            {"canal": self.canal, "payloads": [evento.para_json() for evento in eventos]})
+
+    def encerra(self) -> None:
+        self._parar.set()
+
+    def _escuta(self, receptor: Callable[[Evento], None], conectado: threading.Event) -> None:
+        while not self._parar.is_set():
+            try:
+                conexao = self.engine.raw_connection()
+            except Exception:
+                self._parar.wait(1)
+                continue
+
+            # A conexão fica presa no LISTEN, então sai do pool
+            conexao.detach()
+            dbapi = conexao.dbapi_connection
+            try:
+                dbapi.autocommit = True
+                with dbapi.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.canal}"')
+                conectado.set()
+
+                while not self._parar.is_set():
+                    if select.select([dbapi], [], [], 1)[0]:
+                        dbapi.poll()
+                        while dbapi.notifies:
+                            receptor(Evento.de_json(dbapi.notifies.pop(0).payload))
+            except Exception:
+                # Conexão perdida: reconecta. Quem estava desconectado pede os eventos de novo pelo Last-Event-ID
+                self._parar.wait(1)
+            finally:
+                conexao.close()
+
+
+class CorretorDeEventos:
+    """Distribui os eventos das contas para as conexões SSE deste worker.
+
+    Os eventos ficam num buffer circular com os últimos ``tamanho_historico``
+    eventos, que atende quem reconecta com ``Last-Event-ID``. Um assinante
+    ocioso não tem fila própria: todos esperam o mesmo future, trocado a cada
+    evento, e leem do buffer a partir da posição onde pararam.
+    """
+
+    def __init__(self, transporte=None, tamanho_historico: int = EVENTOS_TAMANHO_HISTORICO):
+        self.transporte = transporte or TransporteEmMemoria()
+        self._historico = deque(maxlen=tamanho_historico)
+        self._proxima_posicao = 0
+        self._trava = threading.Lock()
+        # Um future por event loop; em produção há um só, nos testes cada requisição tem o seu
+        self._proximo_evento = {}
+        self._iniciado = False
+        self._encerrado = False
+
+        self.assinantes = 0
+        self.total_publicados = 0
+        self.total_recebidos = 0
+        self.total_falhas_envio = 0
+        self.ultimo_erro_envio = None
+
+        registra_metricas("eventos", self.metricas)
+
+    def inicia(self) -> None:
+        with self._trava:
+            if self._iniciado:
+                return
+            self._iniciado = True
+            self._encerrado = False
+        self.transporte.inicia(self.recebe)
+
+    def encerra(self) -> None:
+        with self._trava:
+            self._iniciado = False
+            self._encerrado = True
+        self.transporte.encerra()
+        self._acorda_todos()
+
+    def publica(self, tipo: str, dados: List[dict]) -> None:
+        """Publica um evento por item de ``dados``, no tenant da requisição. Chamar depois do commit.
+
+        Como a alteração já foi gravada, uma falha no envio não é propagada para
+        a requisição: é registrada nas métricas e os clientes SSE a recuperam
+        recarregando a listagem (ou por ``/sync``).
+        """
+        if not dados:
+            return
+
+        self.inicia()
+        tenant = tenant_atual.get()
+        eventos = [Evento(id=uuid.uuid4().hex, tipo=tipo, dados=item, tenant=tenant) for item in dados]
+        try:
+            self.transporte.envia(eventos)
+        except Exception as erro:
+            logger.exception("Falha ao publicar %d eventos %s", len(eventos), tipo)
+            with self._trava:
+                self.total_falhas_envio += len(eventos)
+                self.ultimo_erro_envio = str(erro)
+            return
+
+        with self._trava:
+            self.total_publicados += len(eventos)
+
+    def recebe(self, evento: Evento) -> None:
+        # Chamado pelo transporte, de qualquer thread
+        with self._trava:
+            self._historico.append((self._proxima_posicao, evento))
+            self._proxima_posicao += 1
+            self.total_recebidos += 1
+        self._acorda_todos()
+
+    def _acorda_todos(self) -> None:
+        with self._trava:
+            futuros, self._proximo_evento = self._proximo_evento, {}
+
+        for loop, futuro in futuros.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(lambda f=futuro: f.done() or f.set_result(None))
+
+    def _futuro_do_proximo_evento(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        with self._trava:
+            futuro = self._proximo_evento.get(loop)
+            if futuro is None:
+                futuro = self._proximo_evento[loop] = loop.create_future()
+            return futuro
+
+    def _posicao_apos(self, ultimo_id: str | None) -> int | None:
+        """Posição do primeiro evento depois de ``ultimo_id``, ou None se ele saiu do histórico."""
+        with self._trava:
+            if ultimo_id is None:
+                return self._proxima_posicao
+            for posicao, evento in reversed(self._historico):
+                if evento.id == ultimo_id:
+                    return posicao + 1
+            return None
+
+    def _eventos_desde(self, posicao: int) -> List[tuple] | None:
+        with self._trava:
+            if posicao >= self._proxima_posicao:
+                return []
+            if not self._historico or posicao < self._historico[0][0]:
+                return None
+            # Percorre só os eventos novos, a partir do fim do buffer
+            novos = []
+            for item in reversed(self._historico):
+                if item[0] < posicao:
+                    break
+                novos.append(item)
+            novos.reverse()
+            return novos
+
+    async def assina(self, ultimo_id: str | None = None,
+                     intervalo_heartbeat: float = EVENTOS_INTERVALO_HEARTBEAT_SEGUNDOS,
+                     duracao_maxima: float = EVENTOS_DURACAO_MAXIMA_SEGUNDOS,
+                     tenant: str | None = None) -> AsyncIterator[Evento | None]:
+        """Gera os eventos de ``tenant`` publicados depois de ``ultimo_id``, e None a cada heartbeat.
+
+        Termina depois de ``duracao_maxima`` segundos; o cliente SSE reconecta
+        sozinho com ``Last-Event-ID`` e não perde eventos.
+        """
+        self.inicia()
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + duracao_maxima
+
+        posicao = self._posicao_apos(ultimo_id)
+        if posicao is None:
+            yield Evento(id="", tipo=EVENTO_RESSINCRONIZAR, dados={})
+            posicao = self._posicao_apos(None)
+
+        with self._trava:
+            self.assinantes += 1
+        try:
+            while not self._encerrado:
+                # O future é obtido antes de ler o buffer: um evento que chegue
+                # entre as duas coisas o resolve e não é perdido
+                futuro = self._futuro_do_proximo_evento()
+                pendentes = self._eventos_desde(posicao)
+
+                if pendentes is None:
+                    # O assinante ficou tão para trás que o buffer já descartou eventos dele
+                    yield Evento(id="", tipo=EVENTO_RESSINCRONIZAR, dados={})
+                    posicao = self._posicao_apos(None)
+                    continue
+
+                for posicao_do_evento, evento in pendentes:
+                    posicao = posicao_do_evento + 1
+                    if evento.tenant == tenant:
+                        yield evento
+                if pendentes:
+                    continue
+
+                restante = limite - loop.time()
+                if restante <= 0:
+                    return
+
+                concluidos, _ = await asyncio.wait({futuro}, timeout=min(intervalo_heartbeat, restante))
+                if not concluidos and loop.time() < limite:
+                    yield None
+        finally:
+            with self._trava:
+                self.assinantes -= 1
+
+    def metricas(self) -> dict:
+        return {
+            "assinantes": self.assinantes,
+            "eventos_no_historico": len(self._historico),
+            "total_publicados": self.total_publicados,
+            "total_recebidos": self.total_recebidos,
+            "total_falhas_envio": self.total_falhas_envio,
+            "ultimo_erro_envio": self.ultimo_erro_envio,
+        }
+
+
+def cria_transporte(engine: Engine):
+    if make_url(str(engine.url)).get_backend_name() == "postgresql":
+        return TransportePostgres(engine)
+    return TransporteEmMemoria()
+
+
+corretor_de_eventos = CorretorDeEventos(cria_transporte(engine))
+
+
+def publica_apos_commit(db: Session, tipo: str, dados: List[dict]) -> None:
+    """Publica os eventos quando a transação de ``db`` for confirmada; um rollback os descarta.
+
+    Para quem escreve sem fazer o commit, como as funções executadas pela idempotência.
+    """
+    db.info.setdefault("eventos_apos_commit", []).append((tipo, dados))
+
+
+@event.listens_for(Session, "after_commit")
+def _publica_eventos_confirmados(db: Session) -> None:
+    for tipo, dados in db.info.pop("eventos_apos_commit", []):
+        corretor_de_eventos.publica(tipo, dados)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descarta_eventos_desfeitos(db: Session) -> None:
+    db.info.pop("eventos_apos_commit", None)
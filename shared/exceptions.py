@@ -1,3 +1,9 @@
 class NotFound(Exception):
     def __init__(self, name: str):
         self.name = name
+
+
+class Conflict(Exception):
+    def __init__(self, name: str, etag: str | None = None):
+        self.name = name
+        self.etag = etag
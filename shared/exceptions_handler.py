@@ -1,7 +1,7 @@
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
-from shared.exceptions import NotFound
+from shared.exceptions import NotFound, Conflict
 
 
 async def not_found_exception_handler(request: Request, exc: NotFound):
@@ -9,3 +9,13 @@ async def not_found_exception_handler(request: Request, exc: NotFound):
         status_code=404,
         content={"message": f"Oops! {exc.name} não encontrado(a)."},
     )
+
+
+async def conflict_exception_handler(request: Request, exc: Conflict):
+    # A versão atual vai no ETag para o cliente recarregar sem precisar de outro GET
+    return JSONResponse(
+        status_code=409,
+        content={"message": f"Oops! {exc.name} foi alterado(a) por outra requisição. "
+                            f"Recarregue e tente novamente."},
+        headers={"ETag": exc.etag} if exc.etag else None,
+    )
@@ -0,0 +1,30 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Poucas threads dedicadas: relatórios pesados não disputam o threadpool dos
+# handlers nem ocupam mais do que essa quantidade de conexões do pool.
+RELATORIOS_WORKERS = int(os.getenv("RELATORIOS_WORKERS", 2))
+
+executor_de_relatorios = ThreadPoolExecutor(max_workers=RELATORIOS_WORKERS, thread_name_prefix="relatorios")
+
+
+def executa_periodicamente(nome: str, tarefa: Callable[[], None], intervalo_segundos: float) -> threading.Event:
+    """Roda ``tarefa`` numa thread própria a cada ``intervalo_segundos``.
+
+    Devolve o evento que encerra a thread. Erros da tarefa não interrompem o
+    laço; a tarefa é responsável por registrá-los.
+    """
+    parar = threading.Event()
+
+    def laco():
+        while not parar.is_set():
+            try:
+                tarefa()
+            except Exception:
+                pass
+            parar.wait(intervalo_segundos)
+
+    threading.Thread(target=laco, name=nome, daemon=True).start()
+    return parar
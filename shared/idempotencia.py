@@ -0,0 +1,178 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Tuple, Type
+
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import Column, String, Integer, Text, DateTime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from shared.database import Base
+from shared.clientes import identifica_cliente
+
+IDEMPOTENCIA_TTL_HORAS = float(os.getenv("IDEMPOTENCIA_TTL_HORAS", 24))
+IDEMPOTENCIA_TEMPO_MAXIMO_EXECUCAO_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_TEMPO_MAXIMO_EXECUCAO_SEGUNDOS", 30))
+INTERVALO_ENTRE_LIMPEZAS = 100
+
+
+class ChaveIdempotencia(Base):
+    __tablename__ = 'chaves_idempotencia'
+
+    chave = Column(String(300), primary_key=True)
+    hash_requisicao = Column(String(64), nullable=False)
+    status_code = Column(Integer)
+    resposta = Column(Text)
+    criado_em = Column(DateTime, nullable=False)
+    expira_em = Column(DateTime, nullable=False, index=True)
+
+
+# Travas fixas por faixa de chave, só em volta da consulta e da reserva: quem
+# serializa as requisições duplicadas é a linha da chave no banco.
+_travas = [threading.Lock() for _ in range(64)]
+_contador_de_chamadas = itertools.count()
+
+
+def executa_com_idempotencia(db: Session, request: Request, idempotency_key: str | None, escopo: str,
+                             requisicao: dict, funcao: Callable[[], Any], response_model: Type[BaseModel],
+                             status_code: int):
+    """Executa ``funcao`` e confirma a transação, no máximo uma vez por Idempotency-Key.
+
+    ``funcao`` não faz commit: a escrita dela e a resposta guardada na chave são
+    confirmadas juntas, então uma falha entre as duas não deixa a operação
+    gravada sem resposta para repetir.
+    """
+    if idempotency_key is None:
+        resultado = response_model.model_validate(funcao())
+        db.commit()
+        return resultado
+
+    # A chave vale por cliente (o mesmo do rate limiting): dois clientes com a mesma
+    # Idempotency-Key não recebem a resposta um do outro. O hash não guarda a X-API-Key no banco.
+    cliente = hashlib.sha256(identifica_cliente(request.scope).encode()).hexdigest()[:32]
+    chave = f"{escopo}:{cliente}:{idempotency_key}"
+    hash_requisicao = hashlib.sha256(json.dumps(requisicao, sort_keys=True, default=str).encode()).hexdigest()
+
+    with _travas[int(hashlib.md5(chave.encode()).hexdigest(), 16) % len(_travas)]:
+        registro = busca_registro_valido(db, chave)
+        reservada = False
+
+        if registro is None:
+            registro, reservada = reserva_chave(db, chave, hash_requisicao)
+
+    if registro is None:
+        raise em_andamento()
+
+    if registro.hash_requisicao != hash_requisicao:
+        raise HTTPException(status_code=422,
+                            detail="Essa Idempotency-Key já foi usada com outra requisição")
+
+    if not reservada and registro.status_code is None:
+        # Outra requisição reservou a chave e ainda está executando
+        registro = aguarda_conclusao(db, registro)
+        if registro is None:
+            # Ela falhou e liberou a chave: esta requisição executa no lugar dela
+            registro, reservada = reserva_chave(db, chave, hash_requisicao)
+            if registro is None:
+                raise em_andamento()
+
+    if registro.status_code is not None:
+        return resposta_armazenada(registro)
+
+    # Reservada agora ou, passado o tempo máximo, ainda sem resposta: a original
+    # provavelmente caiu. Se ela ainda confirmar, o UPDATE condicional abaixo não
+    # acha a chave pendente e só uma das duas execuções é gravada.
+    try:
+        resposta = response_model.model_validate(funcao()).model_dump_json()
+        concluida = db.query(ChaveIdempotencia).filter(
+            ChaveIdempotencia.chave == chave,
+            ChaveIdempotencia.status_code.is_(None)
+        ).update({"status_code": status_code, "resposta": resposta}, synchronize_session=False)
+    except Exception:
+        db.rollback()
+        if reservada:
+            db.query(ChaveIdempotencia).filter(
+                ChaveIdempotencia.chave == chave,
+                ChaveIdempotencia.status_code.is_(None)
+            ).delete(synchronize_session=False)
+            db.commit()
+        raise
+
+    if not concluida:
+        # A execução original terminou primeiro: descarta esta e devolve a resposta dela
+        db.rollback()
+        registro = db.query(ChaveIdempotencia).get(chave)
+        if registro is None or registro.status_code is None:
+            raise em_andamento()
+        return resposta_armazenada(registro)
+
+    db.commit()
+    return Response(content=resposta, status_code=status_code, media_type="application/json")
+
+
+def busca_registro_valido(db: Session, chave: str) -> ChaveIdempotencia | None:
+    registro = db.query(ChaveIdempotencia).get(chave)
+    if registro is None:
+        return None
+
+    if registro.expira_em < datetime.utcnow():
+        db.delete(registro)
+        db.commit()
+        return None
+
+    return registro
+
+
+def reserva_chave(db: Session, chave: str, hash_requisicao: str) -> Tuple[ChaveIdempotencia | None, bool]:
+    agora = datetime.utcnow()
+
+    if next(_contador_de_chamadas) % INTERVALO_ENTRE_LIMPEZAS == 0:
+        db.query(ChaveIdempotencia).filter(ChaveIdempotencia.expira_em < agora).delete()
+
+    registro = ChaveIdempotencia(chave=chave, hash_requisicao=hash_requisicao, criado_em=agora,
+                                 expira_em=agora + timedelta(hours=IDEMPOTENCIA_TTL_HORAS))
+    db.add(registro)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Outro processo reservou a chave primeiro
+        db.rollback()
+        return db.query(ChaveIdempotencia).get(chave), False
+
+    return registro, True
+
+
+def aguarda_conclusao(db: Session, registro: ChaveIdempotencia) -> ChaveIdempotencia | None:
+    """Espera a execução que reservou a chave até ela completar o tempo máximo.
+
+    Devolve o registro, concluído ou ainda pendente depois do tempo máximo, ou
+    None se a execução falhou e liberou a chave.
+    """
+    chave = registro.chave
+    limite = registro.criado_em + timedelta(seconds=IDEMPOTENCIA_TEMPO_MAXIMO_EXECUCAO_SEGUNDOS)
+    while registro is not None and registro.status_code is None and datetime.utcnow() < limite:
+        # Encerra a transação antes de dormir: a conexão volta ao pool durante a espera
+        db.rollback()
+        time.sleep(0.05)
+        registro = db.query(ChaveIdempotencia).get(chave)
+
+    return registro
+
+
+def em_andamento() -> HTTPException:
+    return HTTPException(status_code=409, headers={"Retry-After": "1"},
+                         detail="A requisição original com essa Idempotency-Key ainda está em andamento")
+
+
+def resposta_armazenada(registro: ChaveIdempotencia, repetida: bool = True) -> Response:
+    return Response(
+        content=registro.resposta,
+        status_code=registro.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"} if repetida else None,
+    )
@@ -0,0 +1,142 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List
+
+from shared.clientes import identifica_cliente
+from shared.metricas import registra_metricas
+
+
+@dataclass(frozen=True)
+class LimiteDeRota:
+    caminho: str  # expressão regular aplicada ao caminho inteiro
+    metodo: str | None
+    requisicoes_por_segundo: float
+    rajada: int
+
+
+# Rotas que carregam tabelas inteiras ou agregam muitos dados têm limites menores
+LIMITES_PADRAO = [
+    LimiteDeRota(r"/contas-a-pagar-e-receber", "GET", 10, 30),
+    LimiteDeRota(r"/fornecedor-cliente", "GET", 10, 30),
+    LimiteDeRota(r"/fornecedor-cliente/\d+/contas-a-pagar-e-receber", "GET", 10, 30),
+    LimiteDeRota(r"/fornecedor-cliente/resumo", "GET", 2, 10),
+    LimiteDeRota(r"/(contas-a-pagar-e-receber|fornecedor-cliente)/buscar", "POST", 10, 30),
+    LimiteDeRota(r"/contas-a-pagar-e-receber/previsao-gastos-por-mes", "GET", 5, 20),
+    LimiteDeRota(r"/contas-a-pagar-e-receber/vencimentos", "GET", 5, 20),
+    LimiteDeRota(r"/relatorios", "POST", 2, 10),
+    LimiteDeRota(r"/analises/.*", "GET", 2, 10),
+    LimiteDeRota(r"/conciliacao", "POST", 1, 3),
+    LimiteDeRota(r"/sync", "GET", 5, 20),
+    LimiteDeRota(r"/dashboard", "GET", 5, 20),
+    LimiteDeRota(r".*", None, 50, 200),
+]
+
+
+RESPOSTA_LIMITE_EXCEDIDO = json.dumps(
+    {"message": "Oops! Limite de requisições excedido, tente novamente em instantes."}
+).encode()
+
+
+def carrega_limites() -> List[LimiteDeRota]:
+    # Ex.: RATE_LIMITS='[["/contas-a-pagar-e-receber", "GET", 1, 5], [".*", null, 20, 50]]'
+    configuracao = os.getenv("RATE_LIMITS")
+    if not configuracao:
+        return LIMITES_PADRAO
+
+    return [LimiteDeRota(*limite) for limite in json.loads(configuracao)]
+
+
+class BaldeDeFichas:
+    __slots__ = ("taxa", "capacidade", "fichas", "ultima_atualizacao")
+
+    def __init__(self, taxa: float, capacidade: int):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.fichas = float(capacidade)
+        self.ultima_atualizacao = time.monotonic()
+
+    def consome(self) -> float:
+        """Consome uma ficha e devolve 0, ou os segundos até a próxima ficha."""
+        agora = time.monotonic()
+        self.fichas = min(self.capacidade, self.fichas + (agora - self.ultima_atualizacao) * self.taxa)
+        self.ultima_atualizacao = agora
+
+        if self.fichas >= 1:
+            self.fichas -= 1
+            return 0.0
+
+        return (1 - self.fichas) / self.taxa
+
+
+class LimitadorDeTaxa:
+    """Middleware ASGI de rate limiting por cliente (X-API-Key conhecida ou IP) e por rota.
+
+    A rejeição é respondida direto pelo middleware, sem ler o corpo da
+    requisição nem passar pelo roteamento do FastAPI.
+    """
+
+    def __init__(self, app, limites: List[LimiteDeRota] | None = None, tamanho_maximo_baldes: int = 100000):
+        self.app = app
+        self.limites = [(re.compile(limite.caminho), limite) for limite in (limites or carrega_limites())]
+        self.tamanho_maximo_baldes = tamanho_maximo_baldes
+        self._baldes = OrderedDict()
+        self._trava = threading.Lock()
+        self.total_rejeitadas = 0
+
+        registra_metricas("limitador_de_taxa", self.metricas)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        indice_do_limite = self._encontra_limite(scope["method"], scope["path"])
+        if indice_do_limite is None:
+            await self.app(scope, receive, send)
+            return
+
+        espera = self._consome((indice_do_limite, identifica_cliente(scope)), self.limites[indice_do_limite][1])
+        if espera == 0:
+            await self.app(scope, receive, send)
+            return
+
+        with self._trava:
+            self.total_rejeitadas += 1
+
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(math.ceil(espera)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": RESPOSTA_LIMITE_EXCEDIDO})
+
+    def _encontra_limite(self, metodo: str, caminho: str) -> int | None:
+        for indice, (padrao, limite) in enumerate(self.limites):
+            if (limite.metodo is None or limite.metodo == metodo) and padrao.fullmatch(caminho):
+                return indice
+        return None
+
+    def _consome(self, chave: tuple, limite: LimiteDeRota) -> float:
+        with self._trava:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = BaldeDeFichas(limite.requisicoes_por_segundo, limite.rajada)
+                if len(self._baldes) > self.tamanho_maximo_baldes:
+                    self._baldes.popitem(last=False)
+            else:
+                self._baldes.move_to_end(chave)
+
+            return balde.consome()
+
+    def metricas(self) -> dict:
+        return {"clientes_monitorados": len(self._baldes), "total_rejeitadas": self.total_rejeitadas}
+
@@ -0,0 +1,11 @@
+from typing import Callable, Dict
+
+_provedores_de_metricas: Dict[str, Callable[[], dict]] = {}
+
+
+def registra_metricas(nome: str, provedor: Callable[[], dict]) -> None:
+    _provedores_de_metricas[nome] = provedor
+
+
+def coleta_metricas() -> dict:
+    return {nome: provedor() for nome, provedor in _provedores_de_metricas.items()}
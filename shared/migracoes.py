@@ -0,0 +1,211 @@
+"""Utilitários para migrações que não travam as tabelas grandes em produção.
+
+Uso típico numa revisão do Alembic:
+
+    def upgrade() -> None:
+        executa_com_limite_de_lock(op.get_bind(), lambda: op.add_column('tabela', sa.Column(...)))
+
+        # Fora da transação da migração: cada lote é confirmado na hora e o
+        # CREATE INDEX CONCURRENTLY não roda dentro de transação
+        with op.get_context().autocommit_block():
+            preenche_em_lotes(op.get_bind(), 'tabela', "coluna = 0", "coluna IS NULL")
+            define_nao_nulo(op.get_bind(), 'tabela', 'coluna')
+            cria_indice_concorrente(op.get_bind(), 'ix_tabela_coluna', 'tabela', ['coluna'])
+
+No SQLite as mesmas funções rodam os comandos comuns, sem as opções do Postgres.
+"""
+import hashlib
+import os
+import time
+from typing import Callable, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+MIGRACOES_LOCK_TIMEOUT_SEGUNDOS = float(os.getenv("MIGRACOES_LOCK_TIMEOUT_SEGUNDOS", 5))
+MIGRACOES_TENTATIVAS_DE_LOCK = int(os.getenv("MIGRACOES_TENTATIVAS_DE_LOCK", 5))
+MIGRACOES_TAMANHO_DO_LOTE = int(os.getenv("MIGRACOES_TAMANHO_DO_LOTE", 10000))
+MIGRACOES_PAUSA_ENTRE_LOTES_SEGUNDOS = float(os.getenv("MIGRACOES_PAUSA_ENTRE_LOTES_SEGUNDOS", 0.1))
+
+# SQLSTATE lock_not_available, devolvido quando o lock_timeout estoura
+LOCK_NAO_DISPONIVEL = "55P03"
+TAMANHO_MAXIMO_DE_NOME = 63
+
+
+class LockNaoObtido(Exception):
+    pass
+
+
+def eh_postgres(conexao: Connection) -> bool:
+    return conexao.dialect.name == "postgresql"
+
+
+def em_autocommit(conexao: Connection) -> bool:
+    # O autocommit_block do Alembic abre uma transação de fachada numa conexão em AUTOCOMMIT
+    return conexao.get_execution_options().get("isolation_level") == "AUTOCOMMIT" or not conexao.in_transaction()
+
+
+def executa_com_limite_de_lock(conexao: Connection, funcao: Callable[[], None],
+                               segundos: float = MIGRACOES_LOCK_TIMEOUT_SEGUNDOS,
+                               tentativas: int = MIGRACOES_TENTATIVAS_DE_LOCK,
+                               pausa_segundos: float = 1) -> None:
+    """Roda ``funcao`` (um ALTER TABLE, por exemplo) com ``lock_timeout``.
+
+    Sem o limite, um ALTER que espera o lock de uma transação longa enfileira
+    atrás de si todas as leituras e escritas da tabela. Com ele, o ALTER
+    desiste logo e tenta de novo depois de uma pausa crescente.
+    """
+    if not eh_postgres(conexao):
+        funcao()
+        return
+
+    anterior = conexao.execute(text("SHOW lock_timeout")).scalar()
+    try:
+        for tentativa in range(1, tentativas + 1):
+            conexao.execute(text("SELECT set_config('lock_timeout', :valor, false)"),
+                            {"valor": f"{int(segundos * 1000)}ms"})
+            try:
+                if not em_autocommit(conexao):
+                    # O savepoint permite tentar de novo sem abortar a transação da migração
+                    with conexao.begin_nested():
+                        funcao()
+                else:
+                    funcao()
+                return
+            except OperationalError as erro:
+                if getattr(erro.orig, "pgcode", None) != LOCK_NAO_DISPONIVEL:
+                    raise
+                if tentativa == tentativas:
+                    raise LockNaoObtido(f"Lock não obtido em {tentativas} tentativas de {segundos}s") from erro
+            time.sleep(pausa_segundos * tentativa)
+    finally:
+        conexao.execute(text("SELECT set_config('lock_timeout', :valor, false)"), {"valor": anterior})
+
+
+def imprime_progresso(tabela: str, processadas: int, total: int, atualizadas: int) -> None:
+    percentual = 100 * processadas / total if total else 100
+    print(f"{tabela}: {processadas}/{total} chaves ({percentual:.0f}%), {atualizadas} linhas atualizadas")
+
+
+def preenche_em_lotes(conexao: Connection, tabela: str, atribuicoes: str, filtro: str | None = None,
+                      tamanho_lote: int = MIGRACOES_TAMANHO_DO_LOTE,
+                      pausa_segundos: float = MIGRACOES_PAUSA_ENTRE_LOTES_SEGUNDOS,
+                      progresso: Callable[[str, int, int, int], None] = imprime_progresso,
+                      coluna_chave: str = "id") -> int:
+    """Executa ``UPDATE tabela SET atribuicoes`` em faixas de ``tamanho_lote`` chaves.
+
+    Cada faixa é uma transação curta (a conexão deve estar em autocommit) que
+    trava poucas linhas, e a pausa entre elas deixa o tráfego normal e a
+    replicação acompanharem. ``filtro`` torna o preenchimento retomável: se a
+    migração cair no meio, as linhas já preenchidas não são tocadas de novo.
+    """
+    if not em_autocommit(conexao):
+        raise RuntimeError("preenche_em_lotes precisa de uma conexão em autocommit "
+                           "(use op.get_context().autocommit_block())")
+
+    minimo, maximo = conexao.execute(text(f"SELECT min({coluna_chave}), max({coluna_chave}) FROM {tabela}")).one()
+    if minimo is None:
+        return 0
+
+    total = maximo - minimo + 1
+    condicao = f" AND ({filtro})" if filtro else ""
+    atualizacao = text(f"UPDATE {tabela} SET {atribuicoes} "
+                       f"WHERE {coluna_chave} >= :inicio AND {coluna_chave} < :fim{condicao}")
+
+    atualizadas = 0
+    for inicio in range(minimo, maximo + 1, tamanho_lote):
+        atualizadas += conexao.execute(atualizacao, {"inicio": inicio, "fim": inicio + tamanho_lote}).rowcount
+        progresso(tabela, min(inicio + tamanho_lote, maximo + 1) - minimo, total, atualizadas)
+        if pausa_segundos and inicio + tamanho_lote <= maximo:
+            time.sleep(pausa_segundos)
+
+    return atualizadas
+
+
+def define_nao_nulo(conexao: Connection, tabela: str, coluna: str) -> None:
+    """SET NOT NULL sem varrer a tabela com ela travada (somente Postgres).
+
+    O CHECK é criado NOT VALID (instantâneo) e validado com um lock que não
+    bloqueia escritas; o SET NOT NULL aproveita o CHECK válido e não relê a tabela.
+    """
+    restricao = nome_limitado(f"{tabela}_{coluna}_nao_nulo")
+    executa_com_limite_de_lock(conexao, lambda: conexao.execute(text(
+        f"ALTER TABLE {tabela} ADD CONSTRAINT {restricao} CHECK ({coluna} IS NOT NULL) NOT VALID"
+    )))
+    conexao.execute(text(f"ALTER TABLE {tabela} VALIDATE CONSTRAINT {restricao}"))
+    executa_com_limite_de_lock(conexao, lambda: conexao.execute(text(
+        f"ALTER TABLE {tabela} ALTER COLUMN {coluna} SET NOT NULL"
+    )))
+    executa_com_limite_de_lock(conexao, lambda: conexao.execute(text(
+        f"ALTER TABLE {tabela} DROP CONSTRAINT {restricao}"
+    )))
+
+
+def cria_indice_concorrente(conexao: Connection, nome: str, tabela: str, colunas: List[str],
+                            where: str | None = None, unique: bool = False) -> None:
+    """Cria o índice sem bloquear escritas (``CREATE INDEX CONCURRENTLY``).
+
+    Precisa de conexão em autocommit. Em tabela particionada, onde o Postgres
+    não aceita CONCURRENTLY, cria o índice só na tabela mãe (ON ONLY), cria um
+    índice concorrente em cada partição e os anexa; a mãe fica válida quando a
+    última partição é anexada. Sobras inválidas de uma tentativa anterior que
+    falhou são removidas antes. No SQLite é um CREATE INDEX comum.
+    """
+    definicao = f"({', '.join(colunas)})" + (f" WHERE {where}" if where else "")
+    tipo = "UNIQUE INDEX" if unique else "INDEX"
+
+    if not eh_postgres(conexao):
+        conexao.execute(text(f"CREATE {tipo} IF NOT EXISTS {nome} ON {tabela} {definicao}"))
+        return
+
+    particoes = lista_particoes(conexao, tabela)
+    if not particoes:
+        remove_indice_invalido(conexao, nome)
+        conexao.execute(text(f"CREATE {tipo} CONCURRENTLY IF NOT EXISTS {nome} ON {tabela} {definicao}"))
+        return
+
+    executa_com_limite_de_lock(conexao, lambda: conexao.execute(text(
+        f"CREATE {tipo} IF NOT EXISTS {nome} ON ONLY {tabela} {definicao}"
+    )))
+    for particao in particoes:
+        nome_na_particao = nome_limitado(f"{nome}_{particao.removeprefix(tabela + '_')}")
+        remove_indice_invalido(conexao, nome_na_particao)
+        conexao.execute(text(
+            f"CREATE {tipo} CONCURRENTLY IF NOT EXISTS {nome_na_particao} ON {particao} {definicao}"
+        ))
+        conexao.execute(text(f"ALTER INDEX {nome} ATTACH PARTITION {nome_na_particao}"))
+
+
+def remove_indice_concorrente(conexao: Connection, nome: str, tabela: str) -> None:
+    if eh_postgres(conexao) and not lista_particoes(conexao, tabela):
+        conexao.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}"))
+        return
+
+    # Em tabela particionada o DROP remove também os índices das partições
+    executa_com_limite_de_lock(conexao, lambda: conexao.execute(text(f"DROP INDEX IF EXISTS {nome}")))
+
+
+def remove_indice_invalido(conexao: Connection, nome: str) -> None:
+    # to_regclass resolve o nome pelo search_path, como os comandos da migração
+    invalido = conexao.execute(text(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:nome)"
+    ), {"nome": nome}).scalar()
+    if invalido:
+        conexao.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}"))
+
+
+def lista_particoes(conexao: Connection, tabela: str) -> List[str]:
+    return conexao.execute(text(
+        "SELECT filha.relname FROM pg_inherits "
+        "JOIN pg_class filha ON filha.oid = pg_inherits.inhrelid "
+        "JOIN pg_class mae ON mae.oid = pg_inherits.inhparent "
+        "WHERE mae.oid = to_regclass(:tabela) AND mae.relkind = 'p' ORDER BY filha.relname"
+    ), {"tabela": tabela}).scalars().all()
+
+
+def nome_limitado(nome: str) -> str:
+    # O Postgres trunca nomes acima de 63 bytes, o que pode gerar colisões
+    if len(nome) <= TAMANHO_MAXIMO_DE_NOME:
+        return nome
+    return f"{nome[:TAMANHO_MAXIMO_DE_NOME - 9]}_{hashlib.md5(nome.encode()).hexdigest()[:8]}"
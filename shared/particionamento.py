@@ -0,0 +1,240 @@
+"""Manutenção das partições anuais de ``contas_a_pagar_e_receber`` (somente Postgres).
+
+Uso:
+    python -m shared.particionamento criar-particoes --anos-a-frente 2
+    python -m shared.particionamento arquivar --ate-ano 2015 --diretorio arquivo/
+
+Com multi-tenant, roda em cada tenant de ``--tenant`` (repetível) ou, sem ele,
+de ``TENANTS_PERMITIDOS``, cada um na sua transação.
+"""
+import argparse
+import gzip
+import os
+import re
+from datetime import date
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from contas_a_pagar_e_receber.models.exclusao_model import ENTIDADE_CONTA_A_PAGAR_E_RECEBER
+from shared.migracoes import lista_particoes
+
+TABELA = "contas_a_pagar_e_receber"
+PARTICAO_PADRAO = f"{TABELA}_padrao"
+
+
+def nome_da_particao(ano: int) -> str:
+    return f"{TABELA}_{ano}"
+
+
+def cria_particao_do_ano(conexao: Connection, ano: int) -> None:
+    """Cria a partição do ano, levando para ela as contas do ano que estão na partição padrão.
+
+    Contas com previsão além das partições existentes (um parcelamento longo,
+    por exemplo) caem na partição padrão, e o Postgres recusa criar a partição
+    de um ano enquanto a padrão tem linhas dele. Nesse caso a padrão é
+    desanexada, a partição é criada, as linhas são movidas e a padrão volta,
+    tudo na transação de ``conexao``.
+    """
+    particao = nome_da_particao(ano)
+    if conexao.execute(text("SELECT to_regclass(:particao)"), {"particao": particao}).scalar() is not None:
+        return
+
+    intervalo = f"data_previsao >= '{ano}-01-01' AND data_previsao < '{ano + 1}-01-01'"
+    criacao = text(f"CREATE TABLE {particao} PARTITION OF {TABELA} "
+                   f"FOR VALUES FROM ('{ano}-01-01') TO ('{ano + 1}-01-01')")
+
+    padrao_existe = conexao.execute(text("SELECT to_regclass(:padrao)"), {"padrao": PARTICAO_PADRAO}).scalar()
+    if padrao_existe is None or not conexao.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {PARTICAO_PADRAO} WHERE {intervalo})")
+    ).scalar():
+        conexao.execute(criacao)
+        return
+
+    conexao.execute(text(f"ALTER TABLE {TABELA} DETACH PARTITION {PARTICAO_PADRAO}"))
+    conexao.execute(criacao)
+    conexao.execute(text(f"INSERT INTO {particao} SELECT * FROM {PARTICAO_PADRAO} WHERE {intervalo}"))
+    conexao.execute(text(f"DELETE FROM {PARTICAO_PADRAO} WHERE {intervalo}"))
+    conexao.execute(text(f"ALTER TABLE {TABELA} ATTACH PARTITION {PARTICAO_PADRAO} DEFAULT"))
+
+
+def cria_particoes_futuras(conexao: Connection, anos_a_frente: int = 2) -> List[int]:
+    ano_atual = date.today().year
+    anos = list(range(ano_atual, ano_atual + anos_a_frente + 1))
+    for ano in anos:
+        cria_particao_do_ano(conexao, ano)
+    return anos
+
+
+def lista_anos_particionados(conexao: Connection) -> List[int]:
+    # A tabela do search_path da conexão: com um schema por tenant, a do tenant
+    nomes = lista_particoes(conexao, TABELA)
+    return sorted(int(nome.rsplit("_", 1)[1]) for nome in nomes if re.fullmatch(rf"{TABELA}_\d{{4}}", nome))
+
+
+def converte_para_particionada(conexao: Connection) -> None:
+    conexao.execute(text(f"ALTER TABLE {TABELA} RENAME TO {TABELA}_antiga"))
+    conexao.execute(text(f"ALTER TABLE {TABELA}_antiga RENAME CONSTRAINT {TABELA}_pkey TO {TABELA}_antiga_pkey"))
+    conexao.execute(text(
+        f"CREATE TABLE {TABELA} (LIKE {TABELA}_antiga INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE (data_previsao)"
+    ))
+    # A chave da partição precisa fazer parte da chave primária
+    conexao.execute(text(f"ALTER TABLE {TABELA} ADD CONSTRAINT {TABELA}_pkey PRIMARY KEY (id, data_previsao)"))
+    conexao.execute(text(
+        f"ALTER TABLE {TABELA} ADD CONSTRAINT {TABELA}_fornecedor_cliente_id_fkey "
+        f"FOREIGN KEY (fornecedor_cliente_id) REFERENCES fornecedor_cliente (id)"
+    ))
+    conexao.execute(text(f"CREATE TABLE {PARTICAO_PADRAO} PARTITION OF {TABELA} DEFAULT"))
+
+    primeiro_ano = conexao.execute(
+        text(f"SELECT extract(year FROM min(data_previsao))::int FROM {TABELA}_antiga")
+    ).scalar() or date.today().year
+    for ano in range(min(primeiro_ano, date.today().year), date.today().year + 1):
+        cria_particao_do_ano(conexao, ano)
+    cria_particoes_futuras(conexao)
+
+    conexao.execute(text(f"INSERT INTO {TABELA} SELECT * FROM {TABELA}_antiga"))
+    conexao.execute(text(f"ALTER SEQUENCE {TABELA}_id_seq OWNED BY {TABELA}.id"))
+    conexao.execute(text(f"DROP TABLE {TABELA}_antiga"))
+
+
+def converte_para_tabela_simples(conexao: Connection) -> None:
+    conexao.execute(text(f"ALTER TABLE {TABELA} RENAME TO {TABELA}_particionada"))
+    conexao.execute(text(
+        f"ALTER TABLE {TABELA}_particionada RENAME CONSTRAINT {TABELA}_pkey TO {TABELA}_particionada_pkey"
+    ))
+    conexao.execute(text(
+        f"ALTER TABLE {TABELA}_particionada RENAME CONSTRAINT {TABELA}_fornecedor_cliente_id_fkey "
+        f"TO {TABELA}_particionada_fornecedor_cliente_id_fkey"
+    ))
+    conexao.execute(text(
+        f"CREATE TABLE {TABELA} (LIKE {TABELA}_particionada INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    conexao.execute(text(f"ALTER TABLE {TABELA} ADD CONSTRAINT {TABELA}_pkey PRIMARY KEY (id)"))
+    conexao.execute(text(
+        f"ALTER TABLE {TABELA} ADD CONSTRAINT {TABELA}_fornecedor_cliente_id_fkey "
+        f"FOREIGN KEY (fornecedor_cliente_id) REFERENCES fornecedor_cliente (id)"
+    ))
+    conexao.execute(text(f"INSERT INTO {TABELA} SELECT * FROM {TABELA}_particionada"))
+    conexao.execute(text(f"ALTER SEQUENCE {TABELA}_id_seq OWNED BY {TABELA}.id"))
+    conexao.execute(text(f"DROP TABLE {TABELA}_particionada"))
+
+
+def arquiva_particoes_baixadas(conexao: Connection, ate_ano: int, diretorio: str,
+                               manter_tabela: bool = False) -> List[str]:
+    """Desanexa as partições até ``ate_ano`` cujas contas estão todas baixadas.
+
+    Cada partição é exportada em CSV compactado com gzip para ``diretorio`` e
+    depois removida, a não ser que ``manter_tabela`` seja verdadeiro. Os
+    pagamentos dessas contas são exportados num segundo arquivo e excluídos, e
+    cada conta ganha uma exclusão para os clientes de ``GET /sync``, tudo na
+    transação de ``conexao``.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    arquivos = []
+
+    for ano in lista_anos_particionados(conexao):
+        if ano > ate_ano:
+            continue
+
+        particao = nome_da_particao(ano)
+        em_aberto = conexao.execute(
+            text(f"SELECT count(*) FROM {particao} WHERE esta_baixada IS NOT TRUE")
+        ).scalar()
+        if em_aberto:
+            continue
+
+        conexao.execute(text(f"ALTER TABLE {TABELA} DETACH PARTITION {particao}"))
+
+        pagamentos_da_particao = f"SELECT * FROM pagamentos WHERE conta_a_pagar_e_receber_id IN " \
+                                 f"(SELECT id FROM {particao})"
+        arquivo = exporta_csv(conexao, particao, os.path.join(diretorio, f"{particao}.csv.gz"))
+        arquivo_de_pagamentos = exporta_csv(conexao, f"({pagamentos_da_particao})",
+                                            os.path.join(diretorio, f"{particao}_pagamentos.csv.gz"))
+
+        # Sem FOREIGN KEY entre pagamentos e contas: a exclusão é feita aqui
+        conexao.execute(text(f"DELETE FROM pagamentos WHERE conta_a_pagar_e_receber_id IN (SELECT id FROM {particao})"))
+        conexao.execute(text(
+            f"INSERT INTO exclusoes (entidade, entidade_id, excluido_em) "
+            f"SELECT :entidade, id, timezone('utc', clock_timestamp()) FROM {particao}"
+        ), {"entidade": ENTIDADE_CONTA_A_PAGAR_E_RECEBER})
+
+        if not manter_tabela:
+            conexao.execute(text(f"DROP TABLE {particao}"))
+
+        arquivos += [arquivo, arquivo_de_pagamentos]
+
+    return arquivos
+
+
+def exporta_csv(conexao: Connection, origem: str, arquivo: str) -> str:
+    cursor = conexao.connection.cursor()
+    try:
+        with gzip.open(arquivo, "wb") as saida:
+            cursor.copy_expert(f"COPY {origem} TO STDOUT WITH CSV HEADER", saida)
+    finally:
+        cursor.close()
+    return arquivo
+
+
+def bancos_dos_tenants(tenants: List[str] | None) -> List[Tuple[str | None, Engine, str | None]]:
+    """(tenant, engine, schema) de cada banco a manter; sem multi-tenant, só o banco principal."""
+    from shared import tenants as multi_tenant
+    from shared.database import engine
+
+    if multi_tenant.engines_dos_tenants is None:
+        return [(None, engine, None)]
+
+    # O processo não recebe requisições, então não há tenants no cache para percorrer
+    tenants = tenants or sorted(multi_tenant.TENANTS_PERMITIDOS)
+    if not tenants:
+        raise SystemExit("Com multi-tenant, informe os tenants em --tenant ou em TENANTS_PERMITIDOS")
+
+    bancos = []
+    for tenant in tenants:
+        if not multi_tenant.FORMATO_DO_TENANT.fullmatch(tenant):
+            raise SystemExit(f"Tenant inválido: {tenant}")
+        # Os comandos daqui são SQL textual, que o schema_translate_map da engine do tenant não altera
+        schema = multi_tenant.TENANT_SCHEMA.format(tenant=multi_tenant.nome_no_banco(tenant)) \
+            if multi_tenant.TENANT_SCHEMA else None
+        bancos.append((tenant, multi_tenant.engines_dos_tenants.obtem(tenant), schema))
+    return bancos
+
+
+def main(argumentos=None) -> None:
+    parser = argparse.ArgumentParser(description="Manutenção das partições de contas a pagar e receber")
+    parser.add_argument("--tenant", action="append", dest="tenants",
+                        help="Tenant a manter, com multi-tenant; repita para mais de um (padrão: TENANTS_PERMITIDOS)")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    criar = subparsers.add_parser("criar-particoes", help="Cria as partições do ano atual e dos próximos anos")
+    criar.add_argument("--anos-a-frente", type=int, default=2)
+
+    arquivar = subparsers.add_parser("arquivar", help="Arquiva partições antigas com todas as contas baixadas")
+    arquivar.add_argument("--ate-ano", type=int, required=True)
+    arquivar.add_argument("--diretorio", default="arquivo")
+    arquivar.add_argument("--manter-tabela", action="store_true")
+
+    argumentos = parser.parse_args(argumentos)
+
+    for tenant, engine, schema in bancos_dos_tenants(argumentos.tenants):
+        prefixo = f"[{tenant}] " if tenant is not None else ""
+        with engine.begin() as conexao:
+            if schema is not None:
+                conexao.execute(text(f'SET LOCAL search_path TO "{schema}"'))
+
+            if argumentos.comando == "criar-particoes":
+                anos = cria_particoes_futuras(conexao, argumentos.anos_a_frente)
+                print(f"{prefixo}Partições garantidas para os anos: {', '.join(map(str, anos))}")
+            else:
+                # Um diretório por tenant: as partições têm o mesmo nome em todos eles
+                diretorio = os.path.join(argumentos.diretorio, tenant) if tenant is not None else argumentos.diretorio
+                arquivos = arquiva_particoes_baixadas(conexao, argumentos.ate_ano, diretorio,
+                                                      argumentos.manter_tabela)
+                print(f"{prefixo}Partições arquivadas: {', '.join(arquivos) or 'nenhuma'}")
+
+
+if __name__ == "__main__":
+    main()
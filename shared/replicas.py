@@ -0,0 +1,103 @@
+import itertools
+import os
+import threading
+import time
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from shared.database import engines_replica
+from shared.metricas import registra_metricas
+
+REPLICA_INTERVALO_VERIFICACAO_SEGUNDOS = float(os.getenv("REPLICA_INTERVALO_VERIFICACAO_SEGUNDOS", 30))
+LEITURA_NO_PRIMARIO_APOS_ESCRITA_SEGUNDOS = float(os.getenv("LEITURA_NO_PRIMARIO_APOS_ESCRITA_SEGUNDOS", 5))
+
+
+class SelecionadorDeReplicas:
+    """Escolhe as réplicas de leitura em round-robin, pulando as que falharam.
+
+    Uma réplica que falha fica fora do rodízio durante o intervalo de
+    verificação e volta a ser testada com um ``SELECT 1`` depois disso.
+    """
+
+    def __init__(self, engines: List[Engine],
+                 intervalo_verificacao: float = REPLICA_INTERVALO_VERIFICACAO_SEGUNDOS):
+        self.engines = engines
+        self.intervalo_verificacao = intervalo_verificacao
+        self._rodizio = itertools.count()
+        self._indisponivel_ate = {}
+        self._trava = threading.Lock()
+
+    def proxima(self) -> Engine | None:
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self._rodizio) % len(self.engines)]
+
+            indisponivel_ate = self._indisponivel_ate.get(engine)
+            if indisponivel_ate is None:
+                return engine
+
+            if time.monotonic() >= indisponivel_ate and self.verifica_saude(engine):
+                return engine
+
+        return None
+
+    def verifica_saude(self, engine: Engine) -> bool:
+        try:
+            with engine.connect() as conexao:
+                conexao.execute(text("SELECT 1"))
+        except DBAPIError:
+            self.marca_indisponivel(engine)
+            return False
+
+        with self._trava:
+            self._indisponivel_ate.pop(engine, None)
+        return True
+
+    def marca_indisponivel(self, engine: Engine) -> None:
+        with self._trava:
+            self._indisponivel_ate[engine] = time.monotonic() + self.intervalo_verificacao
+
+    def metricas(self) -> dict:
+        agora = time.monotonic()
+        return {
+            "replicas": len(self.engines),
+            "replicas_indisponiveis": sum(1 for ate in self._indisponivel_ate.values() if ate > agora),
+        }
+
+
+class RegistroDeEscritas:
+    """Lembra quais clientes escreveram recentemente (read-your-writes).
+
+    Enquanto a janela não expira, as leituras desses clientes vão para o
+    primário, evitando que vejam uma réplica ainda atrasada.
+    """
+
+    def __init__(self, janela_segundos: float = LEITURA_NO_PRIMARIO_APOS_ESCRITA_SEGUNDOS,
+                 tamanho_maximo: int = 10000):
+        self.janela_segundos = janela_segundos
+        self.tamanho_maximo = tamanho_maximo
+        self._ultimas_escritas = {}
+        self._trava = threading.Lock()
+
+    def registra(self, cliente: str) -> None:
+        if self.janela_segundos <= 0:
+            return
+
+        agora = time.monotonic()
+        with self._trava:
+            if len(self._ultimas_escritas) >= self.tamanho_maximo:
+                self._ultimas_escritas = {c: t for c, t in self._ultimas_escritas.items()
+                                          if agora - t < self.janela_segundos}
+            self._ultimas_escritas[cliente] = agora
+
+    def escreveu_recentemente(self, cliente: str) -> bool:
+        ultima_escrita = self._ultimas_escritas.get(cliente)
+        return ultima_escrita is not None and time.monotonic() - ultima_escrita < self.janela_segundos
+
+
+selecionador_de_replicas = SelecionadorDeReplicas(engines_replica)
+registro_de_escritas = RegistroDeEscritas()
+
+registra_metricas("replicas", selecionador_de_replicas.metricas)
@@ -0,0 +1,52 @@
+from sqlalchemy import create_engine
+
+from benchmarks.endpoints import Medicao, carrega_orcamentos, compara_com_orcamentos, mede_cenarios, \
+    mede_serializacao, popula_banco, rotas_sem_cenario, BENCHMARK_VERIFICA_TEMPO, NOME_DA_SERIALIZACAO
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+
+
+def test_endpoints_devem_caber_nos_orcamentos_de_consultas_tempo_e_memoria():
+    popula_banco(engine)
+
+    medicoes = mede_cenarios(engine)
+
+    # Se a mudança for intencional: python -m benchmarks.endpoints --atualizar
+    assert compara_com_orcamentos(medicoes, carrega_orcamentos(engine.dialect.name),
+                                  verifica_tempo=BENCHMARK_VERIFICA_TEMPO) == []
+
+
+def test_serializacao_de_contas_deve_caber_no_orcamento():
+    medicao = mede_serializacao()
+
+    assert compara_com_orcamentos({NOME_DA_SERIALIZACAO: medicao}, carrega_orcamentos(engine.dialect.name),
+                                  verifica_tempo=BENCHMARK_VERIFICA_TEMPO) == []
+
+
+def test_todas_as_rotas_dos_routers_devem_ter_um_cenario():
+    assert rotas_sem_cenario() == []
+
+
+def test_uma_consulta_a_mais_deve_estourar_o_orcamento_mesmo_sem_custar_tempo():
+    orcamentos = {"GET /contas": {"consultas": 1, "tempo_ms": 10, "memoria_pico_kb": 100}}
+
+    dentro = compara_com_orcamentos({"GET /contas": Medicao(consultas=1, tempo_ms=25, memoria_pico_kb=150)},
+                                    orcamentos)
+    fora = compara_com_orcamentos({"GET /contas": Medicao(consultas=2, tempo_ms=10, memoria_pico_kb=100),
+                                   "GET /novo": Medicao(consultas=1, tempo_ms=1, memoria_pico_kb=1)}, orcamentos)
+
+    assert dentro == []
+    assert fora == ["GET /contas: 2 consultas, orçamento de 1",
+                    "GET /novo: sem orçamento, rode python -m benchmarks.endpoints --atualizar"]
+
+
+def test_tempo_so_deve_estourar_o_orcamento_quando_verificado():
+    orcamentos = {"GET /contas": {"consultas": 1, "tempo_ms": 10, "memoria_pico_kb": 100}}
+    medicoes = {"GET /contas": Medicao(consultas=1, tempo_ms=500, memoria_pico_kb=100)}
+
+    assert compara_com_orcamentos(medicoes, orcamentos, verifica_tempo=False) == []
+    assert compara_com_orcamentos(medicoes, orcamentos) == ["GET /contas: 500.0 ms, limite de 35.0 ms"]
@@ -0,0 +1,124 @@
+import datetime
+import random
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, extract, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente
+from contas_a_pagar_e_receber.routers import analises_router
+from main import app
+from shared.database import Base
+from shared.dependencies import get_db
+
+client = TestClient(app)
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+def cria_contas_aleatorias(quantidade):
+    aleatorio = random.Random(42)
+    db = TestingSessionLocal()
+    db.execute(insert(FornecedorCliente), [{"nome": f"Fornecedor {i}"} for i in range(1, 6)])
+    db.execute(insert(ContaPagarReceber), [
+        {"descricao": "Conta", "tipo": aleatorio.choice(["PAGAR", "RECEBER"]),
+         "valor": Decimal(aleatorio.randint(1, 500000)).scaleb(-2),
+         "fornecedor_cliente_id": aleatorio.choice([None, 1, 2, 3, 4, 5]),
+         "data_previsao": datetime.date(2019, 1, 1) + datetime.timedelta(days=aleatorio.randint(0, 5 * 365))}
+        for _ in range(quantidade)
+    ])
+    db.commit()
+    db.close()
+
+
+def totais_pelo_sql(ano_inicio, ano_fim):
+    db = TestingSessionLocal()
+    ano = extract('year', ContaPagarReceber.data_previsao)
+    mes = extract('month', ContaPagarReceber.data_previsao)
+    linhas = db.query(
+        ContaPagarReceber.tipo, ContaPagarReceber.fornecedor_cliente_id, ano, mes,
+        func.count(ContaPagarReceber.id), func.sum(ContaPagarReceber.valor)
+    ).filter(
+        ContaPagarReceber.data_previsao >= datetime.date(ano_inicio, 1, 1),
+        ContaPagarReceber.data_previsao < datetime.date(ano_fim + 1, 1, 1)
+    ).group_by(ContaPagarReceber.tipo, ContaPagarReceber.fornecedor_cliente_id, ano, mes).all()
+    db.close()
+
+    return {(tipo, fornecedor, int(ano), int(mes)): (quantidade, round(Decimal(valor), 2))
+            for tipo, fornecedor, ano, mes, quantidade, valor in linhas}
+
+
+def test_totais_da_analise_devem_ser_iguais_aos_do_sql(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_contas_aleatorias(3000)
+    monkeypatch.setattr(analises_router, "ANALISES_TAMANHO_DO_LOTE", 250)
+
+    resposta = client.get("/analises/contas-por-mes?ano_inicio=2020&ano_fim=2023")
+
+    assert resposta.status_code == 200
+    assert {
+        (linha['tipo'], linha['fornecedor_cliente_id'], linha['ano'], linha['mes']):
+            (linha['quantidade'], Decimal(linha['valor_total']))
+        for linha in resposta.json()
+    } == totais_pelo_sql(2020, 2023)
+
+
+def test_deve_calcular_a_variacao_para_o_mes_e_o_ano_anteriores():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    for valor, data_previsao in [("0.10", "2021-03-05"), ("0.20", "2021-03-20"), ("100.00", "2022-02-10"),
+                                 ("50.05", "2022-03-10"), ("7.00", "2022-05-10")]:
+        client.post("/contas-a-pagar-e-receber", json={"descricao": "Conta", "valor": valor, "tipo": "PAGAR",
+                                                       "data_previsao": data_previsao})
+
+    resposta = client.get("/analises/contas-por-mes?ano_inicio=2022")
+
+    assert resposta.json() == [
+        {"tipo": "PAGAR", "fornecedor_cliente_id": None, "ano": 2022, "mes": 2, "quantidade": 1,
+         "valor_total": "100.00", "variacao_mes_anterior": "100.00", "variacao_ano_anterior": "100.00"},
+        {"tipo": "PAGAR", "fornecedor_cliente_id": None, "ano": 2022, "mes": 3, "quantidade": 1,
+         "valor_total": "50.05", "variacao_mes_anterior": "-49.95", "variacao_ano_anterior": "49.75"},
+        {"tipo": "PAGAR", "fornecedor_cliente_id": None, "ano": 2022, "mes": 5, "quantidade": 1,
+         "valor_total": "7.00", "variacao_mes_anterior": "7.00", "variacao_ano_anterior": "7.00"},
+    ]
+
+
+def test_deve_agrupar_somente_por_tipo_quando_pedido():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_contas_aleatorias(500)
+
+    por_fornecedor = client.get("/analises/contas-por-mes?ano_inicio=2021").json()
+    por_tipo = client.get("/analises/contas-por-mes?ano_inicio=2021&agrupar_por_fornecedor=false").json()
+
+    assert {linha['fornecedor_cliente_id'] for linha in por_tipo} == {None}
+    assert sum(Decimal(linha['valor_total']) for linha in por_tipo) == \
+        sum(Decimal(linha['valor_total']) for linha in por_fornecedor)
+    assert sum(linha['quantidade'] for linha in por_tipo) == sum(linha['quantidade'] for linha in por_fornecedor)
+
+
+def test_deve_retornar_erro_para_periodo_de_analise_invalido():
+    resposta = client.get("/analises/contas-por-mes?ano_inicio=2022&ano_fim=2020")
+
+    assert resposta.status_code == 422
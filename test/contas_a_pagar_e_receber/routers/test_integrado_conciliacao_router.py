@@ -0,0 +1,227 @@
+import asyncio
+import datetime
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.pagamento_model import Pagamento
+from contas_a_pagar_e_receber.routers.conciliacao_router import baixa_contas_conciliadas, carrega_conciliador, \
+    Conciliador, LeitorDeCSV
+from main import app
+from shared import clientes
+from shared.database import Base
+from shared.dependencies import get_db
+
+client = TestClient(app)
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+@pytest.fixture(autouse=True)
+def cliente_por_teste(monkeypatch, request):
+    # POST /conciliacao tem rajada pequena no rate limiting: cada teste usa a sua própria chave
+    monkeypatch.setattr(clientes, "API_KEYS_PERMITIDAS", {request.node.name})
+    monkeypatch.setitem(client.headers, "X-API-Key", request.node.name)
+
+
+def cria_conta(descricao, valor, tipo, data_previsao, fornecedor_cliente_id=None):
+    return client.post("/contas-a-pagar-e-receber", json={
+        "descricao": descricao, "valor": valor, "tipo": tipo, "data_previsao": data_previsao,
+        "fornecedor_cliente_id": fornecedor_cliente_id
+    }).json()["id"]
+
+
+def em_pedacos(texto, tamanho=7):
+    # Pedaços pequenos: linhas, tags e caracteres acentuados chegam partidos
+    dados = texto.encode()
+    for inicio in range(0, len(dados), tamanho):
+        yield dados[inicio:inicio + tamanho]
+
+
+def concilia(extrato, **params):
+    return client.post("/conciliacao", params=params, content=em_pedacos(extrato))
+
+
+def test_deve_conciliar_extrato_csv_e_baixar_as_contas_numa_transacao():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    cria_conta("Aluguel", 1500, "PAGAR", "2024-01-10")
+    cria_conta("Internet", 100, "PAGAR", "2024-01-15")
+    cria_conta("Telefone", 100, "PAGAR", "2024-01-16")
+    cria_conta("Salário", "5000.50", "RECEBER", "2024-01-05")
+    cria_conta("Condomínio", 800, "PAGAR", "2024-01-20")
+    client.post("/contas-a-pagar-e-receber/5/pagamentos", json={"valor": 300})
+
+    extrato = (
+        "Data;Histórico;Valor\n"
+        "12/01/2024;Aluguel janeiro;-1.500,00\n"
+        "2024-01-15;Débito automático;-100,00\n"
+        "06/01/2024;Salário;5000,50\n"
+        "20/01/2024;Condomínio restante;-500,00\n"
+        "20/02/2024;Sem conta;-42,00\n"
+        "31/02/2024;Data impossível;-10,00\n"
+    )
+    resposta = concilia(extrato)
+    corpo = resposta.json()
+
+    assert resposta.status_code == 200
+    assert corpo["total_lancamentos"] == 5
+    assert [(item["linha"], item["conta_id"]) for item in corpo["conciliacoes"]] == [(2, 1), (4, 4), (5, 5)]
+    assert [(item["linha"], item["contas_candidatas"]) for item in corpo["ambiguos"]] == [(3, [2, 3])]
+    assert [(item["linha"], item["valor"]) for item in corpo["nao_conciliados"]] == [(6, "-42.00")]
+    assert corpo["invalidas"] == [{"linha": 7, "erro": "Data ou valor inválido"}]
+
+    aluguel = client.get("/contas-a-pagar-e-receber/1").json()
+    condominio = client.get("/contas-a-pagar-e-receber/5").json()
+    assert (aluguel["esta_baixada"], aluguel["data_baixa"], aluguel["valor_baixa"]) == (True, "2024-01-12", "1500.00")
+    assert (condominio["esta_baixada"], condominio["valor_baixa"]) == (True, "800.00")
+    pagamentos = client.get("/contas-a-pagar-e-receber/5/pagamentos").json()
+    assert sorted(pagamento["valor"] for pagamento in pagamentos) == ["300.00", "500.00"]
+    assert client.get("/contas-a-pagar-e-receber/2").json()["esta_baixada"] is False
+
+    # As contas baixadas saem das próximas conciliações
+    assert concilia(extrato).json()["total_conciliados"] == 0
+
+
+def test_deve_conciliar_extrato_ofx_desempatando_pelo_fornecedor():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={"nome": "Padaria São João"})
+    client.post("/fornecedor-cliente", json={"nome": "Mercado Central"})
+    cria_conta("Pães", 250, "PAGAR", "2024-03-01", 1)
+    cria_conta("Compras", 250, "PAGAR", "2024-03-02", 2)
+
+    extrato = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240302120000[-3:BRT]<TRNAMT>-250.00<FITID>A1
+<NAME>PADARIA SAO JOAO<MEMO>Pães &amp; doces</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240303<TRNAMT>-250.00<FITID>A2<NAME>Desconhecido</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<TRNAMT>-1.00<FITID>A3</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+    simulada = concilia(extrato, simular=True).json()
+    corpo = concilia(extrato).json()
+
+    assert simulada["simulacao"] is True
+    assert simulada["conciliacoes"] == corpo["conciliacoes"]
+    assert corpo["conciliacoes"] == [{"linha": 1, "conta_id": 1, "identificador": "A1"},
+                                     {"linha": 2, "conta_id": 2, "identificador": "A2"}]
+    assert corpo["invalidas"] == [{"linha": 3, "erro": "DTPOSTED ou TRNAMT ausente ou inválido"}]
+    assert client.get("/contas-a-pagar-e-receber/1").json()["data_baixa"] == "2024-03-02"
+
+
+def test_nao_deve_baixar_conta_alterada_entre_a_leitura_e_a_baixa():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_conta("Aluguel", 1500, "PAGAR", "2024-01-10")
+    cria_conta("Internet", 100, "PAGAR", "2024-01-15")
+
+    db = TestingSessionLocal()
+    conciliador = carrega_conciliador(db, janela_dias=5)
+    leitor = LeitorDeCSV()
+    conciliador.processa(leitor.alimenta("data,valor\n2024-01-10,-1500\n2024-01-15,-100\n") + leitor.finaliza())
+    client.put("/contas-a-pagar-e-receber/2", json={"descricao": "Internet fibra", "valor": 100, "tipo": "PAGAR",
+                                                     "data_previsao": "2024-01-15"})
+
+    alteradas = baixa_contas_conciliadas(db, conciliador)
+    db.close()
+
+    assert alteradas == [2]
+    assert client.get("/contas-a-pagar-e-receber/1").json()["esta_baixada"] is True
+    assert client.get("/contas-a-pagar-e-receber/2").json()["esta_baixada"] is False
+    assert len(client.get("/contas-a-pagar-e-receber/2/pagamentos").json()) == 0
+
+
+def test_deve_recusar_extrato_sem_as_colunas_obrigatorias_ou_vazio():
+    sem_valor = client.post("/conciliacao", content=b"data;descricao\n2024-01-10;Aluguel\n")
+    vazio = client.post("/conciliacao", content=b"\n\n")
+
+    assert sem_valor.status_code == 422
+    assert vazio.status_code == 422
+
+
+def test_conciliacao_nao_deve_rodar_no_event_loop(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_conta("Aluguel", 1500, "PAGAR", "2024-01-10")
+
+    processa = Conciliador.processa
+    no_event_loop = []
+
+    def processa_registrando(conciliador, lancamentos):
+        try:
+            asyncio.get_running_loop()
+            no_event_loop.append(True)
+        except RuntimeError:
+            no_event_loop.append(False)
+        processa(conciliador, lancamentos)
+
+    monkeypatch.setattr(Conciliador, "processa", processa_registrando)
+
+    # Sem quebra de linha no fim: o último lançamento só é lido ao finalizar o extrato
+    resposta = concilia("Data;Histórico;Valor\n12/01/2024;Aluguel;-1.500,00", simular=True)
+
+    assert resposta.json()["total_conciliados"] == 1
+    assert no_event_loop and not any(no_event_loop)
+
+
+def test_consultas_nao_devem_crescer_com_o_tamanho_do_extrato():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    quantidade = 20000
+    inicio_do_ano = datetime.date(2024, 1, 1)
+    with engine.begin() as conexao:
+        conexao.execute(insert(ContaPagarReceber), [
+            {"descricao": f"Conta {numero}", "valor": 10 + numero % 5000, "tipo": "PAGAR",
+             "data_previsao": inicio_do_ano + datetime.timedelta(days=numero % 360), "esta_baixada": False}
+            for numero in range(quantidade)
+        ])
+    extrato = "data,valor\n" + "".join(
+        f"{inicio_do_ano + datetime.timedelta(days=numero % 360)},-{10 + numero % 5000}\n"
+        for numero in range(quantidade)
+    )
+
+    consultas = []
+
+    def registra(conexao, cursor, consulta, *args):
+        consultas.append(consulta)
+
+    event.listen(engine, "before_cursor_execute", registra)
+    try:
+        inicio = time.perf_counter()
+        resposta = client.post("/conciliacao", content=extrato.encode())
+        duracao = time.perf_counter() - inicio
+    finally:
+        event.remove(engine, "before_cursor_execute", registra)
+    atualizacoes = [consulta for consulta in consultas if consulta.startswith("UPDATE contas")]
+
+    assert resposta.json()["total_conciliados"] == quantidade
+    assert len(atualizacoes) <= 360 + quantidade // 1000
+    assert duracao < 20
+    with TestingSessionLocal() as db:
+        assert db.query(Pagamento).count() == quantidade
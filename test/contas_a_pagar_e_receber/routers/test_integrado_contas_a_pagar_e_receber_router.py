@@ -1,13 +1,28 @@
 import datetime
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
-from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import QUANTIDADE_PERMITIDA_POR_MES
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.pagamento_model import Pagamento
+from contas_a_pagar_e_receber.routers import contas_a_pagar_e_receber_router
+from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import QUANTIDADE_PERMITIDA_POR_MES, \
+    ContaPagarReceberRequest, salva_com_controle_de_versao
+from contas_a_pagar_e_receber.routers.dashboard_router import atualiza_resumo_mensal
 from main import app
+from shared import clientes
 from shared.database import Base
 from shared.dependencies import get_db
+from shared.eventos import corretor_de_eventos
+from shared.exceptions import Conflict
+from shared.idempotencia import ChaveIdempotencia
 
 client = TestClient(app)
 
@@ -454,3 +469,778 @@ def test_relatorio_gastos_previstos_por_mes_de_um_ano_sem_registros():
 
     assert resposta.status_code == 200
     assert len(resposta.json()) == 0
+
+
+def test_deve_criar_parcelas_mensais_em_uma_unica_requisicao():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={"nome": "Casa da Música"})
+
+    resposta = client.post("/contas-a-pagar-e-receber/parcelas", json={
+        "conta": {
+            "descricao": "Guitarra",
+            "valor": 250,
+            "tipo": "PAGAR",
+            "fornecedor_cliente_id": 1,
+            "data_previsao": "2023-01-31"
+        },
+        "quantidade_parcelas": 3,
+        "periodicidade": "MENSAL"
+    })
+
+    assert resposta.status_code == 201
+    parcelas = resposta.json()['parcelas']
+    assert [p['data_previsao'] for p in parcelas] == ["2023-01-31", "2023-02-28", "2023-03-31"]
+    assert all(p['valor'] == "250.00" and p['fornecedor'] == {"id": 1, "nome": "Casa da Música"} for p in parcelas)
+
+    resposta_get = client.get(f"/contas-a-pagar-e-receber/parcelas/{resposta.json()['grupo_parcelas']}")
+
+    assert resposta_get.status_code == 200
+    assert resposta_get.json() == resposta.json()
+
+
+def test_deve_recusar_parcelas_que_excedem_o_limite_mensal():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    db.add_all([ContaPagarReceber(descricao="Aluguel", valor=10, tipo="PAGAR", data_previsao=datetime.date(2023, 2, 1))
+                for _ in range(QUANTIDADE_PERMITIDA_POR_MES)])
+    db.commit()
+    db.close()
+
+    resposta = client.post("/contas-a-pagar-e-receber/parcelas", json={
+        "conta": {"descricao": "Aluguel", "valor": 10, "tipo": "PAGAR", "data_previsao": "2023-01-15"},
+        "quantidade_parcelas": 3,
+        "periodicidade": "MENSAL"
+    })
+
+    assert resposta.status_code == 422
+    assert resposta.json()['detail'] == "Você não pode mais lançar contas para 02/2023"
+    assert len(client.get("/contas-a-pagar-e-receber").json()) == QUANTIDADE_PERMITIDA_POR_MES
+
+
+def test_deve_baixar_todas_as_parcelas_de_um_grupo():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    resposta = client.post("/contas-a-pagar-e-receber/parcelas", json={
+        "conta": {"descricao": "Curso", "valor": 99.9, "tipo": "PAGAR", "data_previsao": "2023-01-10"},
+        "quantidade_parcelas": 4,
+        "periodicidade": "QUINZENAL"
+    })
+
+    resposta_baixa = client.post(f"/contas-a-pagar-e-receber/parcelas/{resposta.json()['grupo_parcelas']}/baixar")
+
+    assert resposta_baixa.status_code == 200
+    parcelas = resposta_baixa.json()['parcelas']
+    assert [p['data_previsao'] for p in parcelas] == ["2023-01-10", "2023-01-24", "2023-02-07", "2023-02-21"]
+    assert all(p['esta_baixada'] is True and p['valor_baixa'] == "99.90" for p in parcelas)
+
+
+def test_deve_retornar_nao_encontrado_para_grupo_de_parcelas_inexistente():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    assert client.get("/contas-a-pagar-e-receber/parcelas/inexistente").status_code == 404
+
+
+def test_deve_repetir_a_resposta_de_uma_criacao_com_a_mesma_idempotency_key():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    nova_conta = {"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"}
+
+    resposta = client.post("/contas-a-pagar-e-receber", json=nova_conta, headers={"Idempotency-Key": "abc-123"})
+    resposta_repetida = client.post("/contas-a-pagar-e-receber", json=nova_conta,
+                                    headers={"Idempotency-Key": "abc-123"})
+
+    assert resposta.status_code == 201
+    assert resposta_repetida.status_code == 201
+    assert resposta_repetida.headers["Idempotent-Replayed"] == "true"
+    assert resposta_repetida.json() == resposta.json()
+    assert len(client.get("/contas-a-pagar-e-receber").json()) == 1
+
+
+def test_deve_recusar_idempotency_key_reutilizada_com_outra_requisicao():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber", headers={"Idempotency-Key": "abc-123"},
+                json={"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    resposta = client.post("/contas-a-pagar-e-receber", headers={"Idempotency-Key": "abc-123"},
+                           json={"descricao": "Curso de Java", "valor": 333, "tipo": "PAGAR",
+                                 "data_previsao": "2022-11-29"})
+
+    assert resposta.status_code == 422
+    assert resposta.json()['detail'] == "Essa Idempotency-Key já foi usada com outra requisição"
+
+
+def test_idempotency_key_deve_valer_somente_para_o_mesmo_cliente(monkeypatch):
+    monkeypatch.setattr(clientes, "API_KEYS_PERMITIDAS", {"cliente-a", "cliente-b"})
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    nova_conta = {"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"}
+
+    resposta_a = client.post("/contas-a-pagar-e-receber", json=nova_conta,
+                             headers={"Idempotency-Key": "abc-123", "X-API-Key": "cliente-a"})
+    resposta_b = client.post("/contas-a-pagar-e-receber", json={**nova_conta, "descricao": "Curso de Java"},
+                             headers={"Idempotency-Key": "abc-123", "X-API-Key": "cliente-b"})
+    resposta_a_repetida = client.post("/contas-a-pagar-e-receber", json=nova_conta,
+                                      headers={"Idempotency-Key": "abc-123", "X-API-Key": "cliente-a"})
+
+    assert (resposta_a.status_code, resposta_b.status_code) == (201, 201)
+    assert resposta_b.json()["id"] != resposta_a.json()["id"]
+    assert "Idempotent-Replayed" not in resposta_b.headers
+    assert resposta_a_repetida.json() == resposta_a.json()
+
+
+def test_deve_executar_novamente_quando_a_requisicao_original_falhou():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    conta_com_fornecedor = {"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR",
+                            "fornecedor_cliente_id": 1, "data_previsao": "2022-11-29"}
+
+    resposta = client.post("/contas-a-pagar-e-receber", json=conta_com_fornecedor,
+                           headers={"Idempotency-Key": "abc-123"})
+    client.post("/fornecedor-cliente", json={"nome": "Casa da Música"})
+    resposta_nova_tentativa = client.post("/contas-a-pagar-e-receber", json=conta_com_fornecedor,
+                                          headers={"Idempotency-Key": "abc-123"})
+
+    assert resposta.status_code == 422
+    assert resposta_nova_tentativa.status_code == 201
+
+
+def test_requisicoes_simultaneas_com_a_mesma_idempotency_key_devem_criar_uma_unica_conta():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    nova_conta = {"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"}
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        respostas = list(executor.map(
+            lambda _: client.post("/contas-a-pagar-e-receber", json=nova_conta,
+                                  headers={"Idempotency-Key": "abc-123"}),
+            range(5)
+        ))
+
+    assert {r.status_code for r in respostas} == {201}
+    assert {r.json()['id'] for r in respostas} == {1}
+    assert len(client.get("/contas-a-pagar-e-receber").json()) == 1
+
+
+def reserva_chave_abandonada(escopo: str, idempotency_key: str, requisicao: dict) -> str:
+    # Como se a requisição original tivesse reservado a chave há uma hora e caído sem responder
+    cliente = hashlib.sha256(b"ip:testclient").hexdigest()[:32]
+    chave = f"{escopo}:{cliente}:{idempotency_key}"
+    criado_em = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+
+    db = TestingSessionLocal()
+    db.add(ChaveIdempotencia(
+        chave=chave, criado_em=criado_em, expira_em=criado_em + datetime.timedelta(hours=24),
+        hash_requisicao=hashlib.sha256(json.dumps(requisicao, sort_keys=True, default=str).encode()).hexdigest()
+    ))
+    db.commit()
+    db.close()
+    return chave
+
+
+def test_deve_executar_no_lugar_da_requisicao_original_que_nao_concluiu_no_tempo_maximo():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    nova_conta = {"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"}
+    reserva_chave_abandonada("criar_conta", "abc-123", ContaPagarReceberRequest(**nova_conta).model_dump())
+
+    resposta = client.post("/contas-a-pagar-e-receber", json=nova_conta, headers={"Idempotency-Key": "abc-123"})
+    resposta_repetida = client.post("/contas-a-pagar-e-receber", json=nova_conta,
+                                    headers={"Idempotency-Key": "abc-123"})
+
+    assert resposta.status_code == 201
+    assert resposta_repetida.headers["Idempotent-Replayed"] == "true"
+    assert resposta_repetida.json() == resposta.json()
+    assert len(client.get("/contas-a-pagar-e-receber").json()) == 1
+
+
+def test_nao_deve_gravar_a_escrita_quando_a_requisicao_original_concluiu_antes(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    nova_conta = {"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"}
+    chave = reserva_chave_abandonada("criar_conta", "abc-123", ContaPagarReceberRequest(**nova_conta).model_dump())
+    registra_conta = contas_a_pagar_e_receber_router.registra_conta
+
+    def registra_conta_enquanto_a_original_conclui(*args):
+        db = TestingSessionLocal()
+        registro = db.query(ChaveIdempotencia).get(chave)
+        registro.status_code, registro.resposta = 201, json.dumps({**nova_conta, "id": 42})
+        db.commit()
+        db.close()
+        return registra_conta(*args)
+
+    monkeypatch.setattr(contas_a_pagar_e_receber_router, "registra_conta", registra_conta_enquanto_a_original_conclui)
+    resposta = client.post("/contas-a-pagar-e-receber", json=nova_conta, headers={"Idempotency-Key": "abc-123"})
+
+    assert resposta.status_code == 201
+    assert resposta.headers["Idempotent-Replayed"] == "true"
+    assert resposta.json()["id"] == 42
+    assert client.get("/contas-a-pagar-e-receber").json() == []
+
+
+def test_deve_repetir_a_resposta_de_uma_baixa_com_a_mesma_idempotency_key():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    resposta = client.post("/contas-a-pagar-e-receber/1/baixar", headers={"Idempotency-Key": "baixa-1"})
+    resposta_repetida = client.post("/contas-a-pagar-e-receber/1/baixar", headers={"Idempotency-Key": "baixa-1"})
+
+    assert resposta_repetida.status_code == 200
+    assert resposta_repetida.headers["Idempotent-Replayed"] == "true"
+    assert resposta_repetida.json() == resposta.json()
+
+
+def test_deve_atualizar_conta_quando_o_if_match_confere_com_a_versao_atual():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    etag = client.get("/contas-a-pagar-e-receber/1").headers["ETag"]
+    resposta = client.put("/contas-a-pagar-e-receber/1", headers={"If-Match": etag},
+                          json={"descricao": "Curso de Java", "valor": 111, "tipo": "PAGAR",
+                                "data_previsao": "2022-11-29"})
+
+    assert etag == '"1"'
+    assert resposta.status_code == 200
+    assert resposta.headers["ETag"] == '"2"'
+    assert resposta.json()['descricao'] == "Curso de Java"
+
+
+def test_deve_retornar_conflito_quando_o_if_match_esta_desatualizado():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+    client.put("/contas-a-pagar-e-receber/1",
+               json={"descricao": "Curso de Java", "valor": 111, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    resposta_put = client.put("/contas-a-pagar-e-receber/1", headers={"If-Match": '"1"'},
+                              json={"descricao": "Curso de Go", "valor": 222, "tipo": "PAGAR",
+                                    "data_previsao": "2022-11-29"})
+    resposta_baixa = client.post("/contas-a-pagar-e-receber/1/baixar", headers={"If-Match": 'W/"1"'})
+
+    assert resposta_put.status_code == 409
+    assert resposta_put.headers["ETag"] == '"2"'
+    assert resposta_baixa.status_code == 409
+    assert client.get("/contas-a-pagar-e-receber/1").json()['descricao'] == "Curso de Java"
+
+
+def test_deve_retornar_conflito_quando_outra_sessao_alterou_a_conta_antes_do_commit():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    db = TestingSessionLocal()
+    conta = db.query(ContaPagarReceber).get(1)
+    client.post("/contas-a-pagar-e-receber/1/baixar")
+
+    conta.descricao = "Curso de Java"
+    with pytest.raises(Conflict) as erro:
+        salva_com_controle_de_versao(conta, db)
+    db.close()
+
+    assert erro.value.etag == '"2"'
+    assert client.get("/contas-a-pagar-e-receber/1").json()['descricao'] == "Curso de Python"
+
+
+def test_atualizacoes_simultaneas_da_mesma_versao_devem_ter_um_unico_vencedor():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 333, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        respostas = list(executor.map(
+            lambda i: client.put("/contas-a-pagar-e-receber/1", headers={"If-Match": '"1"'},
+                                 json={"descricao": f"Versão {i}", "valor": 100 + i, "tipo": "PAGAR",
+                                       "data_previsao": "2022-11-29"}),
+            range(8)
+        ))
+
+    status = sorted(r.status_code for r in respostas)
+    vencedora = next(r for r in respostas if r.status_code == 200)
+
+    assert status == [200] + [409] * 7
+    assert client.get("/contas-a-pagar-e-receber/1").json()['descricao'] == vencedora.json()['descricao']
+    assert client.get("/contas-a-pagar-e-receber/1").headers["ETag"] == '"2"'
+
+
+def test_atualizacoes_simultaneas_de_contas_diferentes_nao_devem_conflitar():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    for i in range(8):
+        client.post("/contas-a-pagar-e-receber",
+                    json={"descricao": f"Conta {i}", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        respostas = list(executor.map(
+            lambda id_da_conta: client.post(f"/contas-a-pagar-e-receber/{id_da_conta}/baixar",
+                                            headers={"If-Match": '"1"'}),
+            range(1, 9)
+        ))
+
+    assert [r.status_code for r in respostas] == [200] * 8
+    assert {r.headers["ETag"] for r in respostas} == {'"2"'}
+
+
+def test_deve_registrar_pagamentos_parciais_ate_quitar_a_conta():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": "99.99", "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    respostas = [
+        client.post("/contas-a-pagar-e-receber/1/pagamentos",
+                    json={"valor": "33.33", "data_pagamento": f"2022-12-0{dia}"})
+        for dia in range(1, 4)
+    ]
+    conta = client.get("/contas-a-pagar-e-receber/1").json()
+
+    assert [r.status_code for r in respostas] == [201] * 3
+    assert [r.json()['saldo_em_aberto'] for r in respostas] == ["66.66", "33.33", "0.00"]
+    assert [r.json()['esta_baixada'] for r in respostas] == [False, False, True]
+    assert conta['valor_baixa'] == "99.99"
+    assert conta['esta_baixada'] is True
+    assert conta['data_baixa'] == "2022-12-03"
+    assert len(client.get("/contas-a-pagar-e-receber/1/pagamentos").json()) == 3
+
+
+def test_nao_deve_aceitar_pagamento_acima_do_saldo_em_aberto():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+    client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 60})
+
+    resposta = client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 50})
+
+    assert resposta.status_code == 422
+    assert resposta.json()['detail'] == "O valor do pagamento ultrapassa o saldo em aberto da conta"
+    assert client.get("/contas-a-pagar-e-receber/1").json()['valor_baixa'] == "60.00"
+    assert len(client.get("/contas-a-pagar-e-receber/1/pagamentos").json()) == 1
+
+
+def test_deve_retornar_nao_encontrado_ao_pagar_conta_inexistente():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    resposta = client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 50})
+
+    assert resposta.status_code == 404
+
+
+def test_baixar_conta_parcialmente_paga_deve_registrar_o_restante():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+    client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 30})
+
+    resposta = client.post("/contas-a-pagar-e-receber/1/baixar")
+    pagamentos = client.get("/contas-a-pagar-e-receber/1/pagamentos").json()
+
+    assert resposta.json()['valor_baixa'] == "100.00"
+    assert [p['valor'] for p in pagamentos] == ["30.00", "70.00"]
+
+
+def test_alterar_o_valor_deve_recalcular_a_baixa_da_conta():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    conta = {"descricao": "Curso de Python", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-11-29"}
+    client.post("/contas-a-pagar-e-receber", json=conta)
+    client.post("/contas-a-pagar-e-receber", json=conta)
+    client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 60, "data_pagamento": "2022-12-01"})
+    client.post("/contas-a-pagar-e-receber/2/baixar")
+
+    parcial_reduzida = client.put("/contas-a-pagar-e-receber/1", json={**conta, "valor": 60})
+    parcial_aumentada = client.put("/contas-a-pagar-e-receber/1", json={**conta, "valor": 150})
+    parcial_abaixo_do_pago = client.put("/contas-a-pagar-e-receber/1", json={**conta, "valor": 50})
+    quitada_aumentada = client.put("/contas-a-pagar-e-receber/2", json={**conta, "valor": 120})
+    quitada_abaixo_do_pago = client.put("/contas-a-pagar-e-receber/2", json={**conta, "valor": 90})
+
+    assert (parcial_reduzida.json()["esta_baixada"], parcial_reduzida.json()["data_baixa"]) == (True, str(datetime.date.today()))
+    assert (parcial_aumentada.json()["esta_baixada"], parcial_aumentada.json()["data_baixa"]) == (False, None)
+    assert parcial_abaixo_do_pago.status_code == 422
+    assert parcial_abaixo_do_pago.json()["detail"] == "O valor da conta não pode ser menor que o valor já pago"
+    assert (quitada_aumentada.json()["esta_baixada"], quitada_aumentada.json()["data_baixa"]) == (False, None)
+    assert quitada_abaixo_do_pago.status_code == 422
+
+    assert client.get("/contas-a-pagar-e-receber/2").json()["valor_baixa"] == "100.00"
+    assert client.get("/contas-a-pagar-e-receber/saldo-em-aberto").json() == [
+        {"tipo": "PAGAR", "quantidade": 2, "valor_total": "110.00"},
+    ]
+
+
+def test_deve_calcular_o_saldo_em_aberto_pelos_valores_baixados():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    for valor, tipo in [(100, "PAGAR"), (200, "PAGAR"), (50, "RECEBER"), (80, "RECEBER")]:
+        client.post("/contas-a-pagar-e-receber",
+                    json={"descricao": "Curso de Python", "valor": valor, "tipo": tipo, "data_previsao": "2022-11-29"})
+    client.post("/contas-a-pagar-e-receber/2/pagamentos", json={"valor": "120.50"})
+    client.post("/contas-a-pagar-e-receber/4/baixar")
+
+    resposta = client.get("/contas-a-pagar-e-receber/saldo-em-aberto")
+
+    assert resposta.status_code == 200
+    assert resposta.json() == [
+        {"tipo": "PAGAR", "quantidade": 2, "valor_total": "179.50"},
+        {"tipo": "RECEBER", "quantidade": 1, "valor_total": "50.00"},
+    ]
+
+
+def test_deve_agrupar_as_contas_em_aberto_por_faixa_de_atraso():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    for descricao, valor, tipo, data_previsao in [
+        ("Vence hoje", 100, "PAGAR", "2024-06-30"),
+        ("30 dias", 50, "PAGAR", "2024-05-31"),
+        ("31 dias", 70, "PAGAR", "2024-05-30"),
+        ("90 dias", 10, "PAGAR", "2024-04-01"),
+        ("91 dias", 20, "PAGAR", "2024-03-31"),
+        ("Daqui a 10 dias", 200, "RECEBER", "2024-07-10"),
+        ("Daqui a 11 dias", 300, "RECEBER", "2024-07-11"),
+        ("Baixada", 400, "PAGAR", "2024-06-01"),
+    ]:
+        client.post("/contas-a-pagar-e-receber",
+                    json={"descricao": descricao, "valor": valor, "tipo": tipo, "data_previsao": data_previsao})
+    client.post("/contas-a-pagar-e-receber/2/pagamentos", json={"valor": "20.25"})
+    client.post("/contas-a-pagar-e-receber/8/baixar")
+
+    resposta = client.get("/contas-a-pagar-e-receber/vencimentos",
+                          params={"data_referencia": "2024-06-30", "dias": 10, "limite": 4})
+    so_a_receber = client.get("/contas-a-pagar-e-receber/vencimentos",
+                              params={"data_referencia": "2024-06-30", "dias": 10, "tipo": "RECEBER"})
+
+    assert resposta.status_code == 200
+    assert resposta.json()["faixas"] == [
+        {"tipo": "PAGAR", "faixa": "0-30", "quantidade": 2, "valor_total": "129.75"},
+        {"tipo": "PAGAR", "faixa": "31-60", "quantidade": 1, "valor_total": "70.00"},
+        {"tipo": "PAGAR", "faixa": "61-90", "quantidade": 1, "valor_total": "10.00"},
+        {"tipo": "PAGAR", "faixa": "90+", "quantidade": 1, "valor_total": "20.00"},
+        {"tipo": "RECEBER", "faixa": "A_VENCER", "quantidade": 1, "valor_total": "200.00"},
+    ]
+    assert [(conta["descricao"], conta["dias_de_atraso"], conta["faixa"]) for conta in resposta.json()["contas"]] == [
+        ("91 dias", 91, "90+"), ("90 dias", 90, "61-90"), ("31 dias", 31, "31-60"), ("30 dias", 30, "0-30")
+    ]
+    assert resposta.json()["contas"][3]["saldo"] == "29.75"
+    assert resposta.json()["tem_mais"] is True
+    assert [conta["descricao"] for conta in so_a_receber.json()["contas"]] == ["Daqui a 10 dias"]
+    assert so_a_receber.json()["tem_mais"] is False
+
+
+def test_pagamentos_simultaneos_nao_devem_ultrapassar_o_valor_da_conta():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        respostas = list(executor.map(
+            lambda _: client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 25}),
+            range(8)
+        ))
+
+    assert sorted(r.status_code for r in respostas) == [201] * 4 + [422] * 4
+    assert client.get("/contas-a-pagar-e-receber/1").json()['valor_baixa'] == "100.00"
+    assert len(client.get("/contas-a-pagar-e-receber/1/pagamentos").json()) == 4
+
+
+def test_excluir_conta_deve_remover_os_pagamentos_dela():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber",
+                json={"descricao": "Curso de Python", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-11-29"})
+    client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 30})
+
+    client.delete("/contas-a-pagar-e-receber/1")
+
+    db = TestingSessionLocal()
+    assert db.query(Pagamento).count() == 0
+    db.close()
+
+
+def test_baixar_parcelas_deve_registrar_um_pagamento_por_parcela():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    resposta = client.post("/contas-a-pagar-e-receber/parcelas", json={
+        "conta": {"descricao": "Notebook", "valor": "99.90", "tipo": "PAGAR", "data_previsao": "2022-01-10"},
+        "quantidade_parcelas": 3
+    })
+    client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": "9.90"})
+
+    client.post(f"/contas-a-pagar-e-receber/parcelas/{resposta.json()['grupo_parcelas']}/baixar")
+
+    db = TestingSessionLocal()
+    valores = sorted((p.conta_a_pagar_e_receber_id, str(p.valor)) for p in db.query(Pagamento).all())
+    db.close()
+
+    assert valores == [(1, "9.90"), (1, "90.00"), (2, "99.90"), (3, "99.90")]
+
+
+def test_deve_buscar_contas_por_ids_na_ordem_pedida():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={"nome": "Casa da Música"})
+    for descricao in ["Guitarra", "Baixo", "Bateria"]:
+        client.post("/contas-a-pagar-e-receber", json={"descricao": descricao, "valor": 100, "tipo": "PAGAR",
+                                                       "fornecedor_cliente_id": 1, "data_previsao": "2022-11-29"})
+
+    resposta = client.post("/contas-a-pagar-e-receber/buscar", json={"ids": [3, 99, 1, 3]})
+
+    assert resposta.status_code == 200
+    assert [conta['descricao'] for conta in resposta.json()['itens']] == ["Bateria", "Guitarra"]
+    assert resposta.json()['itens'][0]['fornecedor'] == {"id": 1, "nome": "Casa da Música"}
+    assert resposta.json()['nao_encontrados'] == [99]
+
+
+def test_deve_limitar_a_quantidade_de_ids_por_busca():
+    resposta_vazia = client.post("/contas-a-pagar-e-receber/buscar", json={"ids": []})
+    resposta_grande = client.post("/contas-a-pagar-e-receber/buscar", json={"ids": list(range(10000))})
+
+    assert resposta_vazia.status_code == 422
+    assert resposta_grande.status_code == 422
+
+
+def test_deve_retornar_somente_os_campos_pedidos():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={"nome": "Casa da Música"})
+    client.post("/contas-a-pagar-e-receber", json={"descricao": "Guitarra", "valor": 100, "tipo": "PAGAR",
+                                                   "fornecedor_cliente_id": 1, "data_previsao": "2022-11-29"})
+
+    consultas = []
+
+    def registra_consulta(conexao, cursor, sql, *args):
+        consultas.append(sql)
+
+    event.listen(Engine, "before_cursor_execute", registra_consulta)
+    try:
+        resposta = client.get("/contas-a-pagar-e-receber?fields=valor,data_previsao")
+    finally:
+        event.remove(Engine, "before_cursor_execute", registra_consulta)
+
+    select_das_contas = next(c for c in consultas if "FROM contas_a_pagar_e_receber" in c)
+
+    assert resposta.status_code == 200
+    assert resposta.json() == [{"id": 1, "valor": "100.00", "data_previsao": "2022-11-29"}]
+    assert "descricao" not in select_das_contas
+    assert "fornecedor_cliente" not in select_das_contas
+
+
+def test_deve_expandir_o_fornecedor_junto_com_os_campos_pedidos():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={"nome": "Casa da Música"})
+    client.post("/contas-a-pagar-e-receber", json={"descricao": "Guitarra", "valor": 100, "tipo": "PAGAR",
+                                                   "fornecedor_cliente_id": 1, "data_previsao": "2022-11-29"})
+
+    resposta_por_id = client.get("/contas-a-pagar-e-receber/1?fields=descricao&expand=fornecedor")
+    resposta_busca = client.post("/contas-a-pagar-e-receber/buscar?fields=valor", json={"ids": [1, 2]})
+    resposta_do_fornecedor = client.get("/fornecedor-cliente/1/contas-a-pagar-e-receber?fields=tipo")
+
+    assert resposta_por_id.json() == {"id": 1, "descricao": "Guitarra",
+                                      "fornecedor": {"id": 1, "nome": "Casa da Música"}}
+    assert resposta_por_id.headers["ETag"] == '"1"'
+    assert resposta_busca.json() == {"itens": [{"id": 1, "valor": "100.00"}], "nao_encontrados": [2]}
+    assert resposta_do_fornecedor.json() == [{"id": 1, "tipo": "PAGAR"}]
+
+
+def test_deve_rejeitar_campos_desconhecidos():
+    resposta = client.get("/contas-a-pagar-e-receber?fields=valor,senha&expand=pagamentos")
+
+    assert resposta.status_code == 422
+    assert resposta.json()['detail'] == "Campos desconhecidos: senha, pagamentos"
+
+
+def cria_contas_para_exclusao():
+    client.post("/fornecedor-cliente", json={"nome": "Casa da Música"})
+    for i, (tipo, fornecedor_cliente_id, data_previsao) in enumerate([
+        ("PAGAR", 1, "2022-01-10"), ("PAGAR", 1, "2022-02-10"), ("RECEBER", 1, "2022-02-15"),
+        ("PAGAR", None, "2022-02-20"), ("PAGAR", 1, "2022-03-10"),
+    ]):
+        client.post("/contas-a-pagar-e-receber", json={"descricao": f"Conta {i}", "valor": 100, "tipo": tipo,
+                                                       "fornecedor_cliente_id": fornecedor_cliente_id,
+                                                       "data_previsao": data_previsao})
+
+
+def test_deve_simular_e_excluir_contas_em_lote(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_contas_para_exclusao()
+    client.post("/contas-a-pagar-e-receber/2/pagamentos", json={"valor": 10})
+    monkeypatch.setattr(contas_a_pagar_e_receber_router, "EXCLUSAO_EM_LOTE_TAMANHO", 1)
+
+    filtro = {"fornecedor_cliente_id": 1, "tipo": "PAGAR", "data_previsao_inicio": "2022-02-01",
+              "data_previsao_fim": "2022-03-31"}
+    simulacao = client.post("/contas-a-pagar-e-receber/excluir", json={**filtro, "simular": True})
+    exclusao = client.post("/contas-a-pagar-e-receber/excluir", json={**filtro, "quantidade_esperada": 2})
+
+    db = TestingSessionLocal()
+    restantes = [conta.id for conta in db.query(ContaPagarReceber).order_by(ContaPagarReceber.id)]
+    pagamentos = db.query(Pagamento).count()
+    db.close()
+
+    assert simulacao.json() == {"quantidade": 2, "simulacao": True, "lotes": 0}
+    assert exclusao.json() == {"quantidade": 2, "simulacao": False, "lotes": 2}
+    assert restantes == [1, 3, 4]
+    assert pagamentos == 0
+
+
+def test_nao_deve_excluir_em_lote_sem_a_quantidade_esperada_correta():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_contas_para_exclusao()
+
+    sem_quantidade = client.post("/contas-a-pagar-e-receber/excluir", json={"tipo": "PAGAR"})
+    quantidade_errada = client.post("/contas-a-pagar-e-receber/excluir",
+                                    json={"tipo": "PAGAR", "quantidade_esperada": 2})
+    sem_filtro = client.post("/contas-a-pagar-e-receber/excluir", json={"quantidade_esperada": 5})
+
+    assert sem_quantidade.status_code == 422
+    assert quantidade_errada.status_code == 409
+    assert quantidade_errada.json()['detail'] == "O filtro seleciona 4 contas, e não 2. Simule de novo"
+    assert sem_filtro.status_code == 422
+    assert len(client.get("/contas-a-pagar-e-receber").json()) == 5
+
+
+def atualiza_resumo():
+    db = TestingSessionLocal()
+    try:
+        atualiza_resumo_mensal(db)
+    finally:
+        db.close()
+
+
+def test_exclusao_em_lote_deve_aparecer_no_dashboard_na_proxima_atualizacao():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    hoje = datetime.date.today().isoformat()
+    for _ in range(3):
+        client.post("/contas-a-pagar-e-receber",
+                    json={"descricao": "Conta", "valor": 100, "tipo": "PAGAR", "data_previsao": hoje})
+    atualiza_resumo()
+
+    resposta = client.post("/contas-a-pagar-e-receber/excluir", json={"ids": [1, 3], "quantidade_esperada": 2})
+
+    # A exclusão não recalcula o resumo na requisição
+    assert resposta.json()['quantidade'] == 2
+    assert client.get("/dashboard").json()['meses'][0]['quantidade'] == 3
+
+    atualiza_resumo()
+    assert client.get("/dashboard").json()['meses'][0]['quantidade'] == 1
+
+
+def le_eventos_sse(corpo: str) -> list:
+    eventos = []
+    for bloco in corpo.split("\n\n"):
+        campos = dict(linha.split(": ", 1) for linha in bloco.split("\n") if ": " in linha and not linha.startswith(":"))
+        if "event" in campos:
+            eventos.append({"id": campos.get("id"), "tipo": campos["event"], "dados": json.loads(campos["data"])})
+    return eventos
+
+
+def acompanha_eventos(acoes, last_event_id=None) -> list:
+    assinantes_antes = corretor_de_eventos.assinantes
+    cabecalhos = {"Last-Event-ID": last_event_id} if last_event_id else {}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        stream = executor.submit(client.get, "/contas-a-pagar-e-receber/eventos", headers=cabecalhos)
+        while corretor_de_eventos.assinantes == assinantes_antes and not stream.done():
+            time.sleep(0.01)
+        acoes()
+        resposta = stream.result()
+
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("text/event-stream")
+    return le_eventos_sse(resposta.text)
+
+
+def test_deve_emitir_eventos_de_criacao_alteracao_baixa_e_exclusao(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(contas_a_pagar_e_receber_router, "EVENTOS_DURACAO_MAXIMA_SEGUNDOS", 1)
+    conta = {"descricao": "Aluguel", "valor": 1000, "tipo": "PAGAR", "data_previsao": "2022-01-10"}
+
+    def acoes():
+        client.post("/contas-a-pagar-e-receber", json=conta)
+        client.post("/contas-a-pagar-e-receber", json=conta)
+        client.put("/contas-a-pagar-e-receber/1", json={**conta, "valor": 1200})
+        client.post("/contas-a-pagar-e-receber/2/pagamentos", json={"valor": 100})
+        client.post("/contas-a-pagar-e-receber/1/baixar")
+        client.delete("/contas-a-pagar-e-receber/2")
+
+    eventos = acompanha_eventos(acoes)
+
+    assert [(evento["tipo"], evento["dados"]) for evento in eventos] == [
+        ("conta_criada", {"id": 1, "versao": 1}),
+        ("conta_criada", {"id": 2, "versao": 1}),
+        ("conta_atualizada", {"id": 1, "versao": 2}),
+        ("conta_atualizada", {"id": 2, "versao": 2}),
+        ("conta_baixada", {"id": 1, "versao": 3}),
+        ("conta_excluida", {"id": 2, "versao": 2}),
+    ]
+    assert len({evento["id"] for evento in eventos}) == 6
+
+
+def test_deve_retomar_os_eventos_a_partir_do_last_event_id(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(contas_a_pagar_e_receber_router, "EVENTOS_DURACAO_MAXIMA_SEGUNDOS", 0.5)
+
+    def acoes():
+        client.post("/contas-a-pagar-e-receber/parcelas", json={
+            "conta": {"descricao": "Curso", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-01-10"},
+            "quantidade_parcelas": 3,
+        })
+
+    eventos = acompanha_eventos(acoes)
+    retomados = le_eventos_sse(client.get("/contas-a-pagar-e-receber/eventos",
+                                          headers={"Last-Event-ID": eventos[0]["id"]}).text)
+
+    assert [evento["dados"]["id"] for evento in eventos] == [1, 2, 3]
+    assert retomados == eventos[1:]
+
+
+def test_deve_pedir_ressincronizacao_quando_o_last_event_id_nao_estiver_no_historico(monkeypatch):
+    monkeypatch.setattr(contas_a_pagar_e_receber_router, "EVENTOS_DURACAO_MAXIMA_SEGUNDOS", 0.1)
+
+    resposta = client.get("/contas-a-pagar-e-receber/eventos", headers={"Last-Event-ID": "desconhecido"})
+
+    assert resposta.text.startswith("retry: 3000\n\n")
+    assert [evento["tipo"] for evento in le_eventos_sse(resposta.text)] == ["ressincronizar"]
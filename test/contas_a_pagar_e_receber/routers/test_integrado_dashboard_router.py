@@ -0,0 +1,101 @@
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import adiciona_meses
+from contas_a_pagar_e_receber.routers.dashboard_router import atualiza_resumo_mensal, DASHBOARD_MESES
+from main import app
+from shared.database import Base
+from shared.dependencies import get_db
+
+client = TestClient(app)
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+MES_ATUAL = datetime.date.today().replace(day=1)
+PRIMEIRO_MES = adiciona_meses(MES_ATUAL, -(DASHBOARD_MESES - 1))
+
+
+def atualiza_resumo(**kwargs):
+    db = TestingSessionLocal()
+    try:
+        return atualiza_resumo_mensal(db, **kwargs)
+    finally:
+        db.close()
+
+
+def cria_conta(valor, tipo, data_previsao):
+    return client.post("/contas-a-pagar-e-receber", json={
+        "descricao": "Conta", "valor": valor, "tipo": tipo, "data_previsao": data_previsao.isoformat()
+    }).json()
+
+
+def test_deve_resumir_as_contas_por_mes_tipo_e_status():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    cria_conta(100, "PAGAR", MES_ATUAL)
+    conta_baixada = cria_conta(50, "PAGAR", MES_ATUAL)
+    cria_conta(30, "RECEBER", PRIMEIRO_MES)
+    cria_conta(999, "PAGAR", adiciona_meses(PRIMEIRO_MES, -1))
+    client.post(f"/contas-a-pagar-e-receber/{conta_baixada['id']}/baixar")
+
+    atualiza_resumo()
+    resposta = client.get("/dashboard")
+
+    assert resposta.status_code == 200
+    assert resposta.json()['segundos_desde_atualizacao'] < 60
+    assert resposta.json()['meses'] == [
+        {"ano": PRIMEIRO_MES.year, "mes": PRIMEIRO_MES.month, "tipo": "RECEBER", "esta_baixada": False,
+         "quantidade": 1, "valor_total": "30.00", "valor_baixado": "0.00"},
+        {"ano": MES_ATUAL.year, "mes": MES_ATUAL.month, "tipo": "PAGAR", "esta_baixada": False,
+         "quantidade": 1, "valor_total": "100.00", "valor_baixado": "0.00"},
+        {"ano": MES_ATUAL.year, "mes": MES_ATUAL.month, "tipo": "PAGAR", "esta_baixada": True,
+         "quantidade": 1, "valor_total": "50.00", "valor_baixado": "50.00"},
+    ]
+
+
+def test_dashboard_deve_mostrar_o_ultimo_resumo_ate_a_proxima_atualizacao():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    sem_atualizacao = client.get("/dashboard").json()
+    cria_conta(100, "PAGAR", MES_ATUAL)
+    atualiza_resumo()
+    cria_conta(200, "PAGAR", MES_ATUAL)
+
+    antes = client.get("/dashboard").json()
+    atualiza_resumo()
+    depois = client.get("/dashboard").json()
+
+    assert sem_atualizacao == {"atualizado_em": None, "segundos_desde_atualizacao": None, "meses": []}
+    assert antes['meses'][0]['valor_total'] == "100.00"
+    assert depois['meses'][0]['valor_total'] == "300.00"
+
+
+def test_nao_deve_recalcular_o_resumo_atualizado_ha_pouco_tempo():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    assert atualiza_resumo(intervalo_minimo_segundos=60) is True
+    assert atualiza_resumo(intervalo_minimo_segundos=60) is False
+    assert atualiza_resumo() is True
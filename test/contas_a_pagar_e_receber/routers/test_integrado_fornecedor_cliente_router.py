@@ -1,7 +1,10 @@
+import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
+from contas_a_pagar_e_receber.routers import fornecedor_cliente_router
 from main import app
 from shared.database import Base
 from shared.dependencies import get_db
@@ -152,3 +155,204 @@ def test_deve_retornar_erro_quando_o_nome_nao_estiver_dentro_dos_limites():
     })
     assert response2.status_code == 422
     assert response2.json()['detail'][0]['loc'] == ["body", "nome"]
+
+
+def test_deve_repetir_a_resposta_de_uma_criacao_com_a_mesma_idempotency_key():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    resposta = client.post("/fornecedor-cliente", json={"nome": "Casa da Música"},
+                           headers={"Idempotency-Key": "fornecedor-1"})
+    resposta_repetida = client.post("/fornecedor-cliente", json={"nome": "Casa da Música"},
+                                    headers={"Idempotency-Key": "fornecedor-1"})
+
+    assert resposta_repetida.status_code == 201
+    assert resposta_repetida.json() == resposta.json() == {"id": 1, "nome": "Casa da Música"}
+    assert len(client.get("/fornecedor-cliente").json()) == 1
+
+
+def test_deve_listar_fornecedores_cliente_duplicados_pelo_nome_normalizado():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_fornecedores_duplicados()
+
+    resposta = client.get("/fornecedor-cliente/duplicados")
+
+    assert resposta.status_code == 200
+    assert resposta.json() == [
+        {"nome_normalizado": "casa da musica", "fornecedores": [
+            {"id": 2, "nome": "CASA DA MUSICA", "quantidade_contas": 2},
+            {"id": 1, "nome": "Casa da Música", "quantidade_contas": 1},
+            {"id": 4, "nome": "Casa da  Música.", "quantidade_contas": 0},
+        ]},
+        {"nome_normalizado": "cpfl", "fornecedores": [
+            {"id": 3, "nome": "CPFL", "quantidade_contas": 0},
+            {"id": 5, "nome": "cpfl", "quantidade_contas": 0},
+        ]},
+    ]
+    assert [grupo["nome_normalizado"] for grupo in
+            client.get("/fornecedor-cliente/duplicados?pagina=2&tamanho_pagina=1").json()] == ["cpfl"]
+
+
+def test_deve_mesclar_fornecedores_cliente_em_lotes(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_fornecedores_duplicados()
+    monkeypatch.setattr(fornecedor_cliente_router, "MESCLAGEM_TAMANHO_DO_LOTE", 2)
+
+    resposta = client.post("/fornecedor-cliente/2/mesclar", json={"ids_duplicados": [1, 4, 1]})
+
+    assert resposta.status_code == 200
+    assert resposta.json() == {"fornecedor_cliente": {"id": 2, "nome": "CASA DA MUSICA"}, "excluidos": [1, 4],
+                               "contas_transferidas": 1, "lotes": 1}
+    assert [conta["id"] for conta in client.get("/fornecedor-cliente/2/contas-a-pagar-e-receber").json()] == [1, 2, 3]
+    assert client.get("/contas-a-pagar-e-receber/1").headers["ETag"] == '"2"'
+    assert client.get("/fornecedor-cliente/1").status_code == 404
+    assert [grupo["nome_normalizado"] for grupo in client.get("/fornecedor-cliente/duplicados").json()] == ["cpfl"]
+
+    exclusoes = [(alteracao["entidade"], alteracao["id"])
+                 for alteracao in client.get("/sync").json()["alteracoes"] if alteracao["operacao"] == "exclusao"]
+    assert exclusoes == [("fornecedor_cliente", 1), ("fornecedor_cliente", 4)]
+
+    resposta = client.post("/fornecedor-cliente/3/mesclar", json={"ids_duplicados": [2]})
+
+    assert resposta.json()["contas_transferidas"] == 3
+    assert resposta.json()["lotes"] == 2
+
+
+def test_deve_recusar_mesclagem_com_fornecedor_cliente_invalido():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_fornecedores_duplicados()
+
+    assert client.post("/fornecedor-cliente/2/mesclar", json={"ids_duplicados": [2]}).status_code == 422
+    assert client.post("/fornecedor-cliente/2/mesclar", json={"ids_duplicados": []}).status_code == 422
+    assert client.post("/fornecedor-cliente/99/mesclar", json={"ids_duplicados": [1]}).status_code == 404
+
+    resposta = client.post("/fornecedor-cliente/2/mesclar", json={"ids_duplicados": [1, 98, 99]})
+
+    assert resposta.status_code == 404
+    assert resposta.json() == {"message": "Oops! Fornecedor Cliente 98, 99 não encontrado(a)."}
+    assert client.get("/fornecedor-cliente/1").status_code == 200
+
+
+def test_deve_desfazer_a_mesclagem_inteira_quando_um_lote_falha(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_fornecedores_duplicados()
+    transfere_contas_em_lotes = fornecedor_cliente_router.transfere_contas_em_lotes
+
+    def transfere_e_falha(db, origens, destino):
+        transfere_contas_em_lotes(db, origens, destino)
+        raise RuntimeError("Falha depois da transferência")
+
+    monkeypatch.setattr(fornecedor_cliente_router, "transfere_contas_em_lotes", transfere_e_falha)
+
+    with pytest.raises(RuntimeError):
+        client.post("/fornecedor-cliente/1/mesclar", json={"ids_duplicados": [2]})
+
+    assert [conta["id"] for conta in client.get("/fornecedor-cliente/2/contas-a-pagar-e-receber").json()] == [2, 3]
+    assert client.get("/fornecedor-cliente/2").status_code == 200
+
+
+def cria_fornecedores_duplicados():
+    for nome in ["Casa da Música", "CASA DA MUSICA", "CPFL", "Casa da  Música.", "cpfl", "Sanasa"]:
+        client.post("/fornecedor-cliente", json={"nome": nome})
+
+    for fornecedor_cliente_id in [1, 2, 2]:
+        client.post("/contas-a-pagar-e-receber", json={
+            "descricao": "Conta", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-11-29",
+            "fornecedor_cliente_id": fornecedor_cliente_id
+        })
+
+
+def cria_contas_para_resumo():
+    client.post("/fornecedor-cliente", json={"nome": "Casa da Música"})
+    client.post("/fornecedor-cliente", json={"nome": "Sanasa"})
+    client.post("/fornecedor-cliente", json={"nome": "CPFL"})
+
+    for fornecedor_cliente_id, valor, tipo in [(1, 100, "PAGAR"), (1, 50, "PAGAR"), (1, 30, "RECEBER"),
+                                               (2, 500, "PAGAR"), (None, 999, "PAGAR")]:
+        client.post("/contas-a-pagar-e-receber", json={
+            "descricao": "Conta", "valor": valor, "tipo": tipo, "data_previsao": "2022-11-29",
+            "fornecedor_cliente_id": fornecedor_cliente_id
+        })
+
+    client.post("/contas-a-pagar-e-receber/2/baixar")
+    client.post("/contas-a-pagar-e-receber/1/pagamentos", json={"valor": 40})
+
+
+def test_deve_resumir_as_contas_por_fornecedor_cliente():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_contas_para_resumo()
+
+    resposta = client.get("/fornecedor-cliente/resumo")
+
+    assert resposta.status_code == 200
+    assert resposta.json() == [
+        {"id": 2, "nome": "Sanasa", "valor_total": "500.00",
+         "pagar": {"quantidade_em_aberto": 1, "valor_em_aberto": "500.00",
+                   "quantidade_baixadas": 0, "valor_baixado": "0.00"},
+         "receber": {"quantidade_em_aberto": 0, "valor_em_aberto": "0.00",
+                     "quantidade_baixadas": 0, "valor_baixado": "0.00"}},
+        {"id": 1, "nome": "Casa da Música", "valor_total": "180.00",
+         "pagar": {"quantidade_em_aberto": 1, "valor_em_aberto": "60.00",
+                   "quantidade_baixadas": 1, "valor_baixado": "90.00"},
+         "receber": {"quantidade_em_aberto": 1, "valor_em_aberto": "30.00",
+                     "quantidade_baixadas": 0, "valor_baixado": "0.00"}},
+        {"id": 3, "nome": "CPFL", "valor_total": "0.00",
+         "pagar": {"quantidade_em_aberto": 0, "valor_em_aberto": "0.00",
+                   "quantidade_baixadas": 0, "valor_baixado": "0.00"},
+         "receber": {"quantidade_em_aberto": 0, "valor_em_aberto": "0.00",
+                     "quantidade_baixadas": 0, "valor_baixado": "0.00"}},
+    ]
+
+
+def test_deve_ordenar_e_paginar_o_resumo_de_fornecedor_cliente():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_contas_para_resumo()
+
+    por_receber = client.get("/fornecedor-cliente/resumo?ordenar_por=valor_em_aberto_receber")
+    por_nome = client.get("/fornecedor-cliente/resumo?ordenar_por=nome&ordem=asc&pagina=2&tamanho_pagina=2")
+
+    assert [f["id"] for f in por_receber.json()] == [1, 2, 3]
+    assert [f["nome"] for f in por_nome.json()] == ["Sanasa"]
+    assert client.get("/fornecedor-cliente/resumo?tamanho_pagina=0").status_code == 422
+
+
+def test_resumo_por_nome_deve_agregar_somente_as_contas_da_pagina():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cria_contas_para_resumo()
+    todos = {f["id"]: f for f in client.get("/fornecedor-cliente/resumo").json()}
+
+    consultas = []
+
+    def registra(conexao, cursor, consulta, *args):
+        consultas.append(consulta)
+
+    event.listen(Engine, "before_cursor_execute", registra)
+    try:
+        por_nome = client.get("/fornecedor-cliente/resumo?ordenar_por=nome&ordem=desc&tamanho_pagina=2").json()
+    finally:
+        event.remove(Engine, "before_cursor_execute", registra)
+
+    assert [f["nome"] for f in por_nome] == ["Sanasa", "Casa da Música"]
+    assert por_nome == [todos[f["id"]] for f in por_nome]
+    assert "contas_a_pagar_e_receber.fornecedor_cliente_id IN (SELECT" in "".join(consultas)
+
+
+def test_deve_buscar_fornecedores_cliente_por_ids_na_ordem_pedida():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={'nome': 'CPFL'})
+    client.post("/fornecedor-cliente", json={'nome': 'Sanasa'})
+
+    resposta = client.post("/fornecedor-cliente/buscar", json={"ids": [2, 5, 1]})
+
+    assert resposta.status_code == 200
+    assert resposta.json() == {"itens": [{"id": 2, "nome": "Sanasa"}, {"id": 1, "nome": "CPFL"}],
+                               "nao_encontrados": [5]}
@@ -0,0 +1,239 @@
+import datetime
+import hashlib
+import json
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from contas_a_pagar_e_receber.models.relatorio_model import Relatorio
+from contas_a_pagar_e_receber.routers import relatorios_router
+from main import app
+from shared.database import Base
+from shared.dependencies import get_db
+
+client = TestClient(app)
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+def aguarda_relatorio(id_do_relatorio):
+    for _ in range(100):
+        resposta = client.get(f"/relatorios/{id_do_relatorio}")
+        if resposta.json()['status'] in ('CONCLUIDO', 'ERRO'):
+            return resposta
+        time.sleep(0.05)
+
+    raise AssertionError("O relatório não terminou a tempo")
+
+
+def test_deve_gerar_relatorio_de_gastos_por_fornecedor_em_segundo_plano():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={'nome': 'Casa da Música'})
+    client.post("/contas-a-pagar-e-receber", json={'descricao': 'Guitarra', 'valor': 100, 'tipo': 'PAGAR',
+                                                   'fornecedor_cliente_id': 1, 'data_previsao': '2022-01-10'})
+    client.post("/contas-a-pagar-e-receber", json={'descricao': 'Baixo', 'valor': 50, 'tipo': 'PAGAR',
+                                                   'fornecedor_cliente_id': 1, 'data_previsao': '2023-03-10'})
+    client.post("/contas-a-pagar-e-receber", json={'descricao': 'Salário', 'valor': 1000, 'tipo': 'RECEBER',
+                                                   'data_previsao': '2023-03-10'})
+
+    resposta = client.post("/relatorios", json={'tipo': 'GASTOS_POR_FORNECEDOR', 'ano_inicio': 2022,
+                                                'ano_fim': 2023})
+
+    assert resposta.status_code == 202
+    assert resposta.json()['parametros'] == {'ano_inicio': 2022, 'ano_fim': 2023}
+
+    relatorio = aguarda_relatorio(resposta.json()['id']).json()
+    assert relatorio['status'] == 'CONCLUIDO'
+    assert relatorio['concluido_em'] is not None
+    assert relatorio['resultado'] == [
+        {'fornecedor_cliente_id': None, 'nome': None, 'tipo': 'RECEBER', 'quantidade': 1, 'valor_total': '1000.00'},
+        {'fornecedor_cliente_id': 1, 'nome': 'Casa da Música', 'tipo': 'PAGAR', 'quantidade': 2,
+         'valor_total': '150.00'},
+    ]
+
+
+def test_deve_gerar_previsao_de_gastos_de_varios_anos():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber", json={'descricao': 'Aluguel', 'valor': 100, 'tipo': 'PAGAR',
+                                                   'data_previsao': '2021-02-01'})
+    client.post("/contas-a-pagar-e-receber", json={'descricao': 'Aluguel', 'valor': 200, 'tipo': 'PAGAR',
+                                                   'data_previsao': '2022-05-01'})
+
+    resposta = client.post("/relatorios", json={'tipo': 'PREVISAO_GASTOS_POR_MES', 'ano_inicio': 2021,
+                                                'ano_fim': 2022})
+
+    relatorio = aguarda_relatorio(resposta.json()['id']).json()
+    assert relatorio['resultado'] == [
+        {'ano': 2021, 'meses': [{'mes': 2, 'valor_total': '100.00'}]},
+        {'ano': 2022, 'meses': [{'mes': 5, 'valor_total': '200.00'}]},
+    ]
+
+
+def test_deve_reaproveitar_relatorio_identico_ainda_pendente():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    parametros = json.dumps({'ano_inicio': 2022, 'ano_fim': 2022}, sort_keys=True)
+    db = TestingSessionLocal()
+    db.add(Relatorio(tipo='EXPORTACAO_CONTAS', parametros=parametros, status='PENDENTE',
+                     chave=hashlib.sha256(f"EXPORTACAO_CONTAS:{parametros}".encode()).hexdigest(),
+                     criado_em=datetime.datetime.utcnow()))
+    db.commit()
+    db.close()
+
+    resposta = client.post("/relatorios", json={'tipo': 'EXPORTACAO_CONTAS', 'ano_inicio': 2022})
+
+    assert resposta.status_code == 202
+    assert resposta.json()['id'] == 1
+    assert resposta.json()['status'] == 'PENDENTE'
+
+
+def test_solicitacoes_identicas_simultaneas_devem_gerar_um_unico_relatorio(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    parametros = json.dumps({'ano_inicio': 2022, 'ano_fim': 2022}, sort_keys=True)
+    db = TestingSessionLocal()
+    db.add(Relatorio(tipo='EXPORTACAO_CONTAS', parametros=parametros, status='PROCESSANDO',
+                     chave=hashlib.sha256(f"EXPORTACAO_CONTAS:{parametros}".encode()).hexdigest(),
+                     criado_em=datetime.datetime.utcnow()))
+    db.commit()
+    db.close()
+
+    # A primeira busca não vê o relatório, como se as duas solicitações tivessem buscado ao mesmo tempo
+    busca_relatorio_em_andamento = relatorios_router.busca_relatorio_em_andamento
+    buscas = []
+
+    def busca_atrasada(db, chave):
+        buscas.append(chave)
+        return busca_relatorio_em_andamento(db, chave) if len(buscas) > 1 else None
+
+    monkeypatch.setattr(relatorios_router, "busca_relatorio_em_andamento", busca_atrasada)
+
+    resposta = client.post("/relatorios", json={'tipo': 'EXPORTACAO_CONTAS', 'ano_inicio': 2022})
+
+    assert resposta.status_code == 202
+    assert resposta.json()['id'] == 1
+    assert len(buscas) == 2
+    db = TestingSessionLocal()
+    assert db.query(Relatorio).count() == 1
+    db.close()
+
+
+def test_deve_retomar_somente_relatorios_pendentes_ou_abandonados(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    agora = datetime.datetime.utcnow()
+    db = TestingSessionLocal()
+    for indice, (status, iniciado_em) in enumerate([
+        ('PENDENTE', None),
+        ('PROCESSANDO', agora),
+        ('PROCESSANDO', agora - datetime.timedelta(days=1)),
+        ('CONCLUIDO', agora),
+    ]):
+        db.add(Relatorio(tipo='EXPORTACAO_CONTAS', parametros='{}', status=status, chave=str(indice),
+                         criado_em=agora, iniciado_em=iniciado_em))
+    db.commit()
+    db.close()
+
+    agendados = []
+    monkeypatch.setattr(relatorios_router, "agenda_relatorio", lambda id_, fabrica: agendados.append(id_))
+
+    relatorios_router.retoma_relatorios_pendentes(TestingSessionLocal)
+
+    assert agendados == [1, 3]
+
+
+def test_deve_retomar_os_relatorios_de_cada_tenant(monkeypatch, tmp_path):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    engine_do_tenant = create_engine(f"sqlite:///{tmp_path}/tenant.db")
+    Base.metadata.create_all(bind=engine_do_tenant)
+    SessionDoTenant = sessionmaker(autocommit=False, autoflush=False, bind=engine_do_tenant)
+
+    for fabrica in (TestingSessionLocal, SessionDoTenant):
+        db = fabrica()
+        db.add(Relatorio(tipo='EXPORTACAO_CONTAS', parametros='{}', status='PENDENTE', chave='chave',
+                         criado_em=datetime.datetime.utcnow()))
+        db.commit()
+        db.close()
+
+    agendados = []
+    monkeypatch.setattr(relatorios_router, "fabricas_de_sessoes_ativas",
+                        lambda padrao: [TestingSessionLocal, SessionDoTenant])
+    monkeypatch.setattr(relatorios_router, "agenda_relatorio", lambda id_, fabrica: agendados.append((id_, fabrica)))
+
+    relatorios_router.retoma_relatorios_dos_tenants()
+
+    assert agendados == [(1, TestingSessionLocal), (1, SessionDoTenant)]
+
+
+def test_relatorio_deve_ser_reivindicado_por_um_unico_worker():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    db.add(Relatorio(tipo='EXPORTACAO_CONTAS', parametros='{}', status='PENDENTE', chave='chave',
+                     criado_em=datetime.datetime.utcnow()))
+    db.commit()
+
+    assert relatorios_router.reivindica_relatorio(db, 1) is True
+    assert relatorios_router.reivindica_relatorio(db, 1) is False
+    relatorio = db.query(Relatorio).get(1)
+    assert relatorio.status == 'PROCESSANDO'
+    assert relatorio.iniciado_em is not None
+    db.close()
+
+
+def test_deve_retornar_erro_para_periodo_invalido():
+    resposta = client.post("/relatorios", json={'tipo': 'EXPORTACAO_CONTAS', 'ano_inicio': 2022,
+                                                'ano_fim': 2020})
+
+    assert resposta.status_code == 422
+
+
+def test_deve_retornar_nao_encontrado_para_relatorio_inexistente():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    assert client.get("/relatorios/100").status_code == 404
+
+
+def test_deve_exportar_contas_do_periodo():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/contas-a-pagar-e-receber", json={'descricao': 'Aluguel', 'valor': 100, 'tipo': 'PAGAR',
+                                                   'data_previsao': '2021-02-01'})
+    client.post("/contas-a-pagar-e-receber", json={'descricao': 'Aluguel', 'valor': 200, 'tipo': 'PAGAR',
+                                                   'data_previsao': '2024-05-01'})
+
+    resposta = client.post("/relatorios", json={'tipo': 'EXPORTACAO_CONTAS', 'ano_inicio': 2020, 'ano_fim': 2022})
+
+    relatorio = aguarda_relatorio(resposta.json()['id']).json()
+    assert relatorio['status'] == 'CONCLUIDO'
+    assert [conta['data_previsao'] for conta in relatorio['resultado']] == ['2021-02-01']
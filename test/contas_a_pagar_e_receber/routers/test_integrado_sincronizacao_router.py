@@ -0,0 +1,172 @@
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.exclusao_model import Exclusao
+from contas_a_pagar_e_receber.routers import sincronizacao_router
+from contas_a_pagar_e_receber.routers.sincronizacao_router import codifica_cursor, limpa_exclusoes_antigas
+from main import app
+from shared.database import Base
+from shared.dependencies import get_db
+
+client = TestClient(app)
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+def cria_conta(descricao, fornecedor_cliente_id=None):
+    return client.post("/contas-a-pagar-e-receber", json={
+        "descricao": descricao, "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-01-10",
+        "fornecedor_cliente_id": fornecedor_cliente_id
+    }).json()
+
+
+def sincroniza_tudo(since=None, tamanho_pagina=500):
+    alteracoes, paginas = [], 0
+    while True:
+        params = {"tamanho_pagina": tamanho_pagina, **({"since": since} if since else {})}
+        resposta = client.get("/sync", params=params).json()
+        alteracoes += resposta["alteracoes"]
+        since = resposta["cursor"]
+        paginas += 1
+        if not resposta["tem_mais"]:
+            return alteracoes, since, paginas
+
+
+def resume(alteracoes):
+    return [(alteracao["entidade"], alteracao["operacao"], alteracao["id"]) for alteracao in alteracoes]
+
+
+def test_deve_sincronizar_contas_fornecedores_e_exclusoes_em_paginas():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    client.post("/fornecedor-cliente", json={"nome": "Imobiliária"})
+    client.post("/fornecedor-cliente", json={"nome": "Padaria"})
+    cria_conta("Aluguel", 1)
+    cria_conta("Pão")
+    client.delete("/contas-a-pagar-e-receber/2")
+
+    alteracoes, _, paginas = sincroniza_tudo(tamanho_pagina=2)
+
+    assert paginas == 2
+    assert resume(alteracoes) == [
+        ("fornecedor_cliente", "alteracao", 1),
+        ("fornecedor_cliente", "alteracao", 2),
+        ("conta_a_pagar_e_receber", "alteracao", 1),
+        ("conta_a_pagar_e_receber", "exclusao", 2),
+    ]
+    assert alteracoes[0]["fornecedor_cliente"]["nome"] == "Imobiliária"
+    assert alteracoes[2]["conta"]["fornecedor_cliente_id"] == 1
+    assert alteracoes[2]["conta"]["versao"] == 1
+    assert alteracoes[3]["conta"] is None
+
+
+def test_deve_devolver_so_o_que_mudou_depois_do_cursor(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(sincronizacao_router, "SYNC_MARGEM_SEGUNDOS", 0)
+
+    client.post("/fornecedor-cliente", json={"nome": "Imobiliária"})
+    client.post("/fornecedor-cliente", json={"nome": "Padaria"})
+    for descricao in ("Aluguel", "Condomínio", "Internet"):
+        cria_conta(descricao)
+    _, cursor, _ = sincroniza_tudo()
+
+    client.post("/contas-a-pagar-e-receber/2/pagamentos", json={"valor": 10})
+    client.delete("/fornecedor-cliente/2")
+    client.post("/contas-a-pagar-e-receber/excluir", json={"ids": [3], "quantidade_esperada": 1})
+    alteracoes, cursor, _ = sincroniza_tudo(cursor)
+    sem_alteracoes, _, _ = sincroniza_tudo(cursor)
+
+    assert resume(alteracoes) == [
+        ("conta_a_pagar_e_receber", "alteracao", 2),
+        ("fornecedor_cliente", "exclusao", 2),
+        ("conta_a_pagar_e_receber", "exclusao", 3),
+    ]
+    assert alteracoes[0]["conta"]["valor_baixa"] == "10.00"
+    assert sem_alteracoes == []
+
+
+def test_cursor_final_nao_deve_passar_da_margem_de_seguranca():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    cria_conta("Aluguel")
+    _, cursor, _ = sincroniza_tudo()
+    repetidas, _, _ = sincroniza_tudo(cursor)
+
+    # A conta acabou de mudar: continua sendo entregue até sair da margem
+    assert resume(repetidas) == [("conta_a_pagar_e_receber", "alteracao", 1)]
+
+
+def test_deve_entregar_alteracao_confirmada_depois_com_horario_anterior_ao_cursor():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    for descricao in ("Aluguel", "Condomínio", "Internet"):
+        cria_conta(descricao)
+    primeira_pagina = client.get("/sync", params={"tamanho_pagina": 2}).json()
+
+    # Uma transação longa grava a conta antes da página ser lida e só confirma depois
+    db = TestingSessionLocal()
+    db.add(ContaPagarReceber(descricao="Atrasada", valor=100, tipo="PAGAR", data_previsao=datetime.date(2022, 1, 10),
+                             atualizado_em=db.query(ContaPagarReceber).get(1).atualizado_em))
+    db.commit()
+    db.close()
+
+    restante, cursor, _ = sincroniza_tudo(primeira_pagina["cursor"], tamanho_pagina=2)
+    seguinte, _, _ = sincroniza_tudo(cursor)
+
+    assert resume(restante) == [("conta_a_pagar_e_receber", "alteracao", 3)]
+    assert ("conta_a_pagar_e_receber", "alteracao", 4) in resume(seguinte)
+
+def test_deve_rejeitar_cursor_invalido_ou_mais_antigo_que_as_exclusoes():
+    antigo = codifica_cursor((datetime.datetime.utcnow() - datetime.timedelta(days=365), 0, 0))
+
+    invalido = client.get("/sync", params={"since": "nao-e-um-cursor"})
+    expirado = client.get("/sync", params={"since": antigo})
+
+    assert invalido.status_code == 422
+    assert invalido.json()["detail"] == "Cursor inválido"
+    assert expirado.status_code == 410
+
+
+def test_deve_limpar_exclusoes_mais_antigas_que_a_retencao():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSessionLocal()
+    db.add_all([
+        Exclusao(entidade="conta_a_pagar_e_receber", entidade_id=1,
+                 excluido_em=datetime.datetime.utcnow() - datetime.timedelta(days=365)),
+        Exclusao(entidade="conta_a_pagar_e_receber", entidade_id=2),
+    ])
+    db.commit()
+
+    removidas = limpa_exclusoes_antigas(db)
+    restantes = [exclusao.entidade_id for exclusao in db.query(Exclusao)]
+    db.close()
+
+    assert removidas == 1
+    assert restantes == [2]
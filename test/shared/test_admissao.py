@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from shared.admissao import ControleDeAdmissao
+
+
+def cria_app_lento():
+    app = FastAPI()
+
+    @app.get("/lento")
+    async def lento():
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    return app
+
+
+async def dispara_requisicoes(controle, quantidade):
+    transporte = httpx.ASGITransport(app=controle)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+        return await asyncio.gather(*[cliente.get("/lento") for _ in range(quantidade)])
+
+
+def test_deve_enfileirar_requisicoes_acima_do_limite_de_concorrencia():
+    controle = ControleDeAdmissao(cria_app_lento(), limite_concorrencia=1, tamanho_maximo_fila=5,
+                                  tempo_maximo_espera=5)
+
+    respostas = asyncio.run(dispara_requisicoes(controle, 3))
+
+    assert [r.status_code for r in respostas] == [200, 200, 200]
+    metricas = controle.metricas()
+    assert metricas["total_admitidas"] == 3
+    assert metricas["em_execucao"] == 0
+    assert metricas["tamanho_fila"] == 0
+    assert metricas["espera_maxima_segundos"] >= 0.2
+
+
+def test_deve_rejeitar_quando_a_fila_estiver_cheia():
+    controle = ControleDeAdmissao(cria_app_lento(), limite_concorrencia=1, tamanho_maximo_fila=1,
+                                  tempo_maximo_espera=5)
+
+    respostas = asyncio.run(dispara_requisicoes(controle, 3))
+
+    status = sorted(r.status_code for r in respostas)
+    assert status == [200, 200, 503]
+    rejeitada = next(r for r in respostas if r.status_code == 503)
+    assert rejeitada.headers["Retry-After"] == "5"
+    assert controle.metricas()["total_rejeitadas"] == 1
+
+
+def test_deve_rejeitar_quando_a_espera_exceder_o_tempo_maximo():
+    controle = ControleDeAdmissao(cria_app_lento(), limite_concorrencia=1, tamanho_maximo_fila=5,
+                                  tempo_maximo_espera=0.05)
+
+    respostas = asyncio.run(dispara_requisicoes(controle, 2))
+
+    assert sorted(r.status_code for r in respostas) == [200, 503]
+    assert controle.metricas()["em_execucao"] == 0
+
+
+def test_deve_descartar_novas_requisicoes_quando_o_atraso_da_fila_passar_do_alvo():
+    controle = ControleDeAdmissao(cria_app_lento(), limite_concorrencia=1, tamanho_maximo_fila=10,
+                                  tempo_maximo_espera=5, atraso_alvo=0.05)
+
+    async def dispara_em_sequencia():
+        transporte = httpx.ASGITransport(app=controle)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as cliente:
+            primeiras = [asyncio.create_task(cliente.get("/lento")) for _ in range(2)]
+            await asyncio.sleep(0.1)
+            atrasada = await cliente.get("/lento")
+            return await asyncio.gather(*primeiras), atrasada
+
+    primeiras, atrasada = asyncio.run(dispara_em_sequencia())
+
+    assert [r.status_code for r in primeiras] == [200, 200]
+    assert atrasada.status_code == 503
+    assert controle.metricas()["total_descartadas"] == 1
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from contas_a_pagar_e_receber.routers import contas_a_pagar_e_receber_router
+from main import app
+from shared import tenants
+from shared.coalescencia import CoalescedorDeRequisicoes, coalescedor_de_requisicoes
+from shared.database import Base
+from shared.dependencies import get_db
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def funcao_lenta(chamadas, resultado="ok", duracao=0.1, erro=None):
+    def funcao():
+        chamadas.append(threading.get_ident())
+        time.sleep(duracao)
+        if erro is not None:
+            raise erro
+        return resultado
+
+    return funcao
+
+
+async def em_paralelo(*corrotinas):
+    return await asyncio.gather(*corrotinas, return_exceptions=True)
+
+
+def test_requisicoes_iguais_e_simultaneas_devem_compartilhar_uma_execucao():
+    coalescedor, chamadas = CoalescedorDeRequisicoes(), []
+    funcao = funcao_lenta(chamadas, resultado=[1, 2, 3])
+
+    resultados = asyncio.run(em_paralelo(*(coalescedor.executa("rota", {"ano": 2024}, funcao) for _ in range(10))))
+
+    assert len(chamadas) == 1
+    assert resultados == [[1, 2, 3]] * 10
+    assert coalescedor.metricas() == {"em_andamento": 0, "total_execucoes": 1, "total_coalescidas": 9,
+                                      "total_erros": 0, "total_tempo_esgotado": 0,
+                                      "coalescidas_por_rota": {"rota": 9}}
+
+
+def test_parametros_ou_tenants_diferentes_nao_devem_ser_coalescidos():
+    coalescedor, chamadas = CoalescedorDeRequisicoes(), []
+    funcao = funcao_lenta(chamadas)
+
+    async def no_tenant(tenant, ano):
+        token = tenants.tenant_atual.set(tenant)
+        try:
+            return await coalescedor.executa("rota", {"ano": ano}, funcao)
+        finally:
+            tenants.tenant_atual.reset(token)
+
+    asyncio.run(em_paralelo(no_tenant(None, 2024), no_tenant(None, 2025), no_tenant("acme", 2024),
+                            no_tenant("acme", 2024)))
+
+    assert len(chamadas) == 3
+    assert coalescedor.metricas()["total_coalescidas"] == 1
+
+
+def test_erro_da_execucao_deve_chegar_a_todas_as_requisicoes_e_a_seguinte_deve_executar_de_novo():
+    coalescedor, chamadas = CoalescedorDeRequisicoes(), []
+    com_erro = funcao_lenta(chamadas, erro=ValueError("banco fora do ar"))
+
+    resultados = asyncio.run(em_paralelo(*(coalescedor.executa("rota", {}, com_erro) for _ in range(3))))
+    seguinte = asyncio.run(coalescedor.executa("rota", {}, funcao_lenta(chamadas, duracao=0)))
+
+    assert [str(resultado) for resultado in resultados] == ["banco fora do ar"] * 3
+    assert seguinte == "ok"
+    assert len(chamadas) == 2
+    assert coalescedor.metricas()["total_erros"] == 1
+
+
+def test_deve_responder_504_quando_a_espera_passa_do_tempo_maximo_sem_interromper_a_execucao():
+    coalescedor, chamadas = CoalescedorDeRequisicoes(tempo_maximo=0.05), []
+    funcao = funcao_lenta(chamadas, duracao=0.2)
+
+    async def cenario():
+        esgotadas = await em_paralelo(*(coalescedor.executa("rota", {}, funcao) for _ in range(2)))
+        coalescedor.tempo_maximo = 1
+        # A execução continua e atende quem chega depois com a mesma chave
+        return esgotadas, await coalescedor.executa("rota", {}, funcao)
+
+    esgotadas, resultado = asyncio.run(cenario())
+
+    assert [erro.status_code for erro in esgotadas if isinstance(erro, HTTPException)] == [504, 504]
+    assert resultado == "ok"
+    assert len(chamadas) == 1
+    assert coalescedor.metricas()["total_tempo_esgotado"] == 2
+
+
+def test_previsao_de_gastos_deve_calcular_uma_vez_para_requisicoes_simultaneas(monkeypatch):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+
+    calcula = contas_a_pagar_e_receber_router.relatorio_gastos_previstos_por_mes_de_um_ano
+    chamadas = []
+
+    def calcula_devagar(db, ano):
+        chamadas.append(ano)
+        time.sleep(0.2)
+        return calcula(db, ano)
+
+    monkeypatch.setattr(contas_a_pagar_e_receber_router, "relatorio_gastos_previstos_por_mes_de_um_ano",
+                        calcula_devagar)
+    db = TestingSessionLocal()
+    db.add(contas_a_pagar_e_receber_router.ContaPagarReceber(
+        descricao="Aluguel", valor=100, tipo="PAGAR", data_previsao=contas_a_pagar_e_receber_router.date(2022, 3, 5)
+    ))
+    db.commit()
+    db.close()
+    coalescidas_antes = coalescedor_de_requisicoes.metricas()["total_coalescidas"]
+
+    async def cenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as cliente:
+            return await asyncio.gather(*(
+                cliente.get("/contas-a-pagar-e-receber/previsao-gastos-por-mes", params={"ano": ano})
+                for ano in [2022] * 6 + [2023]
+            ))
+
+    respostas = asyncio.run(cenario())
+
+    assert sorted(chamadas) == [2022, 2023]
+    assert [resposta.json() for resposta in respostas[:6]] == [[{"mes": 3, "valor_total": "100.00"}]] * 6
+    assert respostas[6].json() == []
+    assert coalescedor_de_requisicoes.metricas()["total_coalescidas"] - coalescidas_antes == 5
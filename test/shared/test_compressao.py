@@ -0,0 +1,98 @@
+import gzip
+import json
+
+import brotli
+import zstandard
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from shared.compressao import CompressaoMiddleware, algoritmos_disponiveis, escolhe_codificacao
+
+CONTAS = [{"id": i, "descricao": "Aluguel", "valor": "1000.50", "tipo": "PAGAR"} for i in range(200)]
+
+
+def cria_cliente():
+    app = FastAPI()
+
+    @app.get("/contas")
+    def listar():
+        return CONTAS
+
+    @app.get("/pequeno")
+    def pequeno():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        def gera():
+            for conta in CONTAS:
+                yield json.dumps(conta) + "\n"
+
+        return StreamingResponse(gera(), media_type="application/x-ndjson")
+
+    @app.get("/texto-stream")
+    def texto_stream():
+        return StreamingResponse(iter([json.dumps(conta) + "\n" for conta in CONTAS]), media_type="text/plain")
+
+    return TestClient(CompressaoMiddleware(app, tamanho_minimo=500))
+
+
+def test_deve_escolher_a_codificacao_pelo_peso_e_pela_preferencia_do_servidor():
+    disponiveis = ["zstd", "br", "gzip"]
+
+    assert escolhe_codificacao("gzip, br", disponiveis) == "br"
+    assert escolhe_codificacao("gzip;q=1.0, br;q=0.5", disponiveis) == "gzip"
+    assert escolhe_codificacao("*", disponiveis) == "zstd"
+    assert escolhe_codificacao("identity", disponiveis) is None
+    assert escolhe_codificacao("gzip;q=0", disponiveis) is None
+
+
+def test_deve_comprimir_respostas_grandes_com_o_algoritmo_negociado():
+    cliente = cria_cliente()
+    descompressores = {"gzip": gzip.decompress, "br": brotli.decompress,
+                       "zstd": lambda dados: zstandard.ZstdDecompressor().decompressobj().decompress(dados)}
+
+    for codificacao, descomprime in descompressores.items():
+        resposta = cliente.get("/contas", headers={"Accept-Encoding": codificacao})
+
+        assert resposta.headers["Content-Encoding"] == codificacao
+        assert resposta.headers["Vary"] == "Accept-Encoding"
+        if codificacao == "zstd":
+            assert json.loads(descomprime(resposta.content)) == CONTAS
+        else:
+            assert resposta.json() == CONTAS
+
+
+def test_nao_deve_comprimir_respostas_abaixo_do_tamanho_minimo():
+    resposta = cria_cliente().get("/pequeno", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in resposta.headers
+    assert resposta.json() == {"ok": True}
+
+
+def test_deve_comprimir_respostas_em_streaming_pedaco_a_pedaco():
+    cliente = cria_cliente()
+    esperado = "".join(json.dumps(conta) + "\n" for conta in CONTAS)
+
+    resposta = cliente.get("/texto-stream", headers={"Accept-Encoding": "gzip"})
+
+    assert resposta.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in resposta.headers
+    assert resposta.text == esperado
+
+
+def test_nao_deve_comprimir_tipos_fora_da_lista():
+    resposta = cria_cliente().get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in resposta.headers
+
+
+def test_niveis_de_compressao_devem_ser_configuraveis():
+    corpo = json.dumps(CONTAS).encode()
+
+    rapido = algoritmos_disponiveis(nivel_gzip=1)["gzip"]().comprime(corpo, fim=True)
+    maximo = algoritmos_disponiveis(nivel_gzip=9)["gzip"]().comprime(corpo, fim=True)
+
+    assert gzip.decompress(rapido) == gzip.decompress(maximo) == corpo
+    assert rapido != maximo
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from shared.eventos import CorretorDeEventos, EVENTO_RESSINCRONIZAR, TransportePostgres
+
+POSTGRES_TEST_URL = os.getenv("POSTGRES_TEST_URL")
+
+
+async def coleta(corretor, quantidade, **kwargs):
+    recebidos = []
+    async for evento in corretor.assina(**kwargs):
+        recebidos.append(evento)
+        if len(recebidos) == quantidade:
+            break
+    return recebidos
+
+
+def test_deve_entregar_cada_evento_a_todos_os_assinantes_ociosos():
+    corretor = CorretorDeEventos()
+
+    async def cenario():
+        assinantes = [asyncio.create_task(coleta(corretor, 2)) for _ in range(2000)]
+        await asyncio.sleep(0.05)
+        corretor.publica("conta_criada", [{"id": 1, "versao": 1}, {"id": 2, "versao": 1}])
+        return await asyncio.gather(*assinantes)
+
+    resultados = asyncio.run(cenario())
+
+    assert all([evento.dados["id"] for evento in recebidos] == [1, 2] for recebidos in resultados)
+    assert corretor.metricas() == {"assinantes": 0, "eventos_no_historico": 2, "total_publicados": 2,
+                                   "total_recebidos": 2, "total_falhas_envio": 0, "ultimo_erro_envio": None}
+
+
+class TransporteComFalha:
+    def inicia(self, receptor):
+        pass
+
+    def envia(self, eventos):
+        raise ConnectionError("banco indisponível")
+
+    def encerra(self):
+        pass
+
+
+def test_falha_no_envio_nao_deve_ser_propagada_depois_do_commit():
+    corretor = CorretorDeEventos(TransporteComFalha())
+
+    corretor.publica("conta_criada", [{"id": 1, "versao": 1}])
+
+    metricas = corretor.metricas()
+    assert metricas["total_publicados"] == 0
+    assert metricas["total_falhas_envio"] == 1
+    assert metricas["ultimo_erro_envio"] == "banco indisponível"
+
+
+def test_deve_enviar_heartbeat_e_encerrar_depois_da_duracao_maxima():
+    corretor = CorretorDeEventos()
+
+    async def cenario():
+        return [evento async for evento in corretor.assina(intervalo_heartbeat=0.05, duracao_maxima=0.18)]
+
+    inicio = time.monotonic()
+    recebidos = asyncio.run(cenario())
+
+    assert len(recebidos) >= 2
+    assert all(evento is None for evento in recebidos)
+    assert time.monotonic() - inicio < 1
+
+
+def test_deve_pedir_ressincronizacao_quando_o_historico_descartou_o_ultimo_evento():
+    corretor = CorretorDeEventos(tamanho_historico=2)
+    corretor.publica("conta_criada", [{"id": id_, "versao": 1} for id_ in range(1, 4)])
+    ultimo_id = corretor._historico[-1][1].id
+
+    async def cenario():
+        no_historico = await coleta(corretor, 1, ultimo_id=corretor._historico[0][1].id)
+        fora_do_historico = await coleta(corretor, 1, ultimo_id="antigo")
+        return no_historico, fora_do_historico
+
+    no_historico, fora_do_historico = asyncio.run(cenario())
+
+    assert [evento.id for evento in no_historico] == [ultimo_id]
+    assert [evento.tipo for evento in fora_do_historico] == [EVENTO_RESSINCRONIZAR]
+
+
+@pytest.mark.skipif(POSTGRES_TEST_URL is None, reason="LISTEN/NOTIFY exige Postgres (POSTGRES_TEST_URL)")
+def test_deve_entregar_os_eventos_a_todos_os_workers_pelo_postgres():
+    engine = create_engine(POSTGRES_TEST_URL)
+    workers = [CorretorDeEventos(TransportePostgres(engine, canal="teste_eventos")) for _ in range(2)]
+    for corretor in workers:
+        corretor.inicia()
+
+    async def cenario():
+        assinantes = [asyncio.create_task(coleta(corretor, 2, duracao_maxima=5)) for corretor in workers]
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(workers[0].publica, "conta_criada", [{"id": 1, "versao": 1}])
+        await asyncio.to_thread(workers[1].publica, "conta_excluida", [{"id": 1, "versao": 1}])
+        return await asyncio.gather(*assinantes)
+
+    try:
+        resultados = asyncio.run(cenario())
+    finally:
+        for corretor in workers:
+            corretor.encerra()
+
+    assert [evento.tipo for evento in resultados[0]] == ["conta_criada", "conta_excluida"]
+    assert resultados[0] == resultados[1]
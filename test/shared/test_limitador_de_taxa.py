@@ -0,0 +1,56 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from shared import clientes
+from shared.limitador_de_taxa import LimitadorDeTaxa, LimiteDeRota
+
+
+def cria_cliente(limites):
+    app = FastAPI()
+
+    @app.get("/contas")
+    def listar():
+        return []
+
+    @app.get("/contas/{id}")
+    def obter(id: int):
+        return {"id": id}
+
+    return TestClient(LimitadorDeTaxa(app, limites=limites))
+
+
+def test_deve_rejeitar_requisicoes_acima_da_rajada_com_retry_after():
+    cliente = cria_cliente([LimiteDeRota(r"/contas", "GET", 0.5, 2)])
+
+    respostas = [cliente.get("/contas") for _ in range(3)]
+
+    assert [r.status_code for r in respostas] == [200, 200, 429]
+    assert respostas[2].headers["Retry-After"] == "2"
+
+
+def test_rotas_caras_devem_ter_limite_proprio():
+    cliente = cria_cliente([LimiteDeRota(r"/contas", "GET", 0.1, 1), LimiteDeRota(r".*", None, 100, 100)])
+
+    assert cliente.get("/contas").status_code == 200
+    assert cliente.get("/contas").status_code == 429
+    assert all(cliente.get("/contas/1").status_code == 200 for _ in range(10))
+
+
+def test_cada_api_key_deve_ter_seu_proprio_limite(monkeypatch):
+    monkeypatch.setattr(clientes, "API_KEYS_PERMITIDAS", {"integracao-a", "integracao-b"})
+    cliente = cria_cliente([LimiteDeRota(r".*", None, 0.1, 1)])
+
+    assert cliente.get("/contas", headers={"X-API-Key": "integracao-a"}).status_code == 200
+    assert cliente.get("/contas", headers={"X-API-Key": "integracao-a"}).status_code == 429
+    assert cliente.get("/contas", headers={"X-API-Key": "integracao-b"}).status_code == 200
+
+
+def test_api_key_desconhecida_nao_deve_ganhar_limite_proprio(monkeypatch):
+    monkeypatch.setattr(clientes, "API_KEYS_PERMITIDAS", {"integracao-a"})
+    cliente = cria_cliente([LimiteDeRota(r".*", None, 0.1, 1)])
+
+    # Trocar a chave a cada requisição não escapa do limite do IP
+    assert cliente.get("/contas", headers={"X-API-Key": "inventada-1"}).status_code == 200
+    assert cliente.get("/contas", headers={"X-API-Key": "inventada-2"}).status_code == 429
+    assert cliente.get("/contas").status_code == 429
+    assert cliente.get("/contas", headers={"X-API-Key": "integracao-a"}).status_code == 200
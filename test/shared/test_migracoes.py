@@ -0,0 +1,168 @@
+import importlib.util
+import os
+import threading
+import time
+
+import pytest
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from shared.migracoes import LockNaoObtido, cria_indice_concorrente, executa_com_limite_de_lock, \
+    preenche_em_lotes
+
+POSTGRES_TEST_URL = os.getenv("POSTGRES_TEST_URL")
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+
+
+def carrega_revisao(nome_do_arquivo):
+    caminho = os.path.join(os.path.dirname(__file__), "..", "..", "alembic", "versions", nome_do_arquivo)
+    especificacao = importlib.util.spec_from_file_location(nome_do_arquivo[:-3], caminho)
+    modulo = importlib.util.module_from_spec(especificacao)
+    especificacao.loader.exec_module(modulo)
+    return modulo
+
+
+def cria_tabela_grande(conexao, tabela, linhas):
+    conexao.execute(text(f"DROP TABLE IF EXISTS {tabela}"))
+    conexao.execute(text(f"CREATE TABLE {tabela} (id INTEGER PRIMARY KEY, valor INTEGER, dobro INTEGER)"))
+    conexao.execute(text(
+        f"WITH RECURSIVE sequencia(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM sequencia WHERE x < {linhas}) "
+        f"INSERT INTO {tabela} (id, valor) SELECT x, x FROM sequencia"
+    ))
+
+
+def test_deve_preencher_em_lotes_informando_o_progresso_e_retomar_de_onde_parou():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    progresso = []
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+        cria_tabela_grande(conexao, "migracao_teste", 200000)
+        # Simula uma execução anterior que caiu depois de preencher parte das linhas
+        conexao.execute(text("UPDATE migracao_teste SET dobro = valor * 2 WHERE id <= 50000"))
+
+        atualizadas = preenche_em_lotes(conexao, "migracao_teste", "dobro = valor * 2", "dobro IS NULL",
+                                        tamanho_lote=20000, pausa_segundos=0,
+                                        progresso=lambda *argumentos: progresso.append(argumentos))
+        cria_indice_concorrente(conexao, "ix_migracao_teste_valor", "migracao_teste", ["valor"],
+                                where="dobro > 1000")
+
+        nulas = conexao.execute(text("SELECT count(*) FROM migracao_teste WHERE dobro IS NULL")).scalar()
+        erradas = conexao.execute(text("SELECT count(*) FROM migracao_teste WHERE dobro != valor * 2")).scalar()
+        indices = inspect(conexao).get_indexes("migracao_teste")
+
+    assert atualizadas == 150000
+    assert nulas == erradas == 0
+    assert len(progresso) == 10
+    assert [processadas for _, processadas, _, _ in progresso] == list(range(20000, 200001, 20000))
+    assert progresso[-1] == ("migracao_teste", 200000, 200000, 150000)
+    assert [indice["name"] for indice in indices] == ["ix_migracao_teste_valor"]
+
+
+def test_nao_deve_preencher_dentro_da_transacao_da_migracao():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+    with engine.begin() as conexao:
+        with pytest.raises(RuntimeError):
+            preenche_em_lotes(conexao, "migracao_teste", "dobro = 0")
+
+
+def test_revisao_de_sincronizacao_deve_preencher_atualizado_em_das_linhas_existentes():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    revisao = carrega_revisao("8bc1347f42d0_adiciona_controle_de_sincronizacao.py")
+
+    with engine.begin() as conexao:
+        for tabela in ("exclusoes", "contas_a_pagar_e_receber", "fornecedor_cliente"):
+            conexao.execute(text(f"DROP TABLE IF EXISTS {tabela}"))
+        conexao.execute(text("CREATE TABLE fornecedor_cliente (id INTEGER PRIMARY KEY, nome VARCHAR(255))"))
+        conexao.execute(text("INSERT INTO fornecedor_cliente (id, nome) VALUES (1, 'Imobiliária')"))
+        conexao.execute(text("CREATE TABLE contas_a_pagar_e_receber (id INTEGER PRIMARY KEY, descricao VARCHAR(30))"))
+        conexao.execute(text(
+            "WITH RECURSIVE sequencia(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM sequencia WHERE x < 25000) "
+            "INSERT INTO contas_a_pagar_e_receber (id, descricao) SELECT x, 'Conta ' || x FROM sequencia"
+        ))
+
+    with engine.connect() as conexao:
+        contexto = MigrationContext.configure(conexao)
+        with Operations.context(contexto), contexto.begin_transaction():
+            revisao.upgrade()
+
+    with engine.connect() as conexao:
+        nulas = conexao.execute(text(
+            "SELECT count(*) FROM contas_a_pagar_e_receber WHERE atualizado_em IS NULL"
+        )).scalar()
+        colunas = {coluna["name"]: coluna for coluna in inspect(conexao).get_columns("contas_a_pagar_e_receber")}
+        indices = [indice["name"] for indice in inspect(conexao).get_indexes("contas_a_pagar_e_receber")]
+        fornecedor = conexao.execute(text("SELECT atualizado_em FROM fornecedor_cliente")).scalar()
+
+    assert nulas == 0
+    assert colunas["atualizado_em"]["nullable"] is False
+    assert "ix_contas_a_pagar_e_receber_atualizado_em_id" in indices
+    assert fornecedor is not None
+
+
+@pytest.mark.skipif(POSTGRES_TEST_URL is None, reason="Índices concorrentes e lock_timeout exigem Postgres "
+                                                     "(POSTGRES_TEST_URL)")
+def test_deve_criar_indice_concorrente_valido_em_tabela_particionada():
+    engine = create_engine(POSTGRES_TEST_URL)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+        conexao.execute(text("DROP TABLE IF EXISTS migracao_teste_particionada"))
+        conexao.execute(text("CREATE TABLE migracao_teste_particionada (id INTEGER, ano INTEGER) "
+                             "PARTITION BY RANGE (ano)"))
+        for ano in (2022, 2023):
+            conexao.execute(text(f"CREATE TABLE migracao_teste_particionada_{ano} PARTITION OF "
+                                 f"migracao_teste_particionada FOR VALUES FROM ({ano}) TO ({ano + 1})"))
+
+        cria_indice_concorrente(conexao, "ix_migracao_teste_particionada_id", "migracao_teste_particionada", ["id"])
+        # Rodar de novo, como numa migração retomada, não deve falhar
+        cria_indice_concorrente(conexao, "ix_migracao_teste_particionada_id", "migracao_teste_particionada", ["id"])
+
+        indices = conexao.execute(text(
+            "SELECT pg_class.relname, pg_index.indisvalid FROM pg_index "
+            "JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+            "WHERE pg_class.relname LIKE 'ix_migracao_teste_particionada_id%' ORDER BY pg_class.relname"
+        )).all()
+        conexao.execute(text("DROP TABLE migracao_teste_particionada"))
+
+    assert indices == [("ix_migracao_teste_particionada_id", True),
+                       ("ix_migracao_teste_particionada_id_2022", True),
+                       ("ix_migracao_teste_particionada_id_2023", True)]
+
+
+@pytest.mark.skipif(POSTGRES_TEST_URL is None, reason="Índices concorrentes e lock_timeout exigem Postgres "
+                                                     "(POSTGRES_TEST_URL)")
+def test_deve_desistir_do_alter_quando_a_tabela_esta_travada_e_conseguir_depois():
+    engine = create_engine(POSTGRES_TEST_URL)
+    with engine.begin() as conexao:
+        conexao.execute(text("DROP TABLE IF EXISTS migracao_teste_travada"))
+        conexao.execute(text("CREATE TABLE migracao_teste_travada (id INTEGER)"))
+
+    transacao_longa = engine.connect()
+    trava = transacao_longa.begin()
+    transacao_longa.execute(text("SELECT * FROM migracao_teste_travada"))
+    alter = text("ALTER TABLE migracao_teste_travada ADD COLUMN nova INTEGER")
+
+    try:
+        with engine.begin() as conexao:
+            inicio = time.monotonic()
+            with pytest.raises(LockNaoObtido):
+                executa_com_limite_de_lock(conexao, lambda: conexao.execute(alter), segundos=0.1, tentativas=2,
+                                           pausa_segundos=0.05)
+            desistiu_em = time.monotonic() - inicio
+
+            # A transação da migração continua utilizável; a tabela é liberada durante a pausa
+            threading.Timer(0.1, trava.rollback).start()
+            executa_com_limite_de_lock(conexao, lambda: conexao.execute(alter), segundos=0.1, tentativas=5,
+                                       pausa_segundos=0.1)
+            lock_timeout = conexao.execute(text("SHOW lock_timeout")).scalar()
+            colunas = [coluna["name"] for coluna in inspect(conexao).get_columns("migracao_teste_travada")]
+    finally:
+        transacao_longa.close()
+        with engine.begin() as conexao:
+            conexao.execute(text("DROP TABLE IF EXISTS migracao_teste_travada"))
+
+    assert desistiu_em < 2
+    assert lock_timeout == "0"
+    assert colunas == ["id", "nova"]
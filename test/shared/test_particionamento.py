@@ -0,0 +1,124 @@
+import datetime
+import gzip
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.pagamento_model import Pagamento
+from contas_a_pagar_e_receber.routers.contas_a_pagar_e_receber_router import consulta_contas_do_mes
+from shared.database import Base
+from shared.particionamento import arquiva_particoes_baixadas, converte_para_particionada, \
+    lista_anos_particionados, cria_particao_do_ano
+
+POSTGRES_TEST_URL = os.getenv("POSTGRES_TEST_URL")
+
+pytestmark = pytest.mark.skipif(POSTGRES_TEST_URL is None, reason="Particionamento exige Postgres (POSTGRES_TEST_URL)")
+
+
+@pytest.fixture
+def conexao():
+    engine = create_engine(POSTGRES_TEST_URL)
+    with engine.begin() as conexao:
+        conexao.execute(text("DROP SCHEMA public CASCADE"))
+        conexao.execute(text("CREATE SCHEMA public"))
+        Base.metadata.create_all(bind=conexao)
+
+        conexao.execute(ContaPagarReceber.__table__.insert(), [
+            {"descricao": "Antiga", "valor": 10, "tipo": "PAGAR", "data_previsao": datetime.date(2021, 3, 1),
+             "esta_baixada": True},
+            {"descricao": "Atual", "valor": 20, "tipo": "PAGAR",
+             "data_previsao": datetime.date(datetime.date.today().year, 5, 1), "esta_baixada": False},
+        ])
+
+        converte_para_particionada(conexao)
+        yield conexao
+
+
+def test_deve_criar_particoes_do_historico_e_dos_proximos_anos(conexao):
+    ano_atual = datetime.date.today().year
+
+    assert lista_anos_particionados(conexao) == list(range(2021, ano_atual + 3))
+    assert conexao.execute(text("SELECT count(*) FROM contas_a_pagar_e_receber")).scalar() == 2
+
+
+def test_deve_listar_somente_as_particoes_da_tabela_do_search_path(conexao):
+    conexao.execute(text("DROP SCHEMA IF EXISTS outro_tenant CASCADE"))
+    conexao.execute(text("CREATE SCHEMA outro_tenant"))
+    conexao.execute(text("CREATE TABLE outro_tenant.contas_a_pagar_e_receber (data_previsao date) "
+                         "PARTITION BY RANGE (data_previsao)"))
+    conexao.execute(text("CREATE TABLE outro_tenant.contas_a_pagar_e_receber_1999 "
+                         "PARTITION OF outro_tenant.contas_a_pagar_e_receber "
+                         "FOR VALUES FROM ('1999-01-01') TO ('2000-01-01')"))
+
+    assert 1999 not in lista_anos_particionados(conexao)
+    conexao.execute(text("DROP SCHEMA outro_tenant CASCADE"))
+
+
+def test_contagem_mensal_deve_ler_somente_a_particao_do_ano(conexao):
+    consulta = consulta_contas_do_mes(Session(bind=conexao), 2021, 3).statement.compile(dialect=conexao.dialect)
+
+    plano = "\n".join(conexao.exec_driver_sql("EXPLAIN " + str(consulta), consulta.params).scalars().all())
+
+    assert "contas_a_pagar_e_receber_2021" in plano
+    assert "contas_a_pagar_e_receber_padrao" not in plano
+    assert f"contas_a_pagar_e_receber_{datetime.date.today().year}" not in plano
+
+
+def test_deve_arquivar_somente_particoes_com_todas_as_contas_baixadas(conexao, tmp_path):
+    ano_atual = datetime.date.today().year
+
+    arquivos = arquiva_particoes_baixadas(conexao, ano_atual, str(tmp_path))
+
+    # As partições futuras estão vazias e a do ano atual ainda tem conta em aberto
+    assert os.path.basename(arquivos[0]) == "contas_a_pagar_e_receber_2021.csv.gz"
+    assert f"contas_a_pagar_e_receber_{ano_atual}.csv.gz" not in [os.path.basename(a) for a in arquivos]
+    assert 2021 not in lista_anos_particionados(conexao)
+    with gzip.open(arquivos[0], "rt") as arquivo:
+        assert "Antiga" in arquivo.read()
+    assert conexao.execute(text("SELECT count(*) FROM contas_a_pagar_e_receber")).scalar() == 1
+
+
+def test_arquivamento_deve_excluir_os_pagamentos_e_registrar_as_exclusoes(conexao, tmp_path):
+    conexao.execute(text(
+        "INSERT INTO pagamentos (conta_a_pagar_e_receber_id, valor, data_pagamento, criado_em) "
+        "VALUES (1, 10, '2021-03-01', now()), (2, 5, '2021-03-01', now())"
+    ))
+
+    arquivos = arquiva_particoes_baixadas(conexao, 2021, str(tmp_path))
+
+    assert [os.path.basename(a) for a in arquivos] == ["contas_a_pagar_e_receber_2021.csv.gz",
+                                                       "contas_a_pagar_e_receber_2021_pagamentos.csv.gz"]
+    with gzip.open(arquivos[1], "rt") as arquivo:
+        assert len(arquivo.read().splitlines()) == 2
+    assert conexao.execute(text("SELECT conta_a_pagar_e_receber_id FROM pagamentos")).scalars().all() == [2]
+    assert conexao.execute(text("SELECT entidade, entidade_id FROM exclusoes")).all() == [
+        ("conta_a_pagar_e_receber", 1)]
+
+
+def test_pagamento_deve_carregar_a_conta_da_tabela_particionada(conexao):
+    db = Session(bind=conexao)
+    db.add(Pagamento(conta_a_pagar_e_receber_id=1, valor=10, data_pagamento=datetime.date(2021, 3, 1)))
+    db.flush()
+
+    assert db.query(Pagamento).one().conta.descricao == "Antiga"
+
+
+def test_deve_mover_para_a_nova_particao_as_contas_do_ano_que_estao_na_padrao(conexao):
+    ano = datetime.date.today().year + 10
+    conexao.execute(ContaPagarReceber.__table__.insert(), [
+        {"descricao": "Parcela distante", "valor": 30, "tipo": "PAGAR", "data_previsao": datetime.date(ano, 2, 1)},
+        {"descricao": "Ainda mais distante", "valor": 40, "tipo": "PAGAR",
+         "data_previsao": datetime.date(ano + 1, 2, 1)},
+    ])
+
+    cria_particao_do_ano(conexao, ano)
+
+    assert ano in lista_anos_particionados(conexao)
+    assert conexao.execute(text(f"SELECT descricao FROM contas_a_pagar_e_receber_{ano}")).scalars().all() == [
+        "Parcela distante"]
+    assert conexao.execute(text("SELECT descricao FROM contas_a_pagar_e_receber_padrao")).scalars().all() == [
+        "Ainda mais distante"]
+    assert conexao.execute(text("SELECT count(*) FROM contas_a_pagar_e_receber")).scalar() == 4
@@ -0,0 +1,123 @@
+import datetime
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from contas_a_pagar_e_receber.models.conta_a_pagar_receber_model import ContaPagarReceber
+from contas_a_pagar_e_receber.models.fornecedor_cliente_model import FornecedorCliente
+from main import app
+from shared import replicas
+from shared.database import Base
+from shared.dependencies import get_db, get_db_leitura
+from shared.replicas import RegistroDeEscritas, SelecionadorDeReplicas
+
+engine_primario = create_engine("sqlite:///./test_primario.db", connect_args={"check_same_thread": False})
+engine_replica_1 = create_engine("sqlite:///./test_replica_1.db", connect_args={"check_same_thread": False})
+engine_replica_2 = create_engine("sqlite:///./test_replica_2.db", connect_args={"check_same_thread": False})
+engine_fora_do_ar = create_engine("sqlite:///./diretorio_inexistente/replica.db")
+
+
+def prepara_banco(engine, nome):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(FornecedorCliente(nome=nome))
+    db.commit()
+    db.close()
+
+
+def cria_request(cliente="10.0.0.1"):
+    return Request({"type": "http", "headers": [], "client": (cliente, 5000)})
+
+
+def le_nome_do_fornecedor(request, monkeypatch, selecionador, registro=None):
+    monkeypatch.setattr(replicas, "selecionador_de_replicas", selecionador)
+    monkeypatch.setattr(replicas, "registro_de_escritas", registro or RegistroDeEscritas())
+
+    db_primario = sessionmaker(bind=engine_primario)()
+    dependencia = get_db_leitura(request, db_primario)
+    db = next(dependencia)
+    nome = db.query(FornecedorCliente).first().nome
+    dependencia.close()
+    return nome
+
+
+def test_deve_ler_das_replicas_em_round_robin(monkeypatch):
+    prepara_banco(engine_primario, "primario")
+    prepara_banco(engine_replica_1, "replica 1")
+    prepara_banco(engine_replica_2, "replica 2")
+
+    selecionador = SelecionadorDeReplicas([engine_replica_1, engine_replica_2])
+
+    nomes = [le_nome_do_fornecedor(cria_request(), monkeypatch, selecionador) for _ in range(4)]
+
+    assert nomes == ["replica 1", "replica 2", "replica 1", "replica 2"]
+
+
+def test_deve_ler_do_primario_sem_replicas_configuradas(monkeypatch):
+    prepara_banco(engine_primario, "primario")
+
+    assert le_nome_do_fornecedor(cria_request(), monkeypatch, SelecionadorDeReplicas([])) == "primario"
+
+
+def test_deve_pular_replica_fora_do_ar(monkeypatch):
+    prepara_banco(engine_primario, "primario")
+    prepara_banco(engine_replica_1, "replica 1")
+
+    selecionador = SelecionadorDeReplicas([engine_fora_do_ar, engine_replica_1])
+
+    nomes = [le_nome_do_fornecedor(cria_request(), monkeypatch, selecionador) for _ in range(3)]
+
+    assert nomes == ["replica 1", "replica 1", "replica 1"]
+    assert selecionador.metricas()["replicas_indisponiveis"] == 1
+
+
+def test_deve_ler_do_primario_logo_apos_uma_escrita_do_mesmo_cliente(monkeypatch):
+    prepara_banco(engine_primario, "primario")
+    prepara_banco(engine_replica_1, "replica 1")
+
+    selecionador = SelecionadorDeReplicas([engine_replica_1])
+    registro = RegistroDeEscritas(janela_segundos=60)
+    registro.registra("ip:10.0.0.1")
+
+    assert le_nome_do_fornecedor(cria_request("10.0.0.1"), monkeypatch, selecionador, registro) == "primario"
+    assert le_nome_do_fornecedor(cria_request("10.0.0.2"), monkeypatch, selecionador, registro) == "replica 1"
+
+
+def test_previsao_de_gastos_deve_abrir_uma_unica_conexao_na_replica(monkeypatch):
+    prepara_banco(engine_primario, "primario")
+    prepara_banco(engine_replica_1, "replica 1")
+    db = sessionmaker(bind=engine_replica_1)()
+    db.add(ContaPagarReceber(descricao="Aluguel", valor=100, tipo="PAGAR", data_previsao=datetime.date(2022, 3, 5)))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(replicas, "selecionador_de_replicas", SelecionadorDeReplicas([engine_replica_1]))
+    monkeypatch.setattr(replicas, "registro_de_escritas", RegistroDeEscritas())
+
+    def sessao_do_primario():
+        db_primario = sessionmaker(bind=engine_primario)()
+        try:
+            yield db_primario
+        finally:
+            db_primario.close()
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, sessao_do_primario)
+    # A requisição aguarda o cálculo coalescido sem segurar conexão própria, nem no primário nem na réplica
+    conexoes = []
+
+    def registra_conexao(conexao, *args):
+        conexoes.append(conexao.engine)
+
+    for engine in (engine_primario, engine_replica_1):
+        event.listen(engine, "engine_connect", registra_conexao)
+    try:
+        resposta = TestClient(app).get("/contas-a-pagar-e-receber/previsao-gastos-por-mes", params={"ano": 2022})
+    finally:
+        for engine in (engine_primario, engine_replica_1):
+            event.remove(engine, "engine_connect", registra_conexao)
+
+    assert resposta.json() == [{"mes": 3, "valor_total": "100.00"}]
+    assert conexoes == [engine_replica_1]
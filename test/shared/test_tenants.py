@@ -0,0 +1,145 @@
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from main import app
+from shared import tenants
+from shared.database import Base
+from shared.dependencies import get_db
+from shared.eventos import CorretorDeEventos
+from shared.tenants import EnginesDosTenants, engine_do_schema_do_tenant
+
+POSTGRES_TEST_URL = os.getenv("POSTGRES_TEST_URL")
+
+client = TestClient(app)
+
+CONTA = {"descricao": "Aluguel", "valor": 100, "tipo": "PAGAR", "data_previsao": "2022-01-10"}
+
+
+def engine_sqlite_do_tenant(tenant):
+    return create_engine(f"sqlite:///./test_tenant_{tenant}.db", connect_args={"check_same_thread": False})
+
+
+@pytest.fixture
+def multi_tenant(monkeypatch):
+    for tenant in ("acme", "beta", "gama"):
+        engine = engine_sqlite_do_tenant(tenant)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+
+    engines = EnginesDosTenants(engine_sqlite_do_tenant, tamanho_maximo=2)
+    monkeypatch.setattr(tenants, "engines_dos_tenants", engines)
+    # Os outros testes trocam o get_db por um banco fixo; aqui o roteamento por tenant é o que se testa
+    monkeypatch.delitem(app.dependency_overrides, get_db, raising=False)
+    return engines
+
+
+def lista_contas(tenant):
+    return client.get("/contas-a-pagar-e-receber", headers={"X-Tenant-Id": tenant}).json()
+
+
+def test_cada_tenant_deve_ver_apenas_os_proprios_dados(multi_tenant):
+    criada = client.post("/contas-a-pagar-e-receber", json=CONTA, headers={"X-Tenant-Id": "acme"})
+
+    assert criada.status_code == 201
+    assert [conta["descricao"] for conta in lista_contas("acme")] == ["Aluguel"]
+    assert lista_contas("beta") == []
+
+
+def test_deve_manter_no_maximo_o_limite_de_engines_descartando_a_menos_usada(multi_tenant):
+    client.post("/contas-a-pagar-e-receber", json=CONTA, headers={"X-Tenant-Id": "acme"})
+    lista_contas("beta")
+    lista_contas("acme")
+    lista_contas("gama")
+
+    metricas = multi_tenant.metricas()
+
+    # beta foi a menos usada recentemente; acme continua no cache e com os dados intactos
+    assert list(metricas["tenants"]) == ["acme", "gama"]
+    assert metricas["total_descartadas"] == 1
+    assert metricas["tenants"]["acme"]["requisicoes"] == 2
+    assert metricas["tenants"]["acme"]["sessoes_abertas"] == 0
+    assert len(lista_contas("acme")) == 1
+
+
+def test_nao_deve_descartar_a_engine_de_um_tenant_com_sessao_aberta(multi_tenant):
+    with multi_tenant.sessao("acme"):
+        multi_tenant.obtem("beta")
+        multi_tenant.obtem("gama")
+
+        assert list(multi_tenant.metricas()["tenants"]) == ["acme", "gama"]
+        assert multi_tenant.metricas()["tenants"]["acme"]["sessoes_abertas"] == 1
+
+
+def test_deve_identificar_o_tenant_pelo_subdominio(multi_tenant, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_DOMINIO_BASE", "contas.exemplo.com")
+    client.post("/contas-a-pagar-e-receber", json=CONTA, headers={"Host": "acme.contas.exemplo.com"})
+
+    pelo_subdominio = client.get("/contas-a-pagar-e-receber", headers={"Host": "acme.contas.exemplo.com:8001"})
+    divergente = client.get("/contas-a-pagar-e-receber",
+                            headers={"Host": "acme.contas.exemplo.com", "X-Tenant-Id": "beta"})
+
+    assert len(pelo_subdominio.json()) == 1
+    assert divergente.status_code == 400
+
+
+def test_deve_recusar_requisicao_sem_tenant_com_tenant_invalido_ou_nao_permitido(multi_tenant):
+    multi_tenant.tenants_permitidos = {"acme", "beta"}
+
+    sem_tenant = client.get("/contas-a-pagar-e-receber")
+    invalido = client.get("/contas-a-pagar-e-receber", headers={"X-Tenant-Id": "../acme"})
+    nao_permitido = client.get("/contas-a-pagar-e-receber", headers={"X-Tenant-Id": "gama"})
+
+    assert sem_tenant.status_code == 400
+    assert invalido.status_code == 400
+    assert nao_permitido.status_code == 404
+    assert client.get("/").status_code == 200
+
+
+def test_eventos_devem_chegar_apenas_aos_assinantes_do_mesmo_tenant():
+    corretor = CorretorDeEventos()
+
+    async def coleta(tenant):
+        return [evento async for evento in corretor.assina(tenant=tenant, duracao_maxima=0.2)]
+
+    async def cenario():
+        assinantes = [asyncio.create_task(coleta(tenant)) for tenant in ("acme", "beta")]
+        await asyncio.sleep(0.05)
+        token = tenants.tenant_atual.set("acme")
+        try:
+            corretor.publica("conta_criada", [{"id": 1, "versao": 1}])
+        finally:
+            tenants.tenant_atual.reset(token)
+        return await asyncio.gather(*assinantes)
+
+    da_acme, da_beta = asyncio.run(cenario())
+
+    assert [(evento.tipo, evento.tenant) for evento in da_acme] == [("conta_criada", "acme")]
+    assert da_beta == []
+
+
+@pytest.mark.skipif(POSTGRES_TEST_URL is None, reason="Um schema por tenant exige Postgres (POSTGRES_TEST_URL)")
+def test_deve_isolar_os_tenants_em_schemas_do_mesmo_banco(monkeypatch):
+    engine = create_engine(POSTGRES_TEST_URL)
+    with engine.begin() as conexao:
+        for schema in ("tenant_acme", "tenant_beta"):
+            conexao.exec_driver_sql(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            conexao.exec_driver_sql(f"CREATE SCHEMA {schema}")
+    for schema in ("tenant_acme", "tenant_beta"):
+        Base.metadata.create_all(bind=engine.execution_options(schema_translate_map={None: schema}))
+
+    monkeypatch.setattr(tenants, "engine_principal", engine)
+    monkeypatch.setattr(tenants, "TENANT_SCHEMA", "tenant_{tenant}")
+    monkeypatch.setattr(tenants, "engines_dos_tenants",
+                        EnginesDosTenants(engine_do_schema_do_tenant, engines_proprias=False))
+    monkeypatch.delitem(app.dependency_overrides, get_db, raising=False)
+
+    client.post("/contas-a-pagar-e-receber", json=CONTA, headers={"X-Tenant-Id": "acme"})
+
+    assert len(lista_contas("acme")) == 1
+    assert lista_contas("beta") == []
+    assert client.get("/contas-a-pagar-e-receber", headers={"X-Tenant-Id": "gama"}).status_code == 404